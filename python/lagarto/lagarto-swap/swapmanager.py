@@ -172,6 +172,16 @@ class SwapManager(SwapInterface, LagartoServer):
         return status
     
     
+    def get_metrics(self):
+        """
+        Return SWAP server metrics in the Prometheus text format
+        Method required by LagartoServer
+        
+        @return metrics in string format
+        """
+        return self.server.metrics.prometheus()
+
+
     def http_command_received(self, command, params):
         """
         Process command sent from HTTP server. Method to be overrided by data server.
@@ -187,13 +197,19 @@ class SwapManager(SwapInterface, LagartoServer):
             # Configure endpoint
             if command == "config_endpoint":
                 endp = self.get_endpoint(endpid=params["id"])
-                endp.name = params["name"]
-                endp.location = params["location"]
+                self.network.rename_endpoint(endp, params["location"], params["name"])
                 if "unit" in params:
                     endp.setUnit(params["unit"])
                 self.network.save()
             elif command == "delete_mote":
                 self.network.delete_mote(int(params["address"]))
+            # Profile the processing of incoming packets. Statistics are
+            # saved in swap.prof, within the working directory
+            elif command == "profile":
+                if params.get("action") == "start":
+                    self.server.start_profile(int(params.get("sample", 1)))
+                else:
+                    self.server.stop_profile(os.path.join(working_dir, "swap.prof"))
             else:
                 # Save gateway's wireless settings
                 if command == "modem_network":
@@ -67,6 +67,16 @@ class LagartoProcess(object):
         return None
 
 
+    def get_metrics(self):
+        """
+        Return process metrics in the Prometheus text format
+        Method to be overriden by subclass
+        
+        @return metrics in string format or None if not available
+        """
+        return None
+
+
     def http_command_received(self, command, params):
         """
         Process command sent from HTTP server. Method to be overrided by data server.
@@ -269,6 +269,8 @@ class LagartoHttpServer(threading.Thread):
             (status, response_headers, response_body) = LagartoHttpServer._serve_values(LagartoHttpServer.query_string, path)
         elif path[0] == "command":
             (status, response_headers, response_body) = LagartoHttpServer._send_command(LagartoHttpServer.query_string, path)
+        elif path[0] == "metrics":
+            (status, response_headers, response_body) = LagartoHttpServer._serve_metrics()
         else:
             # Process request with basic auth enabled
             return LagartoHttpServer._process_request_secu(environ, start_response)
@@ -360,6 +362,27 @@ class LagartoHttpServer(threading.Thread):
         return (status, headers, body)
 
 
+    @staticmethod
+    def _serve_metrics():
+        """
+        Serve process metrics in the Prometheus text format
+        
+        @return response (status, headers, body) tuple
+        """
+        body = LagartoHttpServer.data_server.get_metrics()
+        if body is None:
+            mime_type = "text/html"
+            status = "404 Not Found"
+            body = "Metrics not available"
+        else:
+            mime_type = "text/plain; version=0.0.4"
+            status = "200 OK"
+
+        headers = [("Content-Type", mime_type), ("Content-Length", str(len(body)))]
+        
+        return (status, headers, body)
+
+
     @staticmethod
     def _serve_file(file_path):
         """
@@ -0,0 +1,36 @@
+#########################################################################
+#
+# __init__
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+# Benchmarks for the pyswap stack. Run them from the source directory:
+#
+#   python -m benchmarks.serial_rx
+#
+# benchmarks.suite runs the end-to-end benchmarks and saves JSON results
+# that can be compared between runs:
+#
+#   python -m benchmarks.suite -o run.json
+#   python -m benchmarks.suite --compare base.json run.json
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
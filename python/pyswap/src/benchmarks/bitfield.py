@@ -0,0 +1,175 @@
+#########################################################################
+#
+# bitfield
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+# Per-packet decode cost of the parameter bit-field codec over the device
+# definitions in devices/. The bit-by-bit copy loop the codec replaced is
+# kept below as reference, both for timing and for checking results.
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from swap.protocol.SwapValue import SwapValue
+from swap.xmltools.XmlSettings import XmlSettings
+from swap.xmltools.XmlDevice import XmlDeviceDir, XmlDevice
+
+import os
+import random
+import sys
+import time
+
+# Device definition files shipped with the repository
+DEVICES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "devices")
+
+
+class _Mote(object):
+    """
+    Minimal stand-in for SwapMote
+    """
+    def updateTimeStamp(self):
+        pass
+
+    def __init__(self, devel_id, prod_id):
+        self.manufacturer_id = devel_id
+        self.product_id = prod_id
+        self.address = 1
+
+
+def _legacy_update(param):
+    """
+    Copy parameter bits from its register one at a time, as
+    SwapParam.update() used to do
+    """
+    param.valueChanged = False
+    lstRegVal = param.register.value.toList()
+    indexReg = param.bytePos
+    shiftReg = 7 - param.bitPos
+    bitsToCopy = param.byteSize * 8 + param.bitSize
+    lstParamVal = param.value.toList()[:]
+    if len(lstParamVal) == 0:
+        return
+    oldParamVal = param.value.clone()
+    indexParam = 0
+    shiftParam = param.bitSize - 1
+    if shiftParam < 0:
+        shiftParam = 7
+    for i in range(bitsToCopy):
+        if indexReg >= len(lstRegVal):
+            break
+        if (lstRegVal[indexReg] >> shiftReg) & 0x01 == 0:
+            lstParamVal[indexParam] &= ~(1 << shiftParam)
+        else:
+            lstParamVal[indexParam] |= 1 << shiftParam
+        shiftReg -= 1
+        shiftParam -= 1
+        if shiftReg < 0:
+            indexReg += 1
+            shiftReg = 7
+        if shiftParam < 0:
+            indexParam += 1
+            shiftParam = 7
+    param.value = SwapValue(lstParamVal)
+    if not param.value.isEqual(oldParamVal):
+        param.valueChanged = True
+    param.lastupdate = time.time()
+
+
+def _registers():
+    """
+    Return (device name, list of registers) for every definition file
+    """
+    devices = []
+    device_dir = XmlDeviceDir.get()
+    for developer in device_dir.developers:
+        for device in developer.devices:
+            try:
+                definition = XmlDevice(_Mote(developer.id, device.id))
+            except Exception:
+                continue
+            registers = (definition.getRegList() or []) + (definition.getRegList(config=True) or [])
+            if len(registers) > 0:
+                devices.append((developer.name + "/" + device.option, registers))
+    return devices
+
+
+def _packets(register, count):
+    """
+    Return random register values
+    """
+    length = register.value.getLength()
+    return [SwapValue([random.randint(0, 255) for i in range(length)]) for j in range(count)]
+
+
+def run(packets=2000):
+    """
+    Decode random STATUS values into the parameters of every register
+
+    @param packets: Amount of values decoded per register
+
+    @return list of (device, parameters, legacy us/packet, codec us/packet) tuples
+    """
+    results = []
+    for (name, registers) in _registers():
+        legacy = codec = 0.0
+        nbparams = 0
+        for reg in registers:
+            nbparams += len(reg.parameters)
+            values = _packets(reg, packets)
+
+            start = time.time()
+            for value in values:
+                reg.value = value
+                reg.mote.updateTimeStamp()
+                for param in reg.parameters:
+                    _legacy_update(param)
+            legacy += time.time() - start
+            expected = [param.value.toList()[:] for param in reg.parameters]
+
+            start = time.time()
+            for value in values:
+                reg.setValue(value)
+            codec += time.time() - start
+
+            if [param.value.toList() for param in reg.parameters] != expected:
+                raise AssertionError("Codec mismatch for " + name + ", register " + str(reg.id))
+
+            # Encoding the parameters back must give the same register value
+            reg.update()
+            if reg.value.toList() != value.toList():
+                raise AssertionError("Encoding mismatch for " + name + ", register " + str(reg.id))
+
+        results.append((name, nbparams, legacy * 1e6 / packets, codec * 1e6 / packets))
+    return results
+
+
+if __name__ == "__main__":
+    XmlSettings.device_localdir = os.path.abspath(DEVICES)
+    if len(sys.argv) > 1:
+        XmlSettings.device_localdir = sys.argv[1]
+    total_legacy = total_codec = 0.0
+    for (name, nbparams, legacy, codec) in run():
+        total_legacy += legacy
+        total_codec += codec
+        print "%-36s %3d params  %8.1f us legacy  %7.1f us codec" % (name, nbparams, legacy, codec)
+    print "%-36s             %8.1f us legacy  %7.1f us codec" % ("total", total_legacy, total_codec)
@@ -0,0 +1,158 @@
+#########################################################################
+#
+# lazy_load
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+# Startup time and resident memory of SwapNetwork loading a large network,
+# building every mote on startup or leaving stored motes as lazy stubs.
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from startup import DEVICES, _Server, _products
+from swap.protocol.SwapMote import SwapMote
+from swap.protocol.SwapNetwork import SwapNetwork
+from swap.xmltools.XmlSettings import XmlSettings
+
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _rss():
+    """
+    Return resident memory of the current process in KB
+    """
+    try:
+        f = open("/proc/self/statm")
+        pages = int(f.read().split()[1])
+        f.close()
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024
+    except (IOError, OSError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _write_network(filename, nbmotes):
+    """
+    Write network file with nbmotes fully described motes, as saved by
+    SwapNetwork. Addresses wrap around after 254 motes
+    """
+    SwapNetwork.lazy_load = False
+    network = SwapNetwork(_Server(), filename)
+    pcodes = _products()
+    for i in range(nbmotes):
+        mote = SwapMote(_Server(), pcodes[i % len(pcodes)], (i % 254) + 1)
+        for reg in mote.regular_registers or []:
+            for endp in reg.parameters:
+                endp.location = "room" + str(i)
+        # Bypass add_mote, which rejects duplicate addresses
+        network._addToIndex(mote)
+    network.save()
+
+
+def _load(filename, lazy):
+    """
+    Load network file. Run in a child process so that memory figures are
+    not polluted by other runs
+
+    @return dictionary of results
+    """
+    SwapNetwork.lazy_load = lazy
+    # Parse definition files before measuring
+    SwapMote(_Server(), _products()[0])
+    gc.collect()
+    rss = _rss()
+    start = time.time()
+    network = SwapNetwork(_Server(), filename)
+    elapsed = time.time() - start
+    gc.collect()
+    rss = _rss() - rss
+
+    # First packet received from one of the motes
+    start = time.time()
+    network.get_mote(address=network.motes[-1].address).getRegister(11)
+    first = time.time() - start
+
+    return {"lazy": lazy,
+            "motes": len(network.motes),
+            "seconds": elapsed,
+            "ms_per_mote": elapsed * 1000 / max(len(network.motes), 1),
+            "rss_kb": rss,
+            "first_access_ms": first * 1000}
+
+
+def run(nbmotes=500, lazy=True, filename=None):
+    """
+    Measure startup time and memory of a network with nbmotes motes
+
+    @param nbmotes: Amount of motes
+    @param lazy: Leave stored motes unloaded until first used if True
+    @param filename: Network file to be loaded. Created in a temporary
+    directory if not given. Use a .db extension for SQLite
+
+    @return dictionary of results
+    """
+    direc = None
+    try:
+        if filename is None:
+            direc = tempfile.mkdtemp()
+            filename = os.path.join(direc, "swapnet.json")
+            _write_network(filename, nbmotes)
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--child",
+                                          XmlSettings.device_localdir, filename, str(int(lazy))],
+                                         env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        return json.loads(output.splitlines()[-1])
+    finally:
+        if direc is not None:
+            shutil.rmtree(direc)
+
+
+if __name__ == "__main__":
+    XmlSettings.device_localdir = os.path.abspath(DEVICES)
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        XmlSettings.device_localdir = sys.argv[2]
+        res = _load(sys.argv[3], sys.argv[4] == "1")
+        sys.stdout.write(json.dumps(res) + "\n")
+        sys.stdout.flush()
+        os._exit(0)
+
+    if len(sys.argv) > 1:
+        XmlSettings.device_localdir = sys.argv[1]
+    for ext in ("json", "db"):
+        direc = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(direc, "swapnet." + ext)
+            _write_network(filename, 500)
+            for mode in (False, True):
+                res = run(lazy=mode, filename=filename)
+                print "%-4s %-6s %4d motes  %7.3f s  %6.2f ms/mote  %7d KB  first access %6.2f ms" % \
+                    (ext, res["lazy"] and "lazy" or "eager", res["motes"], res["seconds"],
+                     res["ms_per_mote"], res["rss_kb"], res["first_access_ms"])
+        finally:
+            shutil.rmtree(direc)
@@ -0,0 +1,113 @@
+#########################################################################
+#
+# packet_codec
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+# Round trip of serial frames through CcPacket/SwapPacket: parse, decode
+# the SWAP header and value, and serialize again. Runs over a capture file
+# (one "(RRLL)DATA" frame per line) or over random STATUS frames. The
+# list-based parser the codec replaced is kept below as reference.
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from swap.modem.CcPacket import CcPacket
+from swap.protocol.SwapPacket import SwapPacket
+
+import random
+import sys
+import time
+
+
+def _legacy_roundtrip(strPacket):
+    """
+    Parse and serialize frame as CcPacket and SwapPacket used to do
+    """
+    rssi = int(strPacket[1:3], 16)
+    lqi = int(strPacket[3:5], 16)
+    data = []
+    for i in range(6, len(strPacket), 2):
+        data.append(int(strPacket[i:i + 2], 16))
+    fields = (data[0], data[1], (data[2] >> 4) & 0x0F, data[2] & 0x0F, data[3], data[4], data[5], data[6])
+    value = data[7:][:]
+    out = []
+    for item in data:
+        out.append("{0:02X}".format(int(item)))
+    return "".join(out)
+
+
+def _roundtrip(strPacket):
+    """
+    Parse and serialize frame with the current codec
+    """
+    packet = SwapPacket(CcPacket(strPacket))
+    fields = (packet.destAddress, packet.srcAddress, packet.hop, packet.security, packet.nonce,
+              packet.function, packet.regAddress, packet.regId)
+    value = packet.value
+    return packet.toString()
+
+
+def capture(frames=300000):
+    """
+    Build random capture of SWAP status frames
+
+    @param frames: Amount of frames
+
+    @return list of frames in modem format
+    """
+    lines = []
+    for i in range(frames):
+        length = random.randint(1, 16)
+        data = [0, random.randint(1, 254), 0, random.randint(0, 255), 0, random.randint(1, 254), random.randint(11, 30)]
+        data += [random.randint(0, 255) for j in range(length)]
+        lines.append("(%02X%02X)" % (random.randint(0, 255), random.randint(0, 255)) + "".join("%02X" % b for b in data))
+    return lines
+
+
+def run(lines):
+    """
+    Run round trip over a list of frames
+
+    @param lines: Frames in modem format
+
+    @return dictionary of results. Times in microseconds per frame
+    """
+    results = {"frames": len(lines)}
+    for (name, roundtrip) in (("legacy", _legacy_roundtrip), ("codec", _roundtrip)):
+        start = time.time()
+        for line in lines:
+            if roundtrip(line) != line[6:]:
+                raise AssertionError(name + " round trip failed for " + line)
+        results[name] = (time.time() - start) * 1e6 / max(len(lines), 1)
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        f = open(sys.argv[1])
+        lines = [line.strip() for line in f if line.startswith("(")]
+        f.close()
+    else:
+        lines = capture()
+    res = run(lines)
+    print "%d frames  %6.2f us/frame legacy  %6.2f us/frame codec" % (res["frames"], res["legacy"], res["codec"])
@@ -0,0 +1,105 @@
+#########################################################################
+#
+# serial_rx
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+# Serial reception throughput of SerialPort over a pseudo-terminal.
+# Compares the chunked reader against the byte-per-read one.
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from swap.modem.SerialPort import SerialPort
+
+import os
+import resource
+import threading
+import time
+
+# Typical wireless frame as printed by the serial modem
+FRAME = "(2A3C)0001000201030C000102030405\r\n"
+
+
+def _cpu_time():
+    """
+    Return CPU time (user + system) consumed so far by this process
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(frames=20000, chunked=True, idle=1.0):
+    """
+    Feed frames into a SerialPort listening on a pseudo-terminal
+
+    @param frames: Amount of frames to be transmitted
+    @param chunked: Value for SerialPort.chunked_read
+    @param idle: Seconds the port is left idle in order to measure idle CPU load
+
+    @return dictionary of results
+    """
+    SerialPort.chunked_read = chunked
+    master, slave = os.openpty()
+    port = SerialPort(os.ttyname(slave), 38400)
+
+    received = [0]
+    done = threading.Event()
+    def frame_received(buf):
+        received[0] += 1
+        if received[0] == frames:
+            done.set()
+    port.setRxCallback(frame_received)
+    port.start()
+
+    # Idle load
+    start_cpu = _cpu_time()
+    time.sleep(idle)
+    idle_cpu = _cpu_time() - start_cpu
+
+    # Throughput
+    start = time.time()
+    start_cpu = _cpu_time()
+    burst = FRAME * 100
+    for i in range(frames / 100):
+        os.write(master, burst)
+    done.wait(60)
+    elapsed = time.time() - start
+    busy_cpu = _cpu_time() - start_cpu
+
+    port.stop()
+    port.join(1)
+    os.close(master)
+    os.close(slave)
+
+    return {"reader": chunked and "chunked" or "bytewise",
+            "frames": received[0],
+            "frames_per_sec": received[0] / elapsed,
+            "cpu_per_frame_us": busy_cpu * 1e6 / max(received[0], 1),
+            "idle_cpu_pct": idle_cpu * 100 / idle}
+
+
+if __name__ == "__main__":
+    for mode in (False, True):
+        res = run(chunked=mode)
+        print "%-9s %6d frames  %9.0f frames/s  %7.1f us CPU/frame  %5.1f%% CPU idle" % \
+            (res["reader"], res["frames"], res["frames_per_sec"], res["cpu_per_frame_us"], res["idle_cpu_pct"])
@@ -0,0 +1,125 @@
+#########################################################################
+#
+# startup
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+# Startup time of SwapNetwork loading a large swapnet.json file, with
+# and without the device definition cache.
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from swap.protocol.SwapNetwork import SwapNetwork
+from swap.xmltools.XmlSettings import XmlSettings
+from swap.xmltools.XmlDevice import XmlDeviceDir, XmlDeviceTemplate
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Device definition files shipped with the repository
+DEVICES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "devices")
+
+
+class _Server(object):
+    """
+    Minimal stand-in for SwapServer. Motes only need a non-null server
+    """
+    pass
+
+
+def _products(developer=1, maxprod=32):
+    """
+    Return product codes having a definition file
+    """
+    pcodes = []
+    device_dir = XmlDeviceDir.get()
+    for prod in range(1, maxprod):
+        path = device_dir.getDevicePath(developer, prod)
+        if path is not None and os.path.isfile(path):
+            pcodes.append("%08X%08X" % (developer, prod))
+    return pcodes
+
+
+def _write_network(filename, nbmotes):
+    """
+    Write swapnet.json file with nbmotes motes cycling over the available
+    products. Addresses wrap around after 254 motes
+    """
+    pcodes = _products()
+    motes = []
+    for i in range(nbmotes):
+        motes.append({"pcode": pcodes[i % len(pcodes)], "address": (i % 254) + 1, "registers": []})
+    f = open(filename, "w")
+    json.dump({"network": {"name": "SWAP", "motes": motes}}, f)
+    f.close()
+
+
+def run(nbmotes=500, cache=True):
+    """
+    Load swapnet.json file with nbmotes motes
+
+    @param nbmotes: Amount of motes
+    @param cache: Share parsed definitions among motes if True. Parse every
+    definition file once per mote otherwise
+
+    @return dictionary of results
+    """
+    direc = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(direc, "swapnet.json")
+        _write_network(filename, nbmotes)
+
+        get_template = XmlDeviceTemplate.get
+        if not cache:
+            def uncached(devel_id, prod_id):
+                XmlDeviceDir.invalidate()
+                return get_template(devel_id, prod_id)
+            XmlDeviceTemplate.get = staticmethod(uncached)
+        try:
+            XmlDeviceDir.invalidate()
+            start = time.time()
+            network = SwapNetwork(_Server(), filename)
+            elapsed = time.time() - start
+        finally:
+            XmlDeviceTemplate.get = staticmethod(get_template)
+    finally:
+        shutil.rmtree(direc)
+
+    return {"cache": cache,
+            "motes": len(network.motes),
+            "seconds": elapsed,
+            "ms_per_mote": elapsed * 1000 / max(len(network.motes), 1)}
+
+
+if __name__ == "__main__":
+    XmlSettings.device_localdir = os.path.abspath(DEVICES)
+    if len(sys.argv) > 1:
+        XmlSettings.device_localdir = sys.argv[1]
+    for mode in (False, True):
+        res = run(cache=mode)
+        print "%-8s %4d motes  %7.3f s  %6.2f ms/mote" % \
+            (res["cache"] and "cached" or "uncached", res["motes"], res["seconds"], res["ms_per_mote"])
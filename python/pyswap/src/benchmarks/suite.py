@@ -0,0 +1,438 @@
+#########################################################################
+#
+# suite
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+# Benchmark suite covering the hot paths of the pyswap stack, from frame
+# parsing to command round trips through the simulated modem. Results are
+# written as JSON so that runs from different releases can be compared:
+#
+#   python -m benchmarks.suite [--quick] [--only codec,server] [-o run.json]
+#   python -m benchmarks.suite --compare base.json run.json [--threshold 10]
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from swap.modem.CcPacket import CcPacket
+from swap.protocol.SmartEncrypt import Password
+from swap.protocol.SwapNetwork import SwapNetwork
+from swap.protocol.SwapPacket import SwapPacket
+from swap.protocol.SwapValue import SwapValue
+from swap.xmltools.XmlSettings import XmlSettings
+from swap.xmltools.XmlDevice import XmlDeviceDir, XmlDevice
+
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# Device definition files shipped with the repository
+DEVICES = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                       "..", "..", "..", "..", "devices"))
+# Format of the result files
+VERSION = 1
+# Benchmark groups in running order
+GROUPS = ("codec", "crypto", "registers", "network", "server")
+
+
+class _Server(object):
+    """
+    Minimal stand-in for SwapServer. Motes only need a non-null server
+    """
+    pass
+
+
+class _Mote(object):
+    """
+    Minimal stand-in for SwapMote
+    """
+    def updateTimeStamp(self):
+        pass
+
+    def __init__(self, devel_id, prod_id):
+        self.manufacturer_id = devel_id
+        self.product_id = prod_id
+        self.address = 1
+
+
+def _metric(value, unit, better="lower"):
+    """
+    Build result entry
+
+    @param value: Measured value
+    @param unit: Unit of the value
+    @param better: "lower" or "higher", telling which direction is an improvement
+    """
+    return {"value": round(value, 3), "unit": unit, "better": better}
+
+
+def _best_us(func, items, repeat=3):
+    """
+    Run function over every item and return the best time per item
+
+    @param func: Function taking one item
+    @param items: List of items
+    @param repeat: Amount of runs
+
+    @return microseconds per item of the fastest run
+    """
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        for item in items:
+            func(item)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best * 1e6 / max(len(items), 1)
+
+
+def _frames(count, rnd):
+    """
+    Build random SWAP status frames in modem format
+    """
+    lines = []
+    for i in range(count):
+        data = [0, rnd.randint(1, 254), 0, rnd.randint(0, 255), 0, rnd.randint(1, 254), rnd.randint(11, 30)]
+        data += [rnd.randint(0, 255) for j in range(rnd.randint(1, 16))]
+        lines.append("(%02X%02X)" % (rnd.randint(0, 255), rnd.randint(0, 255)) + "".join("%02X" % b for b in data))
+    return lines
+
+
+def _products():
+    """
+    Return (device name, developer ID, product ID) for every definition file
+    """
+    products = []
+    device_dir = XmlDeviceDir.get()
+    for developer in device_dir.developers:
+        for device in developer.devices:
+            path = device_dir.getDevicePath(developer.id, device.id)
+            if path is not None and os.path.isfile(path):
+                products.append((developer.name + "/" + device.option, developer.id, device.id))
+    return products
+
+
+def bench_codec(quick=False):
+    """
+    CcPacket and SwapPacket parse and serialize rates
+    """
+    rnd = random.Random(1)
+    lines = _frames(quick and 20000 or 100000, rnd)
+    packets = [SwapPacket(CcPacket(line)) for line in lines]
+
+    def parse(line):
+        packet = SwapPacket(CcPacket(line))
+        packet.value
+    results = {}
+    results["codec.ccpacket_parse"] = _metric(_best_us(CcPacket, lines), "us")
+    results["codec.swappacket_parse"] = _metric(_best_us(parse, lines), "us")
+    results["codec.serialize"] = _metric(_best_us(SwapPacket.toString, packets), "us")
+    return results
+
+
+def bench_crypto(quick=False):
+    """
+    Smart Encryption cost per packet
+    """
+    rnd = random.Random(2)
+    password = Password([rnd.randint(0, 255) for i in range(12)])
+    packets = [SwapPacket(CcPacket(line)) for line in _frames(quick and 5000 or 20000, rnd)]
+    for packet in packets:
+        packet.security = 2
+
+    def crypt(packet):
+        packet.smart_encryption(password)
+        packet.smart_encryption(password, decrypt=True)
+    return {"crypto.encrypt_decrypt": _metric(_best_us(crypt, packets), "us")}
+
+
+def bench_registers(quick=False):
+    """
+    SwapRegister.setValue decode cost per device definition
+    """
+    rnd = random.Random(3)
+    rounds = quick and 50 or 200
+    results = {}
+    total = 0.0
+    for (name, devel_id, prod_id) in _products():
+        registers = XmlDevice(_Mote(devel_id, prod_id)).getRegList()
+        if registers is None:
+            continue
+        updates = []
+        for i in range(rounds):
+            for reg in registers:
+                length = reg.getLength()
+                updates.append((reg, SwapValue([rnd.randint(0, 255) for j in range(length)])))
+        cost = _best_us(lambda update: update[0].setValue(update[1]), updates)
+        results["registers.setValue." + name] = _metric(cost, "us")
+        total += cost
+    if len(results) > 0:
+        results["registers.setValue.mean"] = _metric(total / len(results), "us")
+    return results
+
+
+def _write_network(filename, nbmotes):
+    """
+    Write swapnet.json file with nbmotes motes cycling over the available
+    products. Addresses wrap around after 254 motes
+    """
+    pcodes = ["%08X%08X" % (devel_id, prod_id) for (name, devel_id, prod_id) in _products()]
+    motes = []
+    for i in range(nbmotes):
+        motes.append({"pcode": pcodes[i % len(pcodes)], "address": (i % 254) + 1, "registers": []})
+    f = open(filename, "w")
+    json.dump({"network": {"name": "SWAP", "motes": motes}}, f)
+    f.close()
+
+
+def bench_network(quick=False):
+    """
+    SwapNetwork read and save times versus network size
+    """
+    sizes = quick and (50, 200) or (50, 200, 800)
+    results = {}
+    direc = tempfile.mkdtemp()
+    try:
+        for size in sizes:
+            filename = os.path.join(direc, "swapnet_%d.json" % size)
+            _write_network(filename, size)
+            network = SwapNetwork(_Server(), os.path.join(direc, "unused.json"))
+            network.filename = filename
+            start = time.time()
+            network.read()
+            results["network.read.%d" % size] = _metric((time.time() - start) * 1000, "ms")
+            # Build every register, as after a while running
+            for mote in network.motes:
+                mote.materialize()
+            start = time.time()
+            network.save()
+            results["network.save.%d" % size] = _metric((time.time() - start) * 1000, "ms")
+    finally:
+        shutil.rmtree(direc)
+    return results
+
+
+def _percentile(values, pct):
+    """
+    Return percentile of a list of values
+    """
+    values = sorted(values)
+    if len(values) == 0:
+        return 0
+    return values[min(int(len(values) * pct / 100.0), len(values) - 1)]
+
+
+def bench_server(quick=False, nbmotes=None):
+    """
+    SwapServer dispatch rate and command round trip latency, running the
+    whole stack on top of the simulated modem
+    """
+    from swap.SwapInterface import SwapInterface
+
+    if nbmotes is None:
+        nbmotes = quick and 50 or 200
+    direc = tempfile.mkdtemp()
+    results = {}
+    try:
+        f = open(os.path.join(direc, "settings.xml"), "w")
+        f.write("<?xml version=\"1.0\"?>\n<settings><devices><local>" + DEVICES + "</local></devices>"
+                "<serial>serial.xml</serial><network>network.xml</network>"
+                "<swapnet>swapnet.json</swapnet></settings>\n")
+        f.close()
+        f = open(os.path.join(direc, "serial.xml"), "w")
+        f.write("<?xml version=\"1.0\"?>\n<serial><port>sim://%d?interval=0&amp;seed=4</port>"
+                "<speed>38400</speed><txrate>2000</txrate><txburst>16</txburst></serial>\n" % nbmotes)
+        f.close()
+        f = open(os.path.join(direc, "network.xml"), "w")
+        f.write("<?xml version=\"1.0\"?>\n<network><channel>0</channel><netid>b547</netid>"
+                "<address>1</address><security>0</security></network>\n")
+        f.close()
+
+        app = SwapInterface(os.path.join(direc, "settings.xml"), start=False)
+        server = app.server
+        server.start()
+        # Wait for every mote to announce itself
+        deadline = time.time() + 30
+        while (server.modem is None or server.network.get_nbof_motes() < nbmotes) and time.time() < deadline:
+            time.sleep(0.1)
+        results["server.discovered"] = _metric(server.network.get_nbof_motes(), "motes", "higher")
+        try:
+            # Dispatch of STATUS packets reporting new register values
+            rnd = random.Random(5)
+            registers = []
+            for mote in server.network.motes:
+                registers.extend(mote.regular_registers or [])
+            lines = []
+            for i in range(quick and 5000 or 20000):
+                reg = rnd.choice(registers)
+                data = [0, reg.getAddress(), 0, 0, 0, reg.getAddress(), reg.id]
+                data += [rnd.randint(0, 255) for j in range(reg.getLength())]
+                lines.append("(3020)" + "".join("%02X" % b for b in data))
+            packets = [CcPacket(line) for line in lines]
+            start = time.time()
+            for packet in packets:
+                server._ccPacketReceived(packet)
+            elapsed = time.time() - start
+            results["server.dispatch"] = _metric(len(packets) / elapsed, "packets/s", "higher")
+
+            # Command round trips
+            outputs = []
+            for mote in server.network.motes:
+                if mote.pwrdownmode:
+                    continue
+                for reg in mote.regular_registers or []:
+                    if len([endp for endp in reg.parameters if endp.direction == "out"]) > 0:
+                        outputs.append((mote, reg))
+            latencies = []
+            failed = 0
+            for i in range(quick and 100 or 500):
+                (mote, reg) = rnd.choice(outputs)
+                value = SwapValue([rnd.randint(0, 255) for j in range(reg.getLength())])
+                start = time.time()
+                if server.setMoteRegister(mote, reg.id, value):
+                    latencies.append((time.time() - start) * 1000)
+                else:
+                    failed += 1
+            results["server.command_rtt.p50"] = _metric(_percentile(latencies, 50), "ms")
+            results["server.command_rtt.p95"] = _metric(_percentile(latencies, 95), "ms")
+            results["server.command_failed"] = _metric(failed, "commands")
+        finally:
+            server.stop()
+    finally:
+        shutil.rmtree(direc)
+    return results
+
+
+def run(only=None, quick=False):
+    """
+    Run benchmark groups
+
+    @param only: List of groups to be run. Every group if None
+    @param quick: Run fewer iterations
+
+    @return dictionary of results in the JSON output format
+    """
+    XmlSettings.device_localdir = DEVICES
+    XmlDeviceDir.invalidate()
+    benches = {"codec": bench_codec, "crypto": bench_crypto, "registers": bench_registers,
+               "network": bench_network, "server": bench_server}
+    results = {}
+    for group in GROUPS:
+        if only is None or group in only:
+            results.update(benches[group](quick))
+    return {"version": VERSION,
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+            "results": results}
+
+
+def compare(base, current, threshold=10.0):
+    """
+    Compare two runs
+
+    @param base: Results of the reference run
+    @param current: Results of the run to be checked
+    @param threshold: Change (in percent) in the wrong direction reported as regression
+
+    @return list of (name, base value, current value, change in percent,
+    regression) tuples for the metrics found in both runs. Changes from a
+    base value of 0 are infinite
+    """
+    rows = []
+    for name in sorted(set(base["results"]) & set(current["results"])):
+        old = base["results"][name]
+        new = current["results"][name]
+        delta = new["value"] - old["value"]
+        if old["value"] != 0:
+            change = delta * 100.0 / abs(old["value"])
+        elif delta != 0:
+            # Any move away from zero exceeds the threshold
+            change = math.copysign(float("inf"), delta)
+        else:
+            change = 0.0
+        if new.get("better", "lower") == "higher":
+            regression = change < -threshold
+        else:
+            regression = change > threshold
+        rows.append((name, old["value"], new["value"], change, regression))
+    return rows
+
+
+def _load(filename):
+    """
+    Read result file
+    """
+    f = open(filename)
+    data = json.load(f)
+    f.close()
+    if data.get("version") != VERSION:
+        raise ValueError(filename + " has an unsupported format")
+    return data
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    threshold = 10.0
+    if "--threshold" in args:
+        index = args.index("--threshold")
+        threshold = float(args[index + 1])
+        del args[index:index + 2]
+
+    if len(args) == 3 and args[0] == "--compare":
+        rows = compare(_load(args[1]), _load(args[2]), threshold)
+        regressions = 0
+        for (name, old, new, change, regression) in rows:
+            print "%-48s %12.3f %12.3f %+8.1f%%%s" % (name, old, new, change, regression and "  REGRESSION" or "")
+            regressions += int(regression)
+        print "%d metrics compared, %d regressions beyond %.1f%%" % (len(rows), regressions, threshold)
+        sys.exit(regressions > 0 and 1 or 0)
+
+    quick = "--quick" in args
+    only = None
+    output = None
+    if "--only" in args:
+        only = args[args.index("--only") + 1].split(",")
+    if "-o" in args:
+        output = args[args.index("-o") + 1]
+    # Keep the server messages out of the JSON output
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        data = run(only, quick)
+    finally:
+        sys.stdout = stdout
+    text = json.dumps(data, sort_keys=True, indent=2)
+    if output is not None:
+        f = open(output, "w")
+        f.write(text + "\n")
+        f.close()
+    else:
+        print text
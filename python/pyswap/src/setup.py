@@ -32,5 +32,5 @@ setup(name='pyswap',
       author='Daniel Berenguer',
       author_email='dberenguer@usapiens.com',
       url='www.panstamp.com',
-      packages=['swap', 'swap.modem', 'swap.protocol', 'swap.xmltools'],
+      packages=['swap', 'swap.aio', 'swap.modem', 'swap.protocol', 'swap.xmltools'],
      )
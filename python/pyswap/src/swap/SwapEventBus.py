@@ -0,0 +1,375 @@
+#########################################################################
+#
+# SwapEventBus
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+
+#########################################################################
+
+from SwapException import SwapException
+
+import collections
+import threading
+import time
+
+
+class SwapOverflow:
+    """
+    What to do with new value change and packet events when a worker queue
+    is full. Other events are never discarded
+    """
+    ## Discard the oldest value change or packet event waiting in the queue
+    DROP_OLDEST = "drop-oldest"
+    ## Replace the value change event of the same endpoint, register or
+    ## parameter still waiting in the queue. Discard the oldest event if
+    ## there is none
+    COALESCE = "coalesce"
+
+
+class SwapEventBus(object):
+    """
+    Event queue between SwapServer and the application callbacks. Events
+    are delivered by a pool of worker threads so that slow callbacks do
+    not stall serial reception. Events about the same mote are always
+    delivered by the same worker, in the order they were produced.
+    Provides the callbacks of SwapInterface
+    """
+    ## Events waiting longer than this (in seconds) are counted as delayed
+    delay_threshold = 0.1
+    # Events that can be discarded or coalesced when a queue is full
+    _DROPPABLE = frozenset(["swapPacketReceived", "swapPacketSent", "registerValueChanged",
+                            "endpointValueChanged", "parameterValueChanged"])
+
+
+    def swapServerStarted(self):
+        """
+        SWAP server started successfully
+        """
+        self._post("swapServerStarted", 0, None)
+
+
+    def swapPacketReceived(self, packet):
+        """
+        New SWAP packet received
+
+        @param packet: SWAP packet received
+        """
+        self._post("swapPacketReceived", packet.srcAddress, None, packet)
+
+
+    def swapPacketSent(self, packet):
+        """
+        SWAP packet transmitted
+
+        @param packet: SWAP packet transmitted
+        """
+        self._post("swapPacketSent", packet.destAddress, None, packet)
+
+
+    def newMoteDetected(self, mote):
+        """
+        New mote detected by SWAP server
+
+        @param mote: mote detected
+        """
+        self._post("newMoteDetected", mote.address, None, mote)
+
+
+    def newParameterDetected(self, parameter):
+        """
+        New configuration parameter detected by SWAP server
+
+        @param parameter: Parameter detected
+        """
+        self._post("newParameterDetected", parameter.getRegAddress(), None, parameter)
+
+
+    def newEndpointDetected(self, endpoint):
+        """
+        New endpoint detected by SWAP server
+
+        @param endpoint: Endpoint detected
+        """
+        self._post("newEndpointDetected", endpoint.getRegAddress(), None, endpoint)
+
+
+    def moteStateChanged(self, mote):
+        """
+        Mote state changed
+
+        @param mote: Mote having changed
+        """
+        self._post("moteStateChanged", mote.address, None, mote)
+
+
+    def moteAddressChanged(self, mote, oldaddress=None):
+        """
+        Mote address changed. Later events about the mote keep going
+        through the worker serving its former address
+
+        @param mote: Mote having changed
+        @param oldaddress: Former mote address
+        """
+        if oldaddress is not None and len(self._workers) > 0:
+            self._lock.acquire()
+            self._routes[mote.address] = self._routes.pop(oldaddress, oldaddress % len(self._workers))
+            self._lock.release()
+        self._post("moteAddressChanged", mote.address, None, mote)
+
+
+    def registerValueChanged(self, register):
+        """
+        Register value changed
+
+        @param register: Register having changed
+        """
+        self._post("registerValueChanged", register.getAddress(), register, register)
+
+
+    def endpointValueChanged(self, endpoint):
+        """
+        Endpoint value changed
+
+        @param endpoint: Endpoint having changed
+        """
+        self._post("endpointValueChanged", endpoint.getRegAddress(), endpoint, endpoint)
+
+
+    def parameterValueChanged(self, parameter):
+        """
+        Configuration parameter changed
+
+        @param parameter: configuration parameter having changed
+        """
+        self._post("parameterValueChanged", parameter.getRegAddress(), parameter, parameter)
+
+
+    def _post(self, name, address, source, *args):
+        """
+        Queue event for delivery
+
+        @param name: Name of the callback method
+        @param address: Address of the mote the event is about
+        @param source: Object whose value changed, used for coalescing. None
+        for events never coalesced
+        @param args: Arguments passed to the callback
+        """
+        callback = getattr(self.handler, name, None)
+        if callback is None:
+            return
+        if len(self._workers) == 0:
+            self._deliver(callback, args)
+            return
+
+        worker = self._workers[self._routes.get(address, address % len(self._workers))]
+        key = None
+        if source is not None:
+            key = (name, id(source))
+        droppable = name in SwapEventBus._DROPPABLE
+        # [callback, arguments, coalescing key, queuing time, droppable]
+        event = [callback, args, key, time.time(), droppable]
+        self._lock.acquire()
+        try:
+            self.posted += 1
+            queue = worker["queue"]
+            pending = worker["pending"]
+            # Full queue. Events about new motes, endpoints and addresses are
+            # queued anyway
+            if len(queue) >= self._maxlen and droppable:
+                if self.overflow == SwapOverflow.COALESCE and key in pending:
+                    # Deliver the latest value in place of the one waiting
+                    pending[key][1] = args
+                    self.coalesced += 1
+                    return
+                self.dropped += 1
+                # Discard the oldest droppable event, or this one if none is queued
+                for i in range(len(queue)):
+                    if queue[i][4]:
+                        break
+                else:
+                    return
+                dropped = queue[i]
+                del queue[i]
+                if dropped[2] is not None and pending.get(dropped[2]) is dropped:
+                    del pending[dropped[2]]
+            queue.append(event)
+            if key is not None:
+                pending[key] = event
+            worker["cond"].notify()
+        finally:
+            self._lock.release()
+
+
+    def _work(self, worker):
+        """
+        Worker thread delivering events
+
+        @param worker: Worker dictionary
+        """
+        queue = worker["queue"]
+        pending = worker["pending"]
+        cond = worker["cond"]
+        while True:
+            self._lock.acquire()
+            try:
+                while len(queue) == 0 and self._go_on:
+                    cond.wait()
+                if len(queue) == 0:
+                    worker["running"] = False
+                    return
+                event = queue.popleft()
+                if event[2] is not None and pending.get(event[2]) is event:
+                    del pending[event[2]]
+                if time.time() - event[3] > SwapEventBus.delay_threshold:
+                    self.delayed += 1
+            finally:
+                self._lock.release()
+
+            try:
+                self._deliver(event[0], event[1])
+            except Exception as ex:
+                print "Exception in event callback", event[0].__name__ + ":", ex
+            self._lock.acquire()
+            self.delivered += 1
+            self._lock.release()
+
+
+    def _deliver(self, callback, args):
+        """
+        Call event handler, timing it if metrics are enabled
+
+        @param callback: Callback method
+        @param args: Arguments passed to the callback
+        """
+        if self._metrics is None:
+            callback(*args)
+            return
+        start = time.time()
+        try:
+            callback(*args)
+        finally:
+            self._metrics.observe("swap_callback_seconds", time.time() - start,
+                                  {"callback": callback.__name__})
+
+
+    def get_stats(self):
+        """
+        Return event counters
+
+        @return dictionary with the amount of events posted, delivered,
+        dropped, coalesced, delayed and currently queued
+        """
+        self._lock.acquire()
+        try:
+            return {"posted": self.posted,
+                    "delivered": self.delivered,
+                    "dropped": self.dropped,
+                    "coalesced": self.coalesced,
+                    "delayed": self.delayed,
+                    "queued": sum(len(worker["queue"]) for worker in self._workers)}
+        finally:
+            self._lock.release()
+
+
+    def start(self):
+        """
+        Start workers. Workers stopped before are started again
+        """
+        self._lock.acquire()
+        try:
+            self._go_on = True
+            for worker in self._workers:
+                if not worker["running"]:
+                    worker["thread"] = threading.Thread(target=self._work, args=(worker,))
+                    worker["thread"].daemon = True
+                    worker["running"] = True
+                    worker["thread"].start()
+        finally:
+            self._lock.release()
+
+
+    def stop(self, timeout=5.0):
+        """
+        Stop workers once the events queued are delivered
+
+        @param timeout: Maximum waiting time in seconds
+        """
+        self._lock.acquire()
+        self._go_on = False
+        for worker in self._workers:
+            worker["cond"].notify()
+        self._lock.release()
+        for worker in self._workers:
+            if worker["thread"] is not threading.current_thread():
+                worker["thread"].join(timeout)
+
+
+    def __init__(self, handler, workers=1, maxsize=1000, overflow=SwapOverflow.DROP_OLDEST, metrics=None):
+        """
+        Class constructor
+
+        @param handler: Object providing the callbacks (see SwapInterface)
+        @param workers: Amount of worker threads. Callbacks are called
+        directly from the producing thread if 0
+        @param maxsize: Maximum amount of events queued, shared among workers.
+        Only value change and packet events are discarded beyond it
+        @param overflow: Policy applied when the queue is full (see SwapOverflow)
+        @param metrics: SwapMetrics object timing the callbacks. None to disable
+        """
+        if overflow not in (SwapOverflow.DROP_OLDEST, SwapOverflow.COALESCE):
+            raise SwapException("Unknown event overflow policy: " + str(overflow))
+        ## Object providing the callbacks
+        self.handler = handler
+        ## Overflow policy
+        self.overflow = overflow
+        ## Amount of events queued
+        self.posted = 0
+        ## Amount of events passed to the callbacks
+        self.delivered = 0
+        ## Amount of events discarded because of a full queue
+        self.dropped = 0
+        ## Amount of events merged into a newer one because of a full queue
+        self.coalesced = 0
+        ## Amount of events waiting longer than delay_threshold
+        self.delayed = 0
+        # Callback execution times
+        self._metrics = metrics
+        if metrics is not None:
+            metrics.histogram("swap_callback_seconds", "Execution time of the event handler callbacks")
+        # Guards queues and counters
+        self._lock = threading.Lock()
+        # Workers keep running while True
+        self._go_on = True
+        # Worker index per mote address, for motes that changed their address
+        self._routes = {}
+        # Maximum amount of events per worker
+        self._maxlen = max(maxsize / max(workers, 1), 1)
+        # One dictionary per worker: queue of events, events waiting per
+        # coalescing key, condition signaling new events, thread and whether
+        # the thread is running
+        self._workers = []
+        for i in range(workers):
+            self._workers.append({"queue": collections.deque(), "pending": {},
+                                  "cond": threading.Condition(self._lock), "thread": None, "running": False})
+        self.start()
@@ -166,7 +166,6 @@ class SwapInterface:
     def queryMoteRegister(self, mote, regId):
         """
         Query mote register, wait for response and return value
-        Non re-entrant method!!
         
         @param mote: Mote to be queried
         @param regID: Register ID
@@ -176,6 +175,18 @@ class SwapInterface:
         return self.server.queryMoteRegister(mote, regId)
 
 
+    def query_many(self, queries, window=8):
+        """
+        Query several registers with up to window queries in flight
+        
+        @param queries: Sequence of (mote, register ID) tuples
+        @param window: Maximum amount of queries waiting for response
+        
+        @return dictionary of register values indexed by (mote, register ID)
+        """
+        return self.server.query_many(queries, window)
+
+
     def create_server(self):
         """
         Create server object
@@ -208,15 +219,7 @@ class SwapInterface:
         
         @return endpoint object
         """    
-        for mote in self.network.motes:
-            for register in mote.regular_registers:
-                for endpoint in register.parameters:
-                    if endpid is not None:
-                        if endpid == endpoint.id:
-                            return endpoint
-                    elif name == endpoint.name and location == endpoint.location:
-                        return endpoint
-        return None
+        return self.network.get_endpoint(location, name, endpid)
 
 
     def update_definition_files(self):
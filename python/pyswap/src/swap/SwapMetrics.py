@@ -0,0 +1,453 @@
+#########################################################################
+#
+# SwapMetrics
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from SwapException import SwapException
+
+import BaseHTTPServer
+import bisect
+import cProfile
+import pstats
+import threading
+
+
+class SwapMetrics(object):
+    """
+    Counters, gauges and histograms describing the activity of the SWAP
+    server. Every sample can carry labels. Exported in the Prometheus text
+    format
+    """
+    ## Default upper bounds of the histogram buckets, in seconds
+    bounds = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+    def counter(self, name, description):
+        """
+        Declare counter. Counters only go up
+
+        @param name: Metric name
+        @param description: Help text
+        """
+        self._declare(name, "counter", description)
+
+
+    def gauge(self, name, description):
+        """
+        Declare gauge. Gauges hold the latest value set
+
+        @param name: Metric name
+        @param description: Help text
+        """
+        self._declare(name, "gauge", description)
+
+
+    def histogram(self, name, description, bounds=None):
+        """
+        Declare histogram
+
+        @param name: Metric name
+        @param description: Help text
+        @param bounds: Upper bounds of the buckets. SwapMetrics.bounds if None
+        """
+        if bounds is None:
+            bounds = SwapMetrics.bounds
+        self._declare(name, "histogram", description, sorted(bounds))
+
+
+    def _declare(self, name, mtype, description, bounds=None):
+        """
+        Declare metric. Declaring the same metric again has no effect
+
+        @param name: Metric name
+        @param mtype: "counter", "gauge" or "histogram"
+        @param description: Help text
+        @param bounds: Upper bounds of the histogram buckets
+        """
+        self._lock.acquire()
+        try:
+            family = self._families.get(name)
+            if family is not None:
+                if family["type"] != mtype:
+                    raise SwapException("Metric " + name + " already declared as " + family["type"])
+                return
+            self._families[name] = {"type": mtype, "help": description, "bounds": bounds, "samples": {}}
+            self._names.append(name)
+        finally:
+            self._lock.release()
+
+
+    def _family(self, name):
+        """
+        Return declared metric. Called with the lock held
+
+        @param name: Metric name
+        """
+        family = self._families.get(name)
+        if family is None:
+            raise SwapException("Metric " + name + " not declared")
+        return family
+
+
+    @staticmethod
+    def _key(labels):
+        """
+        Return hashable key from a dictionary of labels
+        """
+        if not labels:
+            return ()
+        if len(labels) == 1:
+            # Most common case, no sorting needed
+            for key, value in labels.iteritems():
+                return ((key, str(value)),)
+        return tuple(sorted((str(key), str(value)) for key, value in labels.iteritems()))
+
+
+    def inc(self, name, labels=None, amount=1):
+        """
+        Increase counter
+
+        @param name: Metric name
+        @param labels: Dictionary of labels
+        @param amount: Amount added to the counter
+        """
+        key = SwapMetrics._key(labels)
+        self._lock.acquire()
+        try:
+            samples = self._family(name)["samples"]
+            samples[key] = samples.get(key, 0) + amount
+        finally:
+            self._lock.release()
+
+
+    def set(self, name, value, labels=None):
+        """
+        Set value of a gauge, or of a counter kept somewhere else
+
+        @param name: Metric name
+        @param value: New value
+        @param labels: Dictionary of labels
+        """
+        key = SwapMetrics._key(labels)
+        self._lock.acquire()
+        try:
+            self._family(name)["samples"][key] = value
+        finally:
+            self._lock.release()
+
+
+    def observe(self, name, value, labels=None):
+        """
+        Add sample to a histogram
+
+        @param name: Metric name
+        @param value: Observed value
+        @param labels: Dictionary of labels
+        """
+        key = SwapMetrics._key(labels)
+        self._lock.acquire()
+        try:
+            family = self._family(name)
+            bounds = family["bounds"]
+            # [count per bucket, amount of samples, sum of samples]
+            sample = family["samples"].get(key)
+            if sample is None:
+                sample = [[0] * (len(bounds) + 1), 0, 0.0]
+                family["samples"][key] = sample
+            # First bucket whose upper bound is not below the value
+            sample[0][bisect.bisect_left(bounds, value)] += 1
+            sample[1] += 1
+            sample[2] += value
+        finally:
+            self._lock.release()
+
+
+    def add_collector(self, collector):
+        """
+        Add function refreshing metrics right before every export. Meant for
+        values kept by other objects
+
+        @param collector: Function taking no arguments
+        """
+        self._collectors.append(collector)
+
+
+    def _collect(self):
+        """
+        Run collectors
+        """
+        for collector in self._collectors:
+            try:
+                collector()
+            except SwapException as ex:
+                ex.display()
+
+
+    def dumps(self):
+        """
+        Serialize metrics
+
+        @return dictionary of metrics indexed by name. Each metric is a list
+        of {"labels", "value"} dictionaries. Histogram values are given as
+        {"buckets", "count", "sum"} dictionaries, with non-cumulative
+        buckets indexed by upper bound
+        """
+        self._collect()
+        data = {}
+        self._lock.acquire()
+        try:
+            for name in self._names:
+                family = self._families[name]
+                samples = []
+                for key in sorted(family["samples"]):
+                    value = family["samples"][key]
+                    if family["type"] == "histogram":
+                        labels = [str(bound) for bound in family["bounds"]] + ["inf"]
+                        value = {"buckets": dict(zip(labels, value[0])), "count": value[1], "sum": value[2]}
+                    samples.append({"labels": dict(key), "value": value})
+                data[name] = samples
+        finally:
+            self._lock.release()
+        return data
+
+
+    @staticmethod
+    def _labels(key, extra=None):
+        """
+        Format labels in the Prometheus text format
+
+        @param key: Labels as returned by _key
+        @param extra: (name, value) tuple appended to the labels
+        """
+        items = list(key)
+        if extra is not None:
+            items.append(extra)
+        if len(items) == 0:
+            return ""
+        escaped = []
+        for (name, value) in items:
+            value = value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+            escaped.append(name + "=\"" + value + "\"")
+        return "{" + ",".join(escaped) + "}"
+
+
+    def prometheus(self):
+        """
+        Export metrics in the Prometheus text format (version 0.0.4)
+
+        @return metrics in string format
+        """
+        self._collect()
+        lines = []
+        self._lock.acquire()
+        try:
+            for name in self._names:
+                family = self._families[name]
+                lines.append("# HELP " + name + " " + family["help"])
+                lines.append("# TYPE " + name + " " + family["type"])
+                for key in sorted(family["samples"]):
+                    value = family["samples"][key]
+                    if family["type"] != "histogram":
+                        lines.append(name + SwapMetrics._labels(key) + " " + repr(value))
+                        continue
+                    (buckets, count, total) = value
+                    cumulative = 0
+                    for i, bound in enumerate(family["bounds"]):
+                        cumulative += buckets[i]
+                        lines.append(name + "_bucket" + SwapMetrics._labels(key, ("le", repr(float(bound)))) +
+                                     " " + str(cumulative))
+                    lines.append(name + "_bucket" + SwapMetrics._labels(key, ("le", "+Inf")) + " " + str(count))
+                    lines.append(name + "_sum" + SwapMetrics._labels(key) + " " + repr(total))
+                    lines.append(name + "_count" + SwapMetrics._labels(key) + " " + str(count))
+        finally:
+            self._lock.release()
+        return "\n".join(lines) + "\n"
+
+
+    def __init__(self):
+        """
+        Class constructor
+        """
+        # Metrics indexed by name: type, help text, histogram bounds and
+        # samples indexed by labels
+        self._families = {}
+        # Metric names in declaration order
+        self._names = []
+        # Functions refreshing metrics before exporting them
+        self._collectors = []
+        # Guards metrics
+        self._lock = threading.Lock()
+
+
+class SwapMetricsServer(threading.Thread):
+    """
+    HTTP server exporting metrics to Prometheus under /metrics
+    """
+    class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        """
+        HTTP request handler
+        """
+        def do_GET(self):
+            """
+            Serve metrics
+            """
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            try:
+                body = self.server.metrics.prometheus()
+            except SwapException as ex:
+                self.send_error(500, ex.description)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+
+        def log_message(self, format, *args):
+            """
+            Do not log every scrape
+            """
+            pass
+
+
+    def run(self):
+        """
+        Serve requests until stopped
+        """
+        self._httpd.serve_forever(poll_interval=0.5)
+
+
+    def stop(self):
+        """
+        Stop HTTP server
+        """
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+    def __init__(self, metrics, port, address="127.0.0.1"):
+        """
+        Class constructor. Call start() to begin serving
+
+        @param metrics: SwapMetrics object
+        @param port: TCP port
+        @param address: Local address. Loopback interface by default
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        try:
+            self._httpd = BaseHTTPServer.HTTPServer((address, port), SwapMetricsServer._Handler)
+        except IOError as ex:
+            raise SwapException("Unable to export metrics on port " + str(port) + ": " + str(ex))
+        self._httpd.metrics = metrics
+
+
+class SwapProfiler(object):
+    """
+    cProfile statistics of the calls made through this object. cProfile
+    only follows the thread enabling it, so calls are profiled one at a
+    time on the calling thread. Only one call out of every sample calls is
+    profiled, keeping the overhead low
+    """
+    def call(self, function, *args):
+        """
+        Call function, profiling it if due
+
+        @param function: Function to be called
+        @param args: Arguments passed to the function
+
+        @return value returned by the function
+        """
+        self._lock.acquire()
+        self._calls += 1
+        due = self._calls % self.sample == 0 and not self._busy
+        if due:
+            self._busy = True
+        self._lock.release()
+        if not due:
+            return function(*args)
+        try:
+            self._profile.enable()
+            try:
+                return function(*args)
+            finally:
+                self._profile.disable()
+        finally:
+            self._lock.acquire()
+            self.profiled += 1
+            self._busy = False
+            self._lock.release()
+
+
+    def stats(self):
+        """
+        Return statistics collected so far
+
+        @return pstats.Stats object
+        """
+        self._lock.acquire()
+        try:
+            return pstats.Stats(self._profile)
+        finally:
+            self._lock.release()
+
+
+    def dump(self, filename):
+        """
+        Save statistics collected so far in a file readable with pstats
+
+        @param filename: Path to the file
+        """
+        self._lock.acquire()
+        try:
+            self._profile.dump_stats(filename)
+        except IOError as ex:
+            raise SwapException("Unable to save profile in " + filename + ": " + str(ex))
+        finally:
+            self._lock.release()
+
+
+    def __init__(self, sample=1):
+        """
+        Class constructor
+
+        @param sample: Profile one call out of every sample calls
+        """
+        ## Profile one call out of every sample calls
+        self.sample = max(int(sample), 1)
+        ## Amount of calls profiled
+        self.profiled = 0
+        # Amount of calls made
+        self._calls = 0
+        # True while a call is being profiled
+        self._busy = False
+        # Profiler
+        self._profile = cProfile.Profile()
+        # Guards counters
+        self._lock = threading.Lock()
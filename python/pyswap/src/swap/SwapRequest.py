@@ -0,0 +1,602 @@
+#########################################################################
+#
+# SwapRequest
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from aio.SwapFuture import SwapFuture
+from SwapException import SwapException
+
+import collections
+import threading
+import time
+
+
+class LatencyHistogram(object):
+    """
+    Histogram of response times
+    """
+    ## Upper bounds of the buckets in milliseconds
+    bounds = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+    def add(self, latency):
+        """
+        Record sample
+
+        @param latency: Response time in seconds
+        """
+        millis = latency * 1000
+        for i, bound in enumerate(LatencyHistogram.bounds):
+            if millis <= bound:
+                break
+        else:
+            i = len(LatencyHistogram.bounds)
+        self.buckets[i] += 1
+        self.count += 1
+        self.total += latency
+        if self.min is None or latency < self.min:
+            self.min = latency
+        if self.max is None or latency > self.max:
+            self.max = latency
+
+
+    def dumps(self):
+        """
+        Serialize histogram
+
+        @return dictionary. Times are given in milliseconds
+        """
+        data = {}
+        data["count"] = self.count
+        if self.count > 0:
+            data["avg"] = self.total * 1000 / self.count
+            data["min"] = self.min * 1000
+            data["max"] = self.max * 1000
+        labels = [str(bound) for bound in LatencyHistogram.bounds] + ["inf"]
+        data["buckets"] = dict(zip(labels, self.buckets))
+        return data
+
+
+    def __init__(self):
+        """
+        Class constructor
+        """
+        ## Amount of samples per bucket. The last one has no upper bound
+        self.buckets = [0] * (len(LatencyHistogram.bounds) + 1)
+        ## Amount of samples
+        self.count = 0
+        ## Sum of samples in seconds
+        self.total = 0.0
+        ## Shortest response time in seconds
+        self.min = None
+        ## Longest response time in seconds
+        self.max = None
+
+
+class RttEstimator(object):
+    """
+    Round-trip time estimator of a mote. Smoothed mean and variance
+    giving the retransmission timeout, as done by TCP (RFC 6298)
+    """
+    ## Timeout (in seconds) per try until the first sample is taken
+    initial_rto = 2.0
+    ## Lower bound of the timeout in seconds
+    min_rto = 0.1
+    ## Upper bound of the timeout in seconds
+    max_rto = 10.0
+    # Gain of the smoothed mean
+    _ALPHA = 0.125
+    # Gain of the mean deviation
+    _BETA = 0.25
+
+
+    def add(self, rtt):
+        """
+        Record sample
+
+        @param rtt: Round-trip time in seconds. Only responses to requests
+        transmitted once are unambiguous (Karn's algorithm)
+        """
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar += RttEstimator._BETA * (abs(self.srtt - rtt) - self.rttvar)
+            self.srtt += RttEstimator._ALPHA * (rtt - self.srtt)
+        self.samples += 1
+        self.rto = min(max(self.srtt + 4 * self.rttvar, RttEstimator.min_rto), RttEstimator.max_rto)
+
+
+    def dumps(self):
+        """
+        Serialize estimator
+
+        @return dictionary. Times are given in milliseconds
+        """
+        data = {}
+        data["samples"] = self.samples
+        data["rto"] = self.rto * 1000
+        if self.srtt is not None:
+            data["srtt"] = self.srtt * 1000
+            data["rttvar"] = self.rttvar * 1000
+        return data
+
+
+    def __init__(self):
+        """
+        Class constructor
+        """
+        ## Smoothed round-trip time in seconds
+        self.srtt = None
+        ## Round-trip time variation in seconds
+        self.rttvar = None
+        ## Retransmission timeout in seconds
+        self.rto = RttEstimator.initial_rto
+        ## Amount of samples
+        self.samples = 0
+
+
+class SwapRequest(SwapFuture):
+    """
+    Command or query waiting for its STATUS response
+    """
+    def matches(self, status):
+        """
+        Check whether a STATUS packet answers this request
+
+        @param status: SWAP status packet received
+
+        @return True if the packet answers this request
+        """
+        if self.expected is None:
+            return True
+        return self.expected.isEqual(status.value)
+
+
+    def __init__(self, address, regid, expected=None):
+        """
+        Class constructor
+
+        @param address: Register address
+        @param regid: Register ID
+        @param expected: Register value expected as ACK. None for queries
+        """
+        SwapFuture.__init__(self)
+        ## (register address, register ID) tuple
+        self.key = (address, regid)
+        ## Expected register value (SwapValue). None for queries
+        self.expected = expected
+        ## Result set when no response is received: False for commands, None for queries
+        self.failed = None
+        if expected is not None:
+            self.failed = False
+        ## Amount of transmissions
+        self.tries = 0
+        ## Time stamp of the last transmission
+        self.sent = None
+        ## Retry timer
+        self.timer = None
+
+
+class SwapPendingTable(object):
+    """
+    Requests in flight, indexed by register address and ID
+    """
+    def add(self, request):
+        """
+        Add request to the table
+
+        @param request: SwapRequest object
+        """
+        self._lock.acquire()
+        self._requests.setdefault(request.key, []).append(request)
+        self._lock.release()
+
+
+    def remove(self, request):
+        """
+        Remove request from the table
+
+        @param request: SwapRequest object
+        """
+        self._lock.acquire()
+        requests = self._requests.get(request.key)
+        if requests is not None and request in requests:
+            requests.remove(request)
+            if len(requests) == 0:
+                del self._requests[request.key]
+        self._lock.release()
+
+
+    def clear(self):
+        """
+        Remove every request from the table, completing them as failed
+        """
+        self._lock.acquire()
+        requests = self._requests
+        self._requests = {}
+        self._lock.release()
+        for group in requests.values():
+            for request in group:
+                if request.timer is not None:
+                    request.timer.cancel()
+                request.set_result(request.failed)
+
+
+    def resolve(self, status):
+        """
+        Complete every request answered by a STATUS packet
+
+        @param status: SWAP status packet received
+        """
+        key = (status.regAddress, status.regId)
+        answered = []
+        self._lock.acquire()
+        requests = self._requests.get(key)
+        if requests is not None:
+            for request in requests:
+                if request.matches(status):
+                    answered.append(request)
+            for request in answered:
+                requests.remove(request)
+            if len(requests) == 0:
+                del self._requests[key]
+        self._lock.release()
+
+        now = time.time()
+        for request in answered:
+            if request.timer is not None:
+                request.timer.cancel()
+            if request.sent is not None:
+                self._record(status.regAddress, now - request.sent, request.tries == 1)
+            if request.expected is None:
+                request.set_result(status.value)
+            else:
+                request.set_result(True)
+
+
+    def _record(self, address, latency, rtt=False):
+        """
+        Record response time of a mote
+
+        @param address: Mote address
+        @param latency: Response time in seconds
+        @param rtt: Feed the round-trip time estimator too if True
+        """
+        self._lock.acquire()
+        histogram = self._latency.get(address)
+        if histogram is None:
+            histogram = LatencyHistogram()
+            self._latency[address] = histogram
+        histogram.add(latency)
+        if rtt:
+            estimator = self._rtt.get(address)
+            if estimator is None:
+                estimator = RttEstimator()
+                self._rtt[address] = estimator
+            estimator.add(latency)
+        self._lock.release()
+
+
+    def get_rto(self, address):
+        """
+        Return retransmission timeout of a mote
+
+        @param address: Mote address
+
+        @return timeout in seconds. None if the mote was not measured yet
+        """
+        estimator = self._rtt.get(address)
+        if estimator is None:
+            return None
+        return estimator.rto
+
+
+    def get_rtt_stats(self, address=None):
+        """
+        Return round-trip time estimations
+
+        @param address: Mote address. None for all motes
+
+        @return estimator dictionary for the given mote, or dictionary of
+        estimators indexed by mote address
+        """
+        self._lock.acquire()
+        try:
+            if address is not None:
+                estimator = self._rtt.get(address)
+                if estimator is None:
+                    return None
+                return estimator.dumps()
+            return dict((addr, estimator.dumps()) for addr, estimator in self._rtt.items())
+        finally:
+            self._lock.release()
+
+
+    def get_latency_stats(self, address=None):
+        """
+        Return response time histograms
+
+        @param address: Mote address. None for all motes
+
+        @return histogram dictionary for the given mote, or dictionary of
+        histograms indexed by mote address
+        """
+        self._lock.acquire()
+        try:
+            if address is not None:
+                histogram = self._latency.get(address)
+                if histogram is None:
+                    return None
+                return histogram.dumps()
+            return dict((addr, histogram.dumps()) for addr, histogram in self._latency.items())
+        finally:
+            self._lock.release()
+
+
+    def __len__(self):
+        """
+        Amount of requests in flight
+        """
+        self._lock.acquire()
+        count = sum(len(requests) for requests in self._requests.values())
+        self._lock.release()
+        return count
+
+
+    def __init__(self):
+        """
+        Class constructor
+        """
+        # Lists of requests per (register address, register ID)
+        self._requests = {}
+        # Response time histograms per mote address
+        self._latency = {}
+        # Round-trip time estimators per mote address
+        self._rtt = {}
+        # Guards requests and histograms
+        self._lock = threading.Lock()
+
+
+class SwapQueuedCommand(object):
+    """
+    Register value waiting in a SwapCommandQueue
+    """
+    def __init__(self, value, deadline):
+        """
+        Class constructor
+
+        @param value: New register value (SwapValue)
+        @param deadline: Time after which the command fails
+        """
+        ## New register value
+        self.value = value
+        ## Time after which the command fails
+        self.deadline = deadline
+        ## SwapRequest objects completed along with this command. Earlier
+        ## writes to the same register are coalesced into the latest one
+        self.waiters = []
+
+
+class SwapCommandQueue(object):
+    """
+    Commands held until their mote listens. Power-down motes only listen
+    right after transmitting or while in SYNC mode. Queued commands are
+    sent back-to-back when that happens
+    """
+    ## Seconds a queued command waits for its mote before failing
+    expiry = 600.0
+
+
+    def push(self, address, regid, value, expiry=None):
+        """
+        Queue command. A command already queued for the same register is
+        replaced and completes along with the new one
+
+        @param address: Mote address
+        @param regid: Register ID
+        @param value: New register value (SwapValue)
+        @param expiry: Seconds before failing. SwapCommandQueue.expiry if None
+
+        @return SwapRequest object resolving to True once the command is
+        acknowledged or to False if it expires first
+        """
+        if expiry is None:
+            expiry = SwapCommandQueue.expiry
+        request = SwapRequest(address, regid, value)
+        command = SwapQueuedCommand(value, time.time() + expiry)
+        command.waiters.append(request)
+        self._lock.acquire()
+        try:
+            commands = self._queues.setdefault(address, collections.OrderedDict())
+            older = commands.pop(regid, None)
+            if older is not None:
+                # Only the latest value is sent
+                command.waiters[:0] = older.waiters
+            commands[regid] = command
+        finally:
+            self._lock.release()
+        self._timers.call_later(expiry, self._expire, address, regid, command)
+        return request
+
+
+    def wake(self, address):
+        """
+        Mote is listening. Send every command queued for it
+
+        @param address: Mote address
+        """
+        if address not in self._queues:
+            return
+        ready = []
+        self._lock.acquire()
+        try:
+            commands = self._queues.pop(address, None)
+            if commands is None:
+                return
+            for (regid, command) in commands.items():
+                # Wait for the previous write to the same register
+                if (address, regid) in self._inflight:
+                    continue
+                del commands[regid]
+                self._inflight[(address, regid)] = command
+                ready.append((regid, command))
+            if len(commands) > 0:
+                self._queues[address] = commands
+        finally:
+            self._lock.release()
+
+        for (regid, command) in ready:
+            self._transmit(address, regid, command)
+
+
+    def pending(self, address):
+        """
+        Return commands waiting for a mote
+
+        @param address: Mote address
+
+        @return list of (register ID, value) tuples, in sending order
+        """
+        self._lock.acquire()
+        try:
+            commands = self._queues.get(address)
+            if commands is None:
+                return []
+            return [(regid, command.value) for (regid, command) in commands.items()]
+        finally:
+            self._lock.release()
+
+
+    def clear(self):
+        """
+        Fail every queued command. Commands being sent fail along with their
+        SwapRequest
+        """
+        self._lock.acquire()
+        queues = self._queues
+        self._queues = {}
+        self._lock.release()
+        for commands in queues.values():
+            for command in commands.values():
+                for request in command.waiters:
+                    request.set_result(False)
+
+
+    def _transmit(self, address, regid, command):
+        """
+        Send queued command
+
+        @param address: Mote address
+        @param regid: Register ID
+        @param command: SwapQueuedCommand object
+        """
+        def sent(future):
+            acked = future.exception() is None and future.result() == True
+            self._sent(address, regid, command, acked)
+        try:
+            self._send(address, regid, command.value).add_done_callback(sent)
+        except SwapException as ex:
+            ex.display()
+            self._sent(address, regid, command, False)
+
+
+    def _sent(self, address, regid, command, acked):
+        """
+        Queued command transmitted. Put it back in the queue if not
+        acknowledged and not expired yet
+
+        @param address: Mote address
+        @param regid: Register ID
+        @param command: SwapQueuedCommand object
+        @param acked: True if the mote acknowledged the command
+        """
+        waiters = command.waiters
+        self._lock.acquire()
+        try:
+            del self._inflight[(address, regid)]
+            if not acked and time.time() < command.deadline:
+                commands = self._queues.get(address)
+                if commands is None:
+                    commands = collections.OrderedDict()
+                    self._queues[address] = commands
+                newer = commands.get(regid)
+                if newer is not None:
+                    # Superseded while being sent
+                    newer.waiters[:0] = waiters
+                else:
+                    commands[regid] = command
+                waiters = []
+        finally:
+            self._lock.release()
+
+        for request in waiters:
+            request.set_result(acked)
+
+
+    def _expire(self, address, regid, command):
+        """
+        Fail command if still queued
+
+        @param address: Mote address
+        @param regid: Register ID
+        @param command: SwapQueuedCommand object
+        """
+        self._lock.acquire()
+        try:
+            commands = self._queues.get(address)
+            if commands is None or commands.get(regid) is not command:
+                # Sent, being sent or superseded
+                return
+            del commands[regid]
+            if len(commands) == 0:
+                del self._queues[address]
+        finally:
+            self._lock.release()
+
+        for request in command.waiters:
+            request.set_result(False)
+
+
+    def __init__(self, timers, send):
+        """
+        Class constructor
+
+        @param timers: EventLoop running expiry timers
+        @param send: Function sending a command. Receives the mote address,
+        register ID and value and returns a future resolving to True once
+        the command is acknowledged
+        """
+        # Running expiry timers
+        self._timers = timers
+        # Command transmission function
+        self._send = send
+        # Queued commands per mote address, indexed by register ID
+        self._queues = {}
+        # Commands being sent, indexed by (mote address, register ID)
+        self._inflight = {}
+        # Guards queues
+        self._lock = threading.Lock()
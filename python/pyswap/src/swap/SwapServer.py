@@ -26,19 +26,27 @@ __author__="Daniel Berenguer"
 __date__ ="$Aug 20, 2011 10:36:00 AM$"
 #########################################################################
 
+from modem.ModemPool import ModemPool
 from modem.SerialModem import SerialModem
+from modem.SwapReplay import ReplayModem
 from protocol.SwapRegister import SwapRegister
-from protocol.SwapDefs import SwapFunction, SwapRegId
+from protocol.SwapDefs import SwapFunction, SwapRegId, SwapState
 from protocol.SwapPacket import SwapPacket, SwapQueryPacket, SwapStatusPacket
 from protocol.SwapMote import SwapMote
 from protocol.SwapNetwork import SwapNetwork
 from protocol.SwapValue import SwapValue
 from protocol.SmartEncrypt import Password
 from SwapException import SwapException
+from SwapEventBus import SwapEventBus
+from SwapMetrics import SwapMetrics, SwapMetricsServer, SwapProfiler
+from SwapRequest import SwapRequest, SwapPendingTable, SwapCommandQueue, RttEstimator
+from aio.EventLoop import EventLoop
 from xmltools.XmlSettings import XmlSettings
 from xmltools.XmlSerial import XmlSerial
 from xmltools.XmlNetwork import XmlNetwork
+from xmltools.XmlDevice import XmlDeviceDir
 
+import random
 import threading
 import time
 import urllib2
@@ -50,10 +58,12 @@ class SwapServer(threading.Thread):
     """
     SWAP server class
     """
-    # Maximum waiting time (in ms) for ACK's
-    _MAX_WAITTIME_ACK = 2000
     # Max tries for any SWAP command
     _MAX_SWAP_COMMAND_TRIES = 3
+    # Random variation applied to retransmission timeouts (fraction)
+    _RTO_JITTER = 0.2
+    # Function names used as metric labels
+    _FUNCTION_NAMES = {SwapFunction.STATUS: "status", SwapFunction.QUERY: "query", SwapFunction.COMMAND: "command"}
 
    
     def run(self):
@@ -61,6 +71,14 @@ class SwapServer(threading.Thread):
         Start SWAP server thread
         """       
         try:
+            # Timers are stopped along with the server. Start new ones on restart
+            if not self._timers.isAlive():
+                self._timers = EventLoop()
+                self._timers.start()
+                self._commands = SwapCommandQueue(self._timers, self._sendCommand)
+            # So are the event workers
+            self._eventHandler.start()
+
             # Network configuration settings
             self._xmlnetwork = XmlNetwork(self._xmlSettings.network_file)
             self.devaddress = self._xmlnetwork.devaddress
@@ -70,39 +88,39 @@ class SwapServer(threading.Thread):
             # Serial configuration settings
             self._xmlserial = XmlSerial(self._xmlSettings.serial_file)
         
-            # Create and start serial modem object
-            self.modem = SerialModem(self._xmlserial.port, self._xmlserial.speed, self.verbose)
+            # Create and start one serial modem per gateway
+            modems = []
+            try:
+                for port in self._xmlserial.ports:
+                    if port.startswith(ReplayModem.PREFIX):
+                        modem = ReplayModem(port, self.verbose)
+                    else:
+                        # One capture file per gateway
+                        capture = self._xmlserial.capture
+                        if capture is not None and len(modems) > 0:
+                            capture += "." + str(len(modems))
+                        modem = SerialModem(port, self._xmlserial.speed, self.verbose,
+                                            self._xmlserial.txrate, self._xmlserial.txburst, capture)
+                    modems.append(modem)
+                    self._configureModem(modem)
+            except:
+                for modem in modems:
+                    modem.stop()
+                raise
+
+            if len(modems) == 1:
+                self.modem = modems[0]
+            else:
+                self.modem = ModemPool(modems)
 
             # Declare receiving callback function
             self.modem.setRxCallback(self._ccPacketReceived)
-    
-            # Set modem configuration from _xmlnetwork
-            param_changed = False
-            # Device address
-            if self._xmlnetwork.devaddress is not None:
-                if self.modem.devaddress != self._xmlnetwork.devaddress:
-                    if self.modem.setDevAddress(self._xmlnetwork.devaddress) == False:
-                        raise SwapException("Unable to set modem's device address to " + self._xmlnetwork.devaddress)
-                    else:
-                        param_changed = True
-            # Device address
-            if self._xmlnetwork.network_id is not None:
-                if self.modem.syncword != self._xmlnetwork.network_id:
-                    if self.modem.setSyncWord(self._xmlnetwork.network_id) == False:
-                        raise SwapException("Unable to set modem's network ID to " + self._xmlnetwork.network_id)
-                    else:
-                        param_changed = True
-            # Frequency channel
-            if self._xmlnetwork.freq_channel is not None:
-                if self.modem.freq_channel != self._xmlnetwork.freq_channel:
-                    if self.modem.setFreqChannel(self._xmlnetwork.freq_channel) == False:
-                        raise SwapException("Unable to set modem's frequency channel to " + self._xmlnetwork.freq_channel)
-                    else:
-                        param_changed = True
-    
-            # Return to data mode if necessary
-            if param_changed == True:
-                self.modem.goToDataMode()
+
+            # Export metrics to Prometheus
+            if self._xmlSettings.metrics_port is not None and self._metrics_server is None:
+                self._metrics_server = SwapMetricsServer(self.metrics, self._xmlSettings.metrics_port,
+                                                         self._xmlSettings.metrics_address)
+                self._metrics_server.start()
                             
             self.is_running = True
             
@@ -118,6 +136,23 @@ class SwapServer(threading.Thread):
         threading.Thread.__init__(self)        
            
 
+    def _configureModem(self, modem):
+        """
+        Set modem configuration from the network settings. Every change is
+        applied within a single command-mode session
+        
+        @param modem: Serial modem
+        """
+        if not modem.configure(self._xmlnetwork.devaddress, self._xmlnetwork.network_id,
+                               self._xmlnetwork.freq_channel):
+            raise SwapException("Unable to set modem's address, network ID and channel to " +
+                                str(self._xmlnetwork.devaddress) + ", " + str(self._xmlnetwork.network_id) +
+                                " and " + str(self._xmlnetwork.freq_channel))
+        stats = getattr(modem, "getCommandStats", None)
+        if stats is not None and self.verbose:
+            print "Modem " + modem.portname + " spent " + str(round(stats()["time"], 3)) + " seconds in command mode"
+
+
     def stop(self):
         """
         Stop SWAP server
@@ -129,6 +164,23 @@ class SwapServer(threading.Thread):
         if self.modem is not None:
             self.modem.stop()
         self.is_running = False
+
+        # Stop timers. Requests and queued commands can no longer complete
+        self._timers.stop()
+        if self._timers is not threading.currentThread():
+            self._timers.join()
+        self._pending.clear()
+        self._commands.clear()
+        # Deferred publications were dropped along with the timers
+        (deferred, self._deferred) = (self._deferred, set())
+        for endpoint in deferred:
+            if endpoint.policy is not None:
+                endpoint.policy.cancel()
+
+        # Stop exporting metrics
+        if self._metrics_server is not None:
+            self._metrics_server.stop()
+            self._metrics_server = None
         
         # Save network data
         print "Saving network data..."
@@ -137,6 +189,9 @@ class SwapServer(threading.Thread):
             self.network.save()
         except SwapException:
             raise
+
+        # Deliver pending events
+        self._eventHandler.stop()
         
         threading.Thread.__init__(self)
 
@@ -151,7 +206,24 @@ class SwapServer(threading.Thread):
         
     def _ccPacketReceived(self, ccPacket):
         """
-        CcPacket received
+        CcPacket received. Dispatch it, under the profiler if enabled
+        
+        @param ccPacket: CcPacket received        
+        """
+        start = time.time()
+        try:
+            profiler = self._profiler
+            if profiler is None:
+                self._dispatchPacket(ccPacket)
+            else:
+                profiler.call(self._dispatchPacket, ccPacket)
+        finally:
+            self.metrics.observe("swap_dispatch_seconds", time.time() - start)
+
+
+    def _dispatchPacket(self, ccPacket):
+        """
+        Process CcPacket received
         
         @param ccPacket: CcPacket received        
         """
@@ -162,6 +234,11 @@ class SwapServer(threading.Thread):
             self._eventHandler.swapPacketReceived(swPacket)  
         except SwapException:
             return
+
+        # Counted here and exported by _collectMetrics, keeping the cost
+        # per packet low
+        self._rx_functions[swPacket.function] = self._rx_functions.get(swPacket.function, 0) + 1
+        self._rx_links[swPacket.srcAddress] = (swPacket.rssi, swPacket.lqi)
         
         # Check function code
         # STATUS packet received
@@ -177,7 +254,11 @@ class SwapServer(threading.Thread):
             # Product code received
             if swPacket.regId == SwapRegId.ID_PRODUCT_CODE:
                 try:
-                    mote = SwapMote(self, swPacket.value.toAsciiHex(), swPacket.srcAddress, swPacket.security, swPacket.nonce)
+                    product_code = swPacket.value.toAsciiHex()
+                    mote = self.network.get_mote(address=swPacket.srcAddress)
+                    # Only unknown motes or product changes need a new mote
+                    if mote is None or mote.product_code.lower() != product_code.lower():
+                        mote = SwapMote(self, product_code, swPacket.srcAddress, swPacket.security, swPacket.nonce)
                     mote.nonce = swPacket.nonce
                     self._checkMote(mote)
                 except IOError as ex:
@@ -199,6 +280,8 @@ class SwapServer(threading.Thread):
             else:
                 # Update register in the list of motes
                 self._updateRegisterValue(swPacket)
+            # The mote listens right after transmitting. Send queued commands
+            self._commands.wake(swPacket.srcAddress)
         # QUERY packet received
         elif swPacket.function == SwapFunction.QUERY:
             # Query addressed to our gateway?
@@ -219,11 +302,12 @@ class SwapServer(threading.Thread):
                     if self._xmlnetwork.security & 0x01:
                         # Check nonces
                         if mote.nonce != swPacket.nonce:
+                            self.metrics.inc("swap_nonce_mismatches_total")
                             # Nonce missmatch. Transmit correct nonce
                             self.send_nonce()
                             return               
                     # Send command packet to target mote
-                    self.setMoteRegister(mote, swPacket.regId, swPacket.value, sendack=True)
+                    self._relayCommand(mote, swPacket.regId, swPacket.value)
                     
 
     def _checkMote(self, mote):
@@ -235,19 +319,19 @@ class SwapServer(threading.Thread):
         # Add mote to the network
         if self.network.add_mote(mote):
             # Save mote in SWAP network file
-            self.network.save()
+            self.network.request_save()
             # Notify event handler about the discovery of a new mote
             if self._eventHandler.newMoteDetected is not None:
                 self._eventHandler.newMoteDetected(mote)
             # Notify the event handler about the discovery of new endpoints
-            for reg in mote.regular_registers:
+            for reg in mote.regular_registers or []:
                 for endp in reg.parameters:
                     if  self._eventHandler.newEndpointDetected is not None:
                         self._eventHandler.newEndpointDetected(endp)
                        
         if self._poll_regular_regs:
             # Query all individual registers owned by this mote
-            for reg in mote.regular_registers:
+            for reg in mote.regular_registers or []:
                 reg.sendSwapQuery()
             
             
@@ -264,10 +348,10 @@ class SwapServer(threading.Thread):
         # Get mote from list
         mote = self.network.get_mote(address=oldAddr)
         if mote is not None:
-            mote.address = newAddr
+            self.network.set_mote_address(mote, newAddr)
             # Notify address change to event handler
             if self._eventHandler.moteAddressChanged is not None:
-                self._eventHandler.moteAddressChanged(mote)
+                self._eventHandler.moteAddressChanged(mote, oldAddr)
 
 
     def _updateMoteState(self, packet):
@@ -314,6 +398,49 @@ class SwapServer(threading.Thread):
             mote.txinterval = interval
        
         
+    def _publishNow(self, endpoint):
+        """
+        Apply the publish policy of an endpoint whose value changed.
+        Deferred publications are scheduled on the timer loop
+        
+        @param endpoint: Endpoint having changed
+        
+        @return True if the change has to be notified now
+        """
+        if endpoint.policy is None:
+            return True
+        try:
+            value = endpoint.getValueInAscii()
+        except SwapException:
+            # Unable to apply the policy
+            return True
+        delay = endpoint.policy.offer(value, time.time())
+        if delay is None:
+            return False
+        if delay > 0:
+            self._deferred.add(endpoint)
+            self._timers.call_later(delay, self._publishDeferred, endpoint)
+            return False
+        return True
+
+
+    def _publishDeferred(self, endpoint):
+        """
+        Notify the latest value of an endpoint held back by its publish policy
+        
+        @param endpoint: Endpoint having changed
+        """
+        self._deferred.discard(endpoint)
+        try:
+            value = endpoint.getValueInAscii()
+        except SwapException as ex:
+            ex.display()
+            endpoint.policy.cancel()
+            return
+        if endpoint.policy.flush(value, time.time()):
+            self._eventHandler.endpointValueChanged(endpoint)
+
+
     def _updateRegisterValue(self, packet):
         """
         Update register value in the list of motes
@@ -323,51 +450,50 @@ class SwapServer(threading.Thread):
         # Get mote from list
         mote = self.network.get_mote(address=packet.regAddress)
         if mote is not None:
-            # Search within its list of regular registers
-            if mote.regular_registers is not None:
-                for reg in mote.regular_registers:
-                    # Same register ID?
-                    if reg.id == packet.regId:
-                        # Check if value changed and its length
-                        if reg.value is not None:
-                            if reg.value.isEqual(packet.value):
-                                return
-                            if packet.value is None:
-                                return
-                            if reg.getLength() != packet.value.getLength():
-                                return
-
-                        # Save new register value
-                        reg.setValue(packet.value)
-                        # Notify register'svalue change to event handler
-                        if self._eventHandler.registerValueChanged is not None:
-                            self._eventHandler.registerValueChanged(reg)
-                        # Notify endpoint's value change to event handler
-                        if self._eventHandler.endpointValueChanged is not None:
-                            # Has any of the endpoints changed?
-                            for endp in reg.parameters:
-                                if endp.valueChanged == True:
-                                    self._eventHandler.endpointValueChanged(endp)
+            # Regular register?
+            reg = mote.getRegister(packet.regId, config=False)
+            if reg is not None:
+                # Check if value changed and its length
+                if reg.value is not None:
+                    if reg.value.isEqual(packet.value):
+                        return
+                    if packet.value is None:
                         return
-            # Search within its list of config registers
-            if mote.config_registers is not None:
-                for reg in mote.config_registers:
-                    # Same register ID?
-                    if reg.id == packet.regId:
-                        # Did register's value change?
-                        if not reg.value.isEqual(packet.value):
-                            # Save new register value
-                            reg.setValue(packet.value)
-                            # Notify register'svalue change to event handler
-                            if self._eventHandler.registerValueChanged is not None:
-                                self._eventHandler.registerValueChanged(reg)
-                            # Notify parameter's value change to event handler
-                            if self._eventHandler.parameterValueChanged is not None:
-                                # Has any of the endpoints changed?
-                                for param in reg.parameters:
-                                    if param.valueChanged == True:
-                                        self._eventHandler.parameterValueChanged(param)
-                            return
+                    if reg.getLength() != packet.value.getLength():
+                        return
+
+                # Save new register value
+                reg.setValue(packet.value)
+                self.network.update_register(reg)
+                # Endpoints changed and due for publication
+                changed = [endp for endp in reg.parameters if endp.valueChanged == True]
+                published = [endp for endp in changed if self._publishNow(endp)]
+                # Notify register'svalue change to event handler, unless every
+                # change is being held back by publish policies
+                if self._eventHandler.registerValueChanged is not None:
+                    if len(published) > 0 or len(changed) == 0:
+                        self._eventHandler.registerValueChanged(reg)
+                # Notify endpoint's value change to event handler
+                if self._eventHandler.endpointValueChanged is not None:
+                    for endp in published:
+                        self._eventHandler.endpointValueChanged(endp)
+                return
+            # Configuration register?
+            reg = mote.getRegister(packet.regId, config=True)
+            if reg is not None:
+                # Did register's value change?
+                if not reg.value.isEqual(packet.value):
+                    # Save new register value
+                    reg.setValue(packet.value)
+                    # Notify register'svalue change to event handler
+                    if self._eventHandler.registerValueChanged is not None:
+                        self._eventHandler.registerValueChanged(reg)
+                    # Notify parameter's value change to event handler
+                    if self._eventHandler.parameterValueChanged is not None:
+                        # Has any of the endpoints changed?
+                        for param in reg.parameters:
+                            if param.valueChanged == True:
+                                self._eventHandler.parameterValueChanged(param)
             return
 
 
@@ -378,18 +504,8 @@ class SwapServer(threading.Thread):
 
         @param status: SWAP packet to extract the information from
         """
-        # Check possible command ACK
-        if (self._expectedAck is not None) and (status.function == SwapFunction.STATUS):
-            if status.regAddress == self._expectedAck.regAddress:
-                if status.regId == self._expectedAck.regId:
-                    self._packetAcked = self._expectedAck.value.isEqual(status.value) 
-
-        # Check possible response to a precedent query
-        self._valueReceived = None
-        if (self._expectedRegister is not None) and (status.function == SwapFunction.STATUS):
-            if status.regAddress == self._expectedRegister.getAddress():
-                if status.regId == self._expectedRegister.id:
-                    self._valueReceived = status.value
+        # Complete commands and queries answered by this packet
+        self._pending.resolve(status)
 
         # Update security option and nonce in list
         mote = self.network.get_mote(address=status.srcAddress)
@@ -406,6 +522,7 @@ class SwapServer(threading.Thread):
                     if upper_limit > 0xFF:
                         upper_limit -= 0x100
                     if not (lower_limit <= status.nonce <= upper_limit):
+                        self.metrics.inc("swap_nonce_mismatches_total")
                         raise SwapException("Mote " + str(mote.address) + ": anti-playback nonce missmatch. Possible attack!")
                 
             mote.security = status.security
@@ -466,124 +583,400 @@ class SwapServer(threading.Thread):
         status.send(self)
 
 
-    def setMoteRegister(self, mote, regid, value, sendack=False):
+    def setMoteRegister(self, mote, regid, value, sendack=False, timeout=None, tries=None):
         """
         Set new register value on wireless mote
-        Non re-entrant method!!
 
         @param mote: Mote containing the register
         @param regid: Register ID
         @param value: New register value
         @param sendack; Send status message from server
+        @param timeout: Maximum waiting time (in ms) for the ACK per try
+        @param tries: Max tries
 
-        @return True if the command is correctly ack'ed. Return False otherwise
+        @return True if the command is correctly ack'ed. Return False otherwise.
+        Power-down motes only ack commands received while listening. Use
+        queue_command to wait for them to listen
+        """
+        request = SwapRequest(mote.address, regid, value)
+        def send():
+            mote.cmdRegister(regid, value)
+        self._sendRequest(request, send, timeout, tries)
+        # Wait for aknowledgement from mote
+        if not request.result():
+            return False        # Got no ACK from mote
+        if sendack:
+            # Send status message
+            self.send_status(mote, regid)
+        return True             # ACK received
+
+
+    def _relayCommand(self, mote, regid, value):
+        """
+        Pass command addressed to our gateway on to its mote and send the
+        status message once acknowledged. Called from the reception thread,
+        which must not wait for the ACK since it is the one receiving it
+
+        @param mote: Mote containing the register
+        @param regid: Register ID
+        @param value: New register value
+        """
+        def acked(request):
+            if request.result():
+                self.send_status(mote, regid)
+        self.queue_command(mote, regid, value, callback=acked)
+
+
+    def queue_command(self, mote, regid, value, expiry=None, callback=None):
+        """
+        Queue command until the mote listens. Power-down motes listen right
+        after transmitting and while in SYNC mode. Commands to other motes
+        are sent at once. A command already queued for the same register is
+        replaced by this one
+
+        @param mote: Mote containing the register
+        @param regid: Register ID
+        @param value: New register value
+        @param expiry: Seconds before giving up. SwapCommandQueue.expiry if None
+        @param callback: Function receiving the returned request once complete
+
+        @return SwapRequest object resolving to True once the command is
+        acknowledged or to False if it expires first or the server is stopped
+        """
+        if not self.is_running:
+            request = SwapRequest(mote.address, regid, value)
+            request.set_result(False)
+            if callback is not None:
+                request.add_done_callback(callback)
+            return request
+        request = self._commands.push(mote.address, regid, value, expiry)
+        if callback is not None:
+            request.add_done_callback(callback)
+        if not self._isSleeping(mote):
+            self._commands.wake(mote.address)
+        return request
+
+
+    def get_queued_commands(self, mote):
+        """
+        Return commands waiting for a mote to listen
+
+        @param mote: SWAP mote
+
+        @return list of (register ID, value) tuples, in sending order
+        """
+        return self._commands.pending(mote.address)
+
+
+    def _isSleeping(self, mote):
+        """
+        Check whether a mote is unable to receive commands at this moment
+
+        @param mote: SWAP mote
+
+        @return True for power-down motes out of SYNC mode
+        """
+        return mote.pwrdownmode and mote.state not in (SwapState.SYNC, SwapState.RXON)
+
+
+    def _sendCommand(self, address, regid, value):
+        """
+        Send command on behalf of the command queue
+
+        @param address: Mote address
+        @param regid: Register ID
+        @param value: New register value
+
+        @return SwapRequest object resolving to True once acknowledged
         """
-        # Send command multiple times if necessary
-        for i in range(SwapServer._MAX_SWAP_COMMAND_TRIES):
-            # Send command            
-            ack = mote.cmdRegister(regid, value)
-            # Wait for aknowledgement from mote
-            if self._waitForAck(ack, SwapServer._MAX_WAITTIME_ACK):
-                if sendack:
-                    # Send status message
-                    self.send_status(mote, regid)
-                return True;    # ACK received
-        return False            # Got no ACK from mote
+        request = SwapRequest(address, regid, value)
+        mote = self.network.get_mote(address=address)
+        if mote is None:
+            request.set_result(False)
+            return request
+        def send():
+            mote.cmdRegister(regid, value)
+        return self._sendRequest(request, send)
 
 
-    def setEndpointValue(self, endpoint, value):
+    def setEndpointValue(self, endpoint, value, timeout=None, tries=None):
         """
         Set endpoint value
 
         @param endpoint: Endpoint to be controlled
         @param value: New endpoint value
+        @param timeout: Maximum waiting time (in ms) for the ACK per try
+        @param tries: Max tries
 
         @return True if the command is correctly ack'ed. Return False otherwise
         """
-        # Send command multiple times if necessary
-        for i in range(SwapServer._MAX_SWAP_COMMAND_TRIES):
-            # Send command            
-            ack = endpoint.sendSwapCmd(value)
-            # Wait for aknowledgement from mote
-            if self._waitForAck(ack, SwapServer._MAX_WAITTIME_ACK):
-                return True;    # ACK received
-        return False            # Got no ACK from mote
+        # New value of the register containing the endpoint
+        regval = endpoint.getRegValue(value)
+        return self.setMoteRegister(endpoint.register.mote, endpoint.getRegId(), regval,
+                                    timeout=timeout, tries=tries)
 
 
-    def queryMoteRegister(self, mote, regId):
+    def queryMoteRegister(self, mote, regId, timeout=None, tries=None):
         """
         Query mote register, wait for response and return value
-        Non re-entrant method!!
         
         @param mote: Mote containing the register
         @param regId: Register ID
+        @param timeout: Maximum waiting time (in ms) for the response per try
+        @param tries: Max tries
         
         @return register value
         """
-        # Queried register
-        register = SwapRegister(mote, regId)
-        # Send query multiple times if necessary
-        for i in range(SwapServer._MAX_SWAP_COMMAND_TRIES):
-            # Send query
-            register.sendSwapQuery()
-            # Wait for aknowledgement from mote
-            regVal = self._waitForReg(register, SwapServer._MAX_WAITTIME_ACK)
-            if regVal is not None:
-                break   # Got response from mote
-        return regVal
+        request = SwapRequest(mote.address, regId)
+        def send():
+            mote.qryRegister(regId)
+        return self._sendRequest(request, send, timeout, tries).result()
 
 
-    def _waitForAck(self, ackpacket, wait_time):
+    def query_many(self, queries, window=8, timeout=None, tries=None):
         """
-        Wait for ACK (SWAP status packet)
-        Non re-entrant method!!
+        Query several registers, keeping up to window queries in flight.
+        Each query is retried on its own until answered or out of tries
 
-        @param ackpacket: SWAP status packet to expect as a valid ACK
-        @param wait_time: Max waiting time in milliseconds
-        
-        @return True if the ACK is received. False otherwise
+        @param queries: Sequence of (mote, register ID) tuples
+        @param window: Maximum amount of queries waiting for response
+        @param timeout: Maximum waiting time (in ms) for each response per try
+        @param tries: Max tries per query
+
+        @return dictionary of register values indexed by (mote, register ID)
+        tuples. None for registers not answered
         """
-        self._packetAcked = False
-        # Expected ACK packet (SWAP status)
-        self._expectedAck = ackpacket
-        
-        #loops = wait_time / 10
-        start = time.time()
-        while not self._packetAcked:
-            time.sleep(0.1)
-            if (time.time() - start)*1000 >= wait_time:
-                break
-            
-        res = self._packetAcked
-        self._expectedAck = None
-        self._packetAcked = False
-        return res
+        results = {}
+        slots = threading.Semaphore(max(window, 1))
+        for query in queries:
+            if query in results:
+                continue
+            results[query] = None
+            (mote, regId) = query
+            slots.acquire()
+            def answered(request, query=query):
+                results[query] = request.result()
+                slots.release()
+            request = SwapRequest(mote.address, regId)
+            def send(mote=mote, regId=regId):
+                mote.qryRegister(regId)
+            try:
+                self._sendRequest(request, send, timeout, tries).add_done_callback(answered)
+            except:
+                slots.release()
+                raise
+        # Wait for the last queries
+        for i in range(max(window, 1)):
+            slots.acquire()
+        return results
 
 
-    def _waitForReg(self, register, waitTime):
+    def _sendRequest(self, request, send, timeout=None, tries=None):
         """
-        Wait for ACK (SWAP status packet)
-        Non re-entrant method!!
-        
-        @param register: Expected register to be informed about
-        @param waitTime: Max waiting time in milliseconds
-        
-        @return True if the ACK is received. False otherwise
+        Send command or query and retry until the response is received.
+        Any number of requests can be in flight at the same time
+
+        @param request: SwapRequest object
+        @param send: Function transmitting the command or query
+        @param timeout: Maximum waiting time (in ms) for the response per try.
+        If None, the retransmission timeout measured for the mote is used,
+        doubled on every retry with some random jitter. Motes not measured
+        yet get RttEstimator.initial_rto per try, with no backoff
+        @param tries: Max tries
+
+        @return request object, completed once the response is received or
+        after the last try
+        """
+        if tries is None:
+            tries = SwapServer._MAX_SWAP_COMMAND_TRIES
+        kind = "command"
+        if request.expected is None:
+            kind = "query"
+
+        def attempt():
+            if request.done():
+                return
+            if request.tries >= tries:
+                self._pending.remove(request)
+                request.set_result(request.failed)
+                return
+            if timeout is None:
+                rto = self._pending.get_rto(request.key[0])
+                if rto is None:
+                    # Not measured yet. Keep the former fixed timeout
+                    delay = RttEstimator.initial_rto
+                else:
+                    # Exponential backoff. Jitter keeps retries to different motes apart
+                    delay = min(rto * (2 ** request.tries), RttEstimator.max_rto)
+                    delay *= random.uniform(1 - SwapServer._RTO_JITTER, 1 + SwapServer._RTO_JITTER)
+            else:
+                delay = timeout / 1000.0
+            if request.tries > 0:
+                self.metrics.inc("swap_retries_total", {"kind": kind})
+            request.tries += 1
+            request.sent = time.time()
+            request.timer = self._timers.call_later(delay, attempt)
+            send()
+
+        def complete(request):
+            if request.result() == request.failed:
+                self.metrics.inc("swap_request_failures_total", {"kind": kind})
+            else:
+                self.metrics.observe("swap_response_seconds", time.time() - request.sent, {"kind": kind})
+
+        self._pending.add(request)
+        request.add_done_callback(complete)
+        if not self.is_running or not self._timers.isAlive():
+            # Server stopped. Checked once the request is in the table, so
+            # that a concurrent stop() fails it otherwise
+            self._pending.remove(request)
+            request.set_result(request.failed)
+            return request
+        try:
+            attempt()
+        except:
+            request.timer.cancel()
+            self._pending.remove(request)
+            raise
+        return request
+
+
+    def get_latency_stats(self, address=None):
+        """
+        Return histograms of the time taken by motes to answer commands and queries
+
+        @param address: Mote address. None for all motes
+
+        @return histogram dictionary for the given mote, or dictionary of
+        histograms indexed by mote address. Times are given in milliseconds
+        """
+        return self._pending.get_latency_stats(address)
+
+
+    def get_rtt_stats(self, address=None):
+        """
+        Return round-trip times measured for motes and the resulting
+        retransmission timeouts
+
+        @param address: Mote address. None for all motes
+
+        @return dictionary with the amount of samples, smoothed RTT (srtt),
+        RTT variation (rttvar) and retransmission timeout (rto) for the given
+        mote, or dictionary of them indexed by mote address. Times are given
+        in milliseconds
+        """
+        return self._pending.get_rtt_stats(address)
+
+
+    def get_event_stats(self):
+        """
+        Return counters of the events passed to the event handler
+
+        @return dictionary with the amount of events posted, delivered,
+        dropped, coalesced, delayed and currently queued
+        """
+        return self._eventHandler.get_stats()
+
+
+    def _declareMetrics(self):
+        """
+        Declare the metrics collected by the server
+        """
+        metrics = self.metrics
+        metrics.counter("swap_rx_frames_total", "Wireless frames received by the serial gateway")
+        metrics.counter("swap_rx_errors_total", "Wireless frames received with incorrect format")
+        metrics.counter("swap_rx_duplicates_total", "Frames heard by more than one serial gateway")
+        metrics.counter("swap_tx_frames_total", "Serial frames transmitted, AT commands included")
+        metrics.counter("swap_rx_held_dropped_total", "Frames held in command mode and discarded for lack of room")
+        metrics.counter("swap_modem_command_sessions_total", "Times the serial gateway entered command mode")
+        metrics.counter("swap_modem_command_seconds_total", "Time spent by the serial gateway in command mode")
+        metrics.gauge("swap_tx_queue_depth", "Serial frames waiting for transmission")
+        metrics.gauge("swap_tx_queue_depth_max", "Maximum amount of serial frames waiting for transmission")
+        metrics.counter("swap_tx_wait_seconds_total", "Time spent by serial frames waiting for transmission")
+        metrics.gauge("swap_tx_wait_seconds_max", "Longest time spent by a serial frame waiting for transmission")
+        metrics.counter("swap_packets_received_total", "SWAP packets received per function")
+        metrics.counter("swap_nonce_mismatches_total", "Packets discarded because of an incorrect security nonce")
+        metrics.histogram("swap_dispatch_seconds", "Time taken to process every packet received")
+        metrics.histogram("swap_response_seconds", "Time taken by motes to answer commands and queries")
+        metrics.counter("swap_retries_total", "Commands and queries transmitted again for lack of response")
+        metrics.counter("swap_request_failures_total", "Commands and queries never answered")
+        metrics.gauge("swap_pending_requests", "Commands and queries waiting for response")
+        metrics.counter("swap_events_total", "Events passed to the event handler, per outcome")
+        metrics.gauge("swap_events_queued", "Events waiting for delivery")
+        metrics.gauge("swap_motes", "Motes in the SWAP network")
+        metrics.gauge("swap_mote_rssi_dbm", "RSSI of the last packet received from every mote")
+        metrics.gauge("swap_mote_lqi", "LQI of the last packet received from every mote. The lower, the better")
+        metrics.add_collector(self._collectMetrics)
+
+
+    def _collectMetrics(self):
+        """
+        Refresh metrics kept by the modems, the event bus and the network
+        """
+        metrics = self.metrics
+        modem = self.modem
+        if modem is not None:
+            # Every gateway, in case of a ModemPool
+            for gateway in getattr(modem, "modems", [modem]):
+                labels = {"port": gateway.portname}
+                metrics.set("swap_rx_frames_total", getattr(gateway, "rx_frames", 0), labels)
+                metrics.set("swap_rx_errors_total", getattr(gateway, "rx_errors", 0), labels)
+                if hasattr(gateway, "getCommandStats"):
+                    stats = gateway.getCommandStats()
+                    metrics.set("swap_rx_held_dropped_total", stats["dropped"], labels)
+                    metrics.set("swap_modem_command_sessions_total", stats["sessions"], labels)
+                    metrics.set("swap_modem_command_seconds_total", stats["time"], labels)
+                stats = gateway.getTxStats()
+                metrics.set("swap_tx_frames_total", stats["sent"], labels)
+                metrics.set("swap_tx_queue_depth", stats["depth"], labels)
+                metrics.set("swap_tx_queue_depth_max", stats["depth_max"], labels)
+                metrics.set("swap_tx_wait_seconds_total", stats["wait_total"], labels)
+                metrics.set("swap_tx_wait_seconds_max", stats["wait_max"], labels)
+            if isinstance(modem, ModemPool):
+                metrics.set("swap_rx_duplicates_total", modem.duplicates)
+        events = self._eventHandler.get_stats()
+        for outcome in ("posted", "delivered", "dropped", "coalesced", "delayed"):
+            metrics.set("swap_events_total", events[outcome], {"outcome": outcome})
+        metrics.set("swap_events_queued", events["queued"])
+        metrics.set("swap_pending_requests", len(self._pending))
+        for (function, count) in self._rx_functions.items():
+            metrics.set("swap_packets_received_total", count,
+                        {"function": SwapServer._FUNCTION_NAMES.get(function, "unknown")})
+        for (address, (rssi, lqi)) in self._rx_links.items():
+            if rssi >= 128:
+                rssi -= 256
+            metrics.set("swap_mote_rssi_dbm", rssi / 2.0 - 74, {"address": address})
+            metrics.set("swap_mote_lqi", lqi & 0x7F, {"address": address})
+        metrics.set("swap_motes", self.network.get_nbof_motes())
+
+
+    def start_profile(self, sample=1):
         """
-        # Expected ACK packet (SWAP status)
-        self._expectedRegister = register
+        Start profiling the processing of incoming packets with cProfile.
+        Profiling slows down the server. Statistics collected in a previous
+        session are discarded
 
-        loops = waitTime / 10
-        while self._valueReceived is None:
-            time.sleep(0.01)
-            loops -= 1
-            if loops == 0:
-                break
+        @param sample: Profile one packet out of every sample packets
+        """
+        self._profiler = SwapProfiler(sample)
+
+
+    def stop_profile(self, filename=None):
+        """
+        Stop profiling incoming packets
 
-        res = self._valueReceived
-        self._expectedRegister = None
-        self._valueReceived = None
-        return res
+        @param filename: File where the statistics are saved, to be read
+        with pstats. Not saved if None
+
+        @return pstats.Stats object or None if not profiling
+        """
+        profiler = self._profiler
+        self._profiler = None
+        if profiler is None:
+            return None
+        if filename is not None:
+            profiler.dump(filename)
+        return profiler.stats()
 
 
     def getNetId(self):
@@ -616,6 +1009,9 @@ class SwapServer(threading.Thread):
             os.remove(local_tar)
         except:
             print "Unable to update Device Definition Files"
+
+        # Parse new definition files from now on
+        XmlDeviceDir.invalidate()
         
         
     def __init__(self, eventHandler, settings=None, start=True):
@@ -630,7 +1026,7 @@ class SwapServer(threading.Thread):
         threading.Thread.__init__(self)
         self._stop = threading.Event()
 
-        ## Serial wireless gateway
+        ## Serial wireless gateway. ModemPool object if several gateways are configured
         self.modem = None
         # Server's device address
         self.devaddress = 1
@@ -640,30 +1036,36 @@ class SwapServer(threading.Thread):
         self.security = 0
         # Encryption password
         self.password = 0
-        # True if last packet was ack'ed
-        self._packetAcked = False
-        # Expected ACK packet (SWAP status packet containing a given endpoint data)
-        self._expectedAck = None
-        # Value received about register being queried
-        self._valueReceived = None
-        # Register being queried
-        self._expectedRegister = None
-
-        # Event handling object. Its class must define the following methods
-        # in order to dispatch incoming SWAP events:
-        # - newMoteDetected(mote)
-        # - newEndpointDetected(endpoint)
-        # - newParameterDetected(parameter)
-        # - moteStateChanged(mote)
-        # - moteAddressChanged(mote)
-        # - registerValueChanged(register)
-        # - endpointValueChanged(endpoint)
-        # - parameterValueChanged(parameter)
-        self._eventHandler = eventHandler
+        # Commands and queries waiting for their response
+        self._pending = SwapPendingTable()
+        # Timers driving retries and timeouts
+        self._timers = EventLoop()
+        self._timers.start()
+        # Commands waiting for sleeping motes to listen
+        self._commands = SwapCommandQueue(self._timers, self._sendCommand)
+        # Endpoints whose publication is deferred by their publish policy
+        self._deferred = set()
 
         # General settings
         self._xmlSettings = XmlSettings(settings)
 
+        ## Activity metrics (see SwapMetrics)
+        self.metrics = SwapMetrics()
+        self._declareMetrics()
+        # HTTP server exporting metrics
+        self._metrics_server = None
+        # Amount of packets received per function code
+        self._rx_functions = {}
+        # (RSSI, LQI) bytes of the last packet received per mote address
+        self._rx_links = {}
+        # Profiler of incoming packets. None unless profiling
+        self._profiler = None
+
+        # Events are passed to the event handler from worker threads
+        self._eventHandler = SwapEventBus(eventHandler, self._xmlSettings.event_workers,
+                                          self._xmlSettings.event_queue, self._xmlSettings.event_overflow,
+                                          self.metrics)
+
         # Update Device Definition Files from Internet server
         if self._xmlSettings.updatedef:
             self.update_definition_files()
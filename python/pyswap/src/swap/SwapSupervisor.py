@@ -0,0 +1,980 @@
+#########################################################################
+#
+# SwapSupervisor
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from SwapException import SwapException
+from SwapInterface import SwapInterface
+from aio.SwapFuture import SwapFuture
+from protocol.SwapValue import SwapValue
+
+import copy
+import json
+import multiprocessing
+import os
+import threading
+
+# MessagePack is optional. Messages are JSON encoded without it
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Serializes worker spawning. A worker forked while another proxy still
+# holds the child end of its pipe would keep that end open, hiding the
+# EOF reported when the other worker dies
+_spawn_lock = threading.Lock()
+
+
+class SwapIpc:
+    """
+    Messages exchanged between the supervisor and its workers. Every message
+    is a list starting with one of these codes
+    """
+    ## Worker to supervisor: [MOTES, list of serialized motes]
+    MOTES = 0
+    ## Worker to supervisor: [EVENT, event name, payload]
+    EVENT = 1
+    ## Worker to supervisor: [REPLY, request id, error description or None, result]
+    REPLY = 2
+    ## Supervisor to worker: [CALL, request id, operation, list of arguments]
+    CALL = 3
+    ## Supervisor to worker: [STOP]
+    STOP = 4
+
+    ## Events passed to the supervisor only if its event handler wants them.
+    ## Any other event keeps the network state of the supervisor up to date
+    OPTIONAL_EVENTS = ("swapPacketReceived", "swapPacketSent", "newParameterDetected",
+                       "registerValueChanged", "parameterValueChanged")
+
+    @staticmethod
+    def encode(message):
+        """
+        Serialize message. MessagePack is used when installed, JSON otherwise
+
+        @param message: List of values
+
+        @return string of bytes
+        """
+        if msgpack is not None:
+            return msgpack.packb(message, use_bin_type=True)
+        return json.dumps(message, separators=(",", ":"))
+
+
+    @staticmethod
+    def decode(data):
+        """
+        Deserialize message
+
+        @param data: String of bytes produced by encode
+
+        @return list of values
+        """
+        if msgpack is not None:
+            return msgpack.unpackb(data, raw=False)
+        return json.loads(data)
+
+
+class SwapWorker(SwapInterface):
+    """
+    SWAP application run within each worker process. Serves a single network
+    and passes its events on to the supervisor
+    """
+    def swapServerStarted(self):
+        """
+        SWAP server started successfully. Pass the whole network first
+        """
+        self._sendMotes()
+        self._send([SwapIpc.EVENT, "swapServerStarted", None])
+
+
+    def swapPacketReceived(self, packet):
+        """
+        New SWAP packet received
+
+        @param packet: SWAP packet received
+        """
+        self._sendEvent("swapPacketReceived", packet, self._dumpPacket)
+
+
+    def swapPacketSent(self, packet):
+        """
+        SWAP packet transmitted
+
+        @param packet: SWAP packet transmitted
+        """
+        self._sendEvent("swapPacketSent", packet, self._dumpPacket)
+
+
+    def newMoteDetected(self, mote):
+        """
+        New mote detected by SWAP server
+
+        @param mote: mote detected
+        """
+        self._send([SwapIpc.EVENT, "newMoteDetected", self._dumpMote(mote)])
+
+
+    def newParameterDetected(self, parameter):
+        """
+        New configuration parameter detected by SWAP server
+
+        @param parameter: Parameter detected
+        """
+        self._sendEvent("newParameterDetected", parameter, self._dumpParameter)
+
+
+    def newEndpointDetected(self, endpoint):
+        """
+        New endpoint detected by SWAP server
+
+        @param endpoint: Endpoint detected
+        """
+        self._send([SwapIpc.EVENT, "newEndpointDetected", endpoint.dumps()])
+
+
+    def moteStateChanged(self, mote):
+        """
+        Mote state changed
+
+        @param mote: Mote having changed
+        """
+        self._send([SwapIpc.EVENT, "moteStateChanged", {"address": mote.address, "state": mote.state}])
+
+
+    def moteAddressChanged(self, mote):
+        """
+        Mote address changed. The supervisor does not know the former
+        address so the whole network is passed again
+
+        @param mote: Mote having changed
+        """
+        self._sendMotes()
+        self._send([SwapIpc.EVENT, "moteAddressChanged", self._dumpMote(mote)])
+
+
+    def registerValueChanged(self, register):
+        """
+        Register value changed
+
+        @param register: Register having changed
+        """
+        self._sendEvent("registerValueChanged", register, self._dumpRegister)
+
+
+    def endpointValueChanged(self, endpoint):
+        """
+        Endpoint value changed
+
+        @param endpoint: Endpoint having changed
+        """
+        self._send([SwapIpc.EVENT, "endpointValueChanged", endpoint.dumps()])
+
+
+    def parameterValueChanged(self, parameter):
+        """
+        Configuration parameter changed
+
+        @param parameter: configuration parameter having changed
+        """
+        self._sendEvent("parameterValueChanged", parameter, self._dumpParameter)
+
+
+    def _sendEvent(self, name, item, dump):
+        """
+        Pass optional event to the supervisor if its event handler wants it
+
+        @param name: Event name
+        @param item: Object passed to the event
+        @param dump: Function serializing the object
+        """
+        if name in self._events:
+            self._send([SwapIpc.EVENT, name, dump(item)])
+
+
+    def _sendMotes(self):
+        """
+        Pass the whole network to the supervisor
+        """
+        motes = [self._dumpMote(mote) for mote in list(self.server.network.motes)]
+        self._send([SwapIpc.MOTES, motes])
+
+
+    def _send(self, message):
+        """
+        Send message to the supervisor. Events are sent from several threads
+
+        @param message: List of values (see SwapIpc)
+        """
+        data = SwapIpc.encode(message)
+        self._send_lock.acquire()
+        try:
+            self._conn.send_bytes(data)
+        except (IOError, EOFError):
+            # Supervisor gone. serve() finds out and stops
+            pass
+        finally:
+            self._send_lock.release()
+
+
+    def _dumpMote(self, mote):
+        """
+        Serialize mote along with its state
+
+        @param mote: SWAP mote
+
+        @return dictionary
+        """
+        # Lazy motes return the data read from file. Do not modify it
+        data = dict(mote.dumps(include_units=True))
+        data["state"] = mote.state
+        return data
+
+
+    def _dumpRegister(self, register):
+        """
+        Serialize register value
+
+        @param register: SWAP register
+
+        @return dictionary
+        """
+        return {"address": register.getAddress(), "id": register.id,
+                "name": register.name, "value": register.value.toList()}
+
+
+    def _dumpParameter(self, parameter):
+        """
+        Serialize configuration parameter
+
+        @param parameter: Configuration parameter
+
+        @return dictionary
+        """
+        return {"address": parameter.getRegAddress(), "regid": parameter.getRegId(),
+                "name": parameter.name, "value": parameter.getValueInAscii()}
+
+
+    def _dumpPacket(self, packet):
+        """
+        Serialize SWAP packet
+
+        @param packet: SWAP packet
+
+        @return dictionary
+        """
+        value = None
+        if packet.value is not None:
+            value = packet.value.toList()
+        return {"srcAddress": packet.srcAddress, "destAddress": packet.destAddress,
+                "function": packet.function, "regAddress": packet.regAddress,
+                "regId": packet.regId, "nonce": packet.nonce, "value": value,
+                "rssi": getattr(packet, "rssi", None), "lqi": getattr(packet, "lqi", None)}
+
+
+    def _getMote(self, address):
+        """
+        Return mote given its address
+
+        @param address: Mote address
+
+        @return mote. Raise SwapException if not found
+        """
+        mote = self.server.network.get_mote(address=address)
+        if mote is None:
+            raise SwapException("Mote " + str(address) + " not found")
+        return mote
+
+
+    def _setRegister(self, address, regid, value):
+        """
+        Set new register value on wireless mote
+
+        @param address: Mote address
+        @param regid: Register ID
+        @param value: New register value as a list of bytes
+
+        @return True if the command is correctly ack'ed
+        """
+        return self.server.setMoteRegister(self._getMote(address), regid, SwapValue(value))
+
+
+    def _queryRegister(self, address, regid):
+        """
+        Query mote register
+
+        @param address: Mote address
+        @param regid: Register ID
+
+        @return register value as a list of bytes. None if not answered
+        """
+        value = self.server.queryMoteRegister(self._getMote(address), regid)
+        if value is None:
+            return None
+        return value.toList()
+
+
+    def _setEndpoint(self, endpid, value):
+        """
+        Set endpoint value
+
+        @param endpid: Endpoint id
+        @param value: New endpoint value
+
+        @return True if the command is correctly ack'ed
+        """
+        endpoint = self.server.network.get_endpoint(endpid=endpid)
+        if endpoint is None:
+            raise SwapException("Endpoint " + endpid + " not found")
+        return self.server.setEndpointValue(endpoint, value)
+
+
+    def _getStats(self):
+        """
+        Return worker counters
+
+        @return dictionary
+        """
+        return {"pid": os.getpid(), "motes": self.server.network.get_nbof_motes(),
+                "events": self.server.get_event_stats()}
+
+
+    def _call(self, reqid, operation, args):
+        """
+        Run request from the supervisor and send the result back
+
+        @param reqid: Request id
+        @param operation: Operation name
+        @param args: List of arguments
+        """
+        error = None
+        result = None
+        try:
+            method = self._operations.get(operation)
+            if method is None:
+                raise SwapException("Unknown operation " + str(operation))
+            result = method(*args)
+        except SwapException as ex:
+            error = ex.description.split(": ", 1)[-1]
+        except Exception as ex:
+            # Always answer. The supervisor would wait until timeout otherwise
+            error = str(ex)
+        self._send([SwapIpc.REPLY, reqid, error, result])
+
+
+    def serve(self):
+        """
+        Serve requests from the supervisor until told to stop, until the
+        supervisor is gone or until the SWAP server is no longer running
+        """
+        parent = os.getppid()
+        while True:
+            # Startup failed or the server stopped on its own. Exit so that
+            # the supervisor starts a new worker
+            if not self.server.is_running and not self.server.isAlive():
+                print "SWAP server not running. Exiting worker"
+                break
+            try:
+                if not self._conn.poll(1.0):
+                    if os.getppid() != parent:
+                        break
+                    continue
+                message = SwapIpc.decode(self._conn.recv_bytes())
+            except (IOError, EOFError):
+                break
+            if message[0] == SwapIpc.STOP:
+                break
+            elif message[0] == SwapIpc.CALL:
+                # Commands wait for the mote to answer. Serve each one on its own thread
+                request = threading.Thread(target=self._call, args=message[1:])
+                request.daemon = True
+                request.start()
+        self.stop()
+
+
+    def __init__(self, settings, conn, events):
+        """
+        Class constructor
+
+        @param settings: path to the main configuration file of the network
+        @param conn: Connection to the supervisor
+        @param events: Names of the optional events wanted by the supervisor
+        """
+        # Connection to the supervisor
+        self._conn = conn
+        # Serializes messages sent to the supervisor
+        self._send_lock = threading.Lock()
+        # Optional events passed to the supervisor
+        self._events = frozenset(events)
+        # Requests served, by operation name
+        self._operations = {"set": self._setRegister, "query": self._queryRegister,
+                            "endpoint": self._setEndpoint, "stats": self._getStats}
+        SwapInterface.__init__(self, settings)
+
+
+def _runWorker(settings, conn, events):
+    """
+    Entry point of worker processes
+
+    @param settings: path to the main configuration file of the network
+    @param conn: Connection to the supervisor
+    @param events: Names of the optional events wanted by the supervisor
+    """
+    try:
+        worker = SwapWorker(settings, conn, events)
+        worker.serve()
+    except SwapException as ex:
+        ex.display()
+    finally:
+        # Server threads are not daemonic
+        os._exit(0)
+
+
+class SwapWorkerProxy:
+    """
+    Worker process as seen from the supervisor. Keeps a copy of the state of
+    its network and restarts the process whenever it dies
+    """
+    def start(self):
+        """
+        Start worker process and its listener
+        """
+        self._spawn()
+        self._listener = threading.Thread(target=self._listen)
+        self._listener.daemon = True
+        self._listener.start()
+
+
+    def stop(self):
+        """
+        Stop worker process
+        """
+        self._stopping.set()
+        self._send([SwapIpc.STOP])
+        process = self.process
+        if process is not None:
+            process.join(SwapSupervisor.stop_timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+
+    def _spawn(self):
+        """
+        Start worker process
+        """
+        _spawn_lock.acquire()
+        try:
+            (conn, child_conn) = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_runWorker, name="swap-" + self.name,
+                                              args=(self.settings, child_conn, self._events))
+            process.daemon = True
+            process.start()
+            # The pipe reports EOF once the worker is gone
+            child_conn.close()
+        finally:
+            _spawn_lock.release()
+        self._lock.acquire()
+        self._conn = conn
+        self.process = process
+        self._lock.release()
+
+
+    def _listen(self):
+        """
+        Read messages from the worker. Restart the worker whenever it dies
+        """
+        while True:
+            conn = self._conn
+            while True:
+                try:
+                    message = SwapIpc.decode(conn.recv_bytes())
+                except (IOError, EOFError):
+                    break
+                try:
+                    self._dispatch(message)
+                except Exception as ex:
+                    print "Exception in SWAP worker " + self.name + " message:", ex
+            conn.close()
+            self._fail()
+            if self._stopping.isSet():
+                return
+            print "SWAP worker " + self.name + " died. Restarting in " + str(SwapSupervisor.restart_delay) + " seconds"
+            self._stopping.wait(SwapSupervisor.restart_delay)
+            if self._stopping.isSet():
+                return
+            self.restarts += 1
+            self._spawn()
+
+
+    def _fail(self):
+        """
+        Worker gone. Fail every request waiting for it
+        """
+        self._lock.acquire()
+        self.is_running = False
+        pending = self._pending
+        self._pending = {}
+        self._lock.release()
+        for future in pending.values():
+            future.set_exception(SwapException("SWAP worker " + self.name + " stopped"))
+
+
+    def _dispatch(self, message):
+        """
+        Process message received from the worker
+
+        @param message: List of values (see SwapIpc)
+        """
+        code = message[0]
+        if code == SwapIpc.EVENT:
+            self._onEvent(message[1], message[2])
+        elif code == SwapIpc.REPLY:
+            self._lock.acquire()
+            future = self._pending.pop(message[1], None)
+            self._lock.release()
+            if future is not None:
+                if message[2] is not None:
+                    future.set_exception(SwapException(self.name + ": " + message[2]))
+                else:
+                    future.set_result(message[3])
+        elif code == SwapIpc.MOTES:
+            self._setMotes(message[1])
+
+
+    def _onEvent(self, name, payload):
+        """
+        Update network state from event and pass it to the event handler
+
+        @param name: Event name
+        @param payload: Serialized object passed to the event
+        """
+        self._lock.acquire()
+        try:
+            if name == "swapServerStarted":
+                self.is_running = True
+            elif name == "newMoteDetected":
+                self._addMote(payload)
+                payload = copy.deepcopy(payload)
+            elif name == "moteStateChanged":
+                mote = self._motes.get(payload["address"])
+                if mote is not None:
+                    mote["state"] = payload["state"]
+            elif name in ("endpointValueChanged", "newEndpointDetected"):
+                payload["network"] = self.name
+                endpoint = self._endpoints.get(payload["id"])
+                if endpoint is None:
+                    self._endpoints[payload["id"]] = payload
+                else:
+                    endpoint.update(payload)
+                payload = dict(payload)
+        finally:
+            self._lock.release()
+
+        callback = getattr(self._handler, name, None)
+        if callback is None:
+            return
+        if payload is None:
+            callback(self.name)
+        else:
+            payload["network"] = self.name
+            callback(payload)
+
+
+    def _setMotes(self, motes):
+        """
+        Replace the whole network state
+
+        @param motes: List of serialized motes
+        """
+        self._lock.acquire()
+        self._motes = {}
+        self._endpoints = {}
+        for mote in motes:
+            self._addMote(mote)
+        self._lock.release()
+
+
+    def _addMote(self, mote):
+        """
+        Add mote to the network state along with its endpoints. Called with
+        the lock held
+
+        @param mote: Serialized mote
+        """
+        mote["network"] = self.name
+        self._motes[mote["address"]] = mote
+        for register in mote["registers"]:
+            for endpoint in register["endpoints"]:
+                endpoint["network"] = self.name
+                self._endpoints[endpoint["id"]] = endpoint
+
+
+    def get_motes(self):
+        """
+        Return copy of the motes of this network
+
+        @return list of serialized motes
+        """
+        self._lock.acquire()
+        try:
+            return copy.deepcopy(self._motes.values())
+        finally:
+            self._lock.release()
+
+
+    def get_mote(self, address):
+        """
+        Return copy of a mote of this network
+
+        @param address: Mote address
+
+        @return serialized mote or None if not found
+        """
+        self._lock.acquire()
+        try:
+            return copy.deepcopy(self._motes.get(address))
+        finally:
+            self._lock.release()
+
+
+    def get_endpoint(self, endpid=None, location=None, name=None):
+        """
+        Return copy of an endpoint of this network
+
+        @param endpid: endpoint id. Takes precedence over location and name
+        @param location: endpoint location
+        @param name: endpoint name
+
+        @return serialized endpoint or None if not found
+        """
+        self._lock.acquire()
+        try:
+            if endpid is not None:
+                endpoint = self._endpoints.get(endpid)
+            else:
+                endpoint = None
+                for item in self._endpoints.itervalues():
+                    if item["location"] == location and item["name"] == name:
+                        endpoint = item
+                        break
+            if endpoint is None:
+                return None
+            return dict(endpoint)
+        finally:
+            self._lock.release()
+
+
+    def _send(self, message):
+        """
+        Send message to the worker
+
+        @param message: List of values (see SwapIpc)
+
+        @return True if sent
+        """
+        data = SwapIpc.encode(message)
+        self._send_lock.acquire()
+        try:
+            if self._conn is None:
+                return False
+            self._conn.send_bytes(data)
+            return True
+        except (IOError, EOFError, ValueError):
+            return False
+        finally:
+            self._send_lock.release()
+
+
+    def call(self, operation, *args):
+        """
+        Run operation on the worker and wait for its result
+
+        @param operation: Operation name
+        @param args: Operation arguments
+
+        @return result of the operation. Raise SwapException on failure
+        """
+        future = SwapFuture()
+        self._lock.acquire()
+        if not self.is_running:
+            self._lock.release()
+            raise SwapException("SWAP worker " + self.name + " not running")
+        reqid = self._next_id
+        self._next_id += 1
+        self._pending[reqid] = future
+        self._lock.release()
+
+        if not self._send([SwapIpc.CALL, reqid, operation, list(args)]):
+            future.set_exception(SwapException("SWAP worker " + self.name + " not available"))
+        try:
+            return future.result(SwapSupervisor.request_timeout)
+        finally:
+            self._lock.acquire()
+            self._pending.pop(reqid, None)
+            self._lock.release()
+
+
+    def __init__(self, name, settings, handler, events):
+        """
+        Class constructor
+
+        @param name: Network name
+        @param settings: path to the main configuration file of the network
+        @param handler: Event handler of the supervisor
+        @param events: Names of the optional events wanted by the event handler
+        """
+        ## Network name
+        self.name = name
+        ## Path to the main configuration file of the network
+        self.settings = settings
+        ## Worker process
+        self.process = None
+        ## Tells us if the SWAP server of the worker is running
+        self.is_running = False
+        ## Amount of times the worker was restarted
+        self.restarts = 0
+        # Event handler
+        self._handler = handler
+        # Optional events passed by the worker
+        self._events = events
+        # Connection to the worker
+        self._conn = None
+        # Serializes messages sent to the worker
+        self._send_lock = threading.Lock()
+        # Guards network state and pending requests
+        self._lock = threading.Lock()
+        # Serialized motes indexed by address
+        self._motes = {}
+        # Serialized endpoints indexed by id. Shared with the motes above
+        self._endpoints = {}
+        # Requests waiting for the worker to answer, indexed by request id
+        self._pending = {}
+        # Id of the next request
+        self._next_id = 0
+        # Set once stopping
+        self._stopping = threading.Event()
+        # Thread reading messages from the worker
+        self._listener = None
+
+
+class SwapSupervisor:
+    """
+    Run one SWAP server per network, each one within its own process, so
+    that packet processing spreads over every core. Gateways of the same
+    network are better served by a single server (see ModemPool)
+
+    The event handler receives the same events as SwapInterface, with the
+    motes, endpoints, registers and packets serialized into dictionaries
+    carrying the name of their network under "network". swapServerStarted
+    receives the network name. Events of a network are passed in order, from
+    one thread per network. Packet, register and configuration parameter
+    events are only passed on from the workers if the handler defines them
+    """
+    ## Seconds to wait before restarting a worker that died
+    restart_delay = 5.0
+    ## Maximum seconds to wait for a worker to answer a request
+    request_timeout = 60.0
+    ## Maximum seconds to wait for a worker to stop
+    stop_timeout = 10.0
+
+    def start(self):
+        """
+        Start every worker
+        """
+        for worker in self.workers:
+            worker.start()
+
+
+    def stop(self):
+        """
+        Stop every worker
+        """
+        print "Stopping SWAP workers..."
+        for worker in self.workers:
+            worker.stop()
+
+
+    def get_networks(self):
+        """
+        Return network names
+
+        @return list of names
+        """
+        return [worker.name for worker in self.workers]
+
+
+    def get_worker(self, network):
+        """
+        Return worker serving a network
+
+        @param network: Network name
+
+        @return SwapWorkerProxy object. Raise SwapException if not found
+        """
+        worker = self._workers.get(network)
+        if worker is None:
+            raise SwapException("Network " + str(network) + " not found")
+        return worker
+
+
+    def get_motes(self, network=None):
+        """
+        Return motes of every network or of a single one
+
+        @param network: Network name. None for every network
+
+        @return list of serialized motes
+        """
+        if network is not None:
+            return self.get_worker(network).get_motes()
+        motes = []
+        for worker in self.workers:
+            motes.extend(worker.get_motes())
+        return motes
+
+
+    def get_mote(self, network, address):
+        """
+        Return mote given its network and address
+
+        @param network: Network name
+        @param address: Mote address
+
+        @return serialized mote or None if not found
+        """
+        return self.get_worker(network).get_mote(address)
+
+
+    def get_endpoint(self, endpid=None, location=None, name=None, network=None):
+        """
+        Get endpoint given its unique id or location.name pair. Endpoint id's
+        are only unique within their network
+
+        @param endpid: endpoint id
+        @param location: endpoint location
+        @param name: endpoint name
+        @param network: Network name. None to return the first match among
+        every network
+
+        @return serialized endpoint or None if not found
+        """
+        if network is not None:
+            return self.get_worker(network).get_endpoint(endpid, location, name)
+        for worker in self.workers:
+            endpoint = worker.get_endpoint(endpid, location, name)
+            if endpoint is not None:
+                return endpoint
+        return None
+
+
+    def setMoteRegister(self, network, address, regid, value):
+        """
+        Set new register value on wireless mote
+
+        @param network: Network name
+        @param address: Mote address
+        @param regid: Register ID
+        @param value: New register value (SwapValue or list of bytes)
+
+        @return True if the command is correctly ack'ed. Return False otherwise
+        """
+        if isinstance(value, SwapValue):
+            value = value.toList()
+        return self.get_worker(network).call("set", address, regid, value)
+
+
+    def queryMoteRegister(self, network, address, regid):
+        """
+        Query mote register, wait for response and return value
+
+        @param network: Network name
+        @param address: Mote address
+        @param regid: Register ID
+
+        @return register value (SwapValue) or None if not answered
+        """
+        value = self.get_worker(network).call("query", address, regid)
+        if value is None:
+            return None
+        return SwapValue(value)
+
+
+    def setEndpointValue(self, endpoint, value):
+        """
+        Set endpoint value
+
+        @param endpoint: Serialized endpoint, as returned by get_endpoint
+        @param value: New endpoint value
+
+        @return True if the command is correctly ack'ed. Return False otherwise
+        """
+        return self.get_worker(endpoint["network"]).call("endpoint", endpoint["id"], value)
+
+
+    def get_stats(self, network):
+        """
+        Return counters of a worker
+
+        @param network: Network name
+
+        @return dictionary with the worker's process id, amount of motes and
+        event counters (see SwapServer.get_event_stats)
+        """
+        worker = self.get_worker(network)
+        stats = worker.call("stats")
+        stats["restarts"] = worker.restarts
+        return stats
+
+
+    def __init__(self, handler, settings, names=None, start=True):
+        """
+        Class constructor
+
+        @param handler: Event handler object
+        @param settings: List of paths to the main configuration file of each network
+        @param names: List of network names. Configuration file paths if None
+        @param start: Start workers if True
+        """
+        if names is None:
+            names = list(settings)
+        if len(names) != len(settings) or len(set(names)) != len(names):
+            raise SwapException("SwapSupervisor needs one unique name per network")
+
+        # Optional events defined by the event handler
+        events = [name for name in SwapIpc.OPTIONAL_EVENTS if hasattr(handler, name)]
+
+        ## Workers, in the same order as settings
+        self.workers = []
+        # Workers indexed by network name
+        self._workers = {}
+        for (name, path) in zip(names, settings):
+            worker = SwapWorkerProxy(name, path, handler, events)
+            self.workers.append(worker)
+            self._workers[name] = worker
+
+        if start:
+            self.start()
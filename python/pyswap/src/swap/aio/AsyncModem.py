@@ -0,0 +1,312 @@
+#########################################################################
+#
+# AsyncModem
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from SerialTransport import SerialTransport, SerialProtocol
+from SwapFuture import SwapFuture
+from swap.modem.CcPacket import CcPacket
+from swap.modem.SerialModem import SerialModem
+from swap.modem.TxScheduler import TxPriority
+from swap.SwapException import SwapException
+
+import collections
+
+
+class AsyncModem(SerialProtocol):
+    """
+    Serial panStamp modem driven by an EventLoop. AT commands return
+    SwapFuture objects instead of blocking the caller
+    """
+    # Time (in seconds) waiting for "Modem ready!" before trying a soft reset
+    _READY_TIMEOUT = 5.0
+
+
+    def line_received(self, line):
+        """
+        Serial frame received from the modem
+
+        @param line: Frame in string format
+        """
+        if line[0] != '(':
+            if self._at_current is not None:
+                self._atResponse(line)
+            elif line == "Modem ready!" and not self.ready.done():
+                self._modemStarted()
+            return
+        if self._ccpacket_received is not None:
+            try:
+                self._ccpacket_received(CcPacket(line))
+            except SwapException as ex:
+                ex.display()
+
+
+    def connection_lost(self, exc):
+        """
+        Serial port closed. Fail every pending operation
+
+        @param exc: Exception describing the failure or None if closed on purpose
+        """
+        if exc is None:
+            exc = SwapException("Port " + self.portname + " closed")
+        if self._at_current is not None:
+            self._at_current[1].set_exception(exc)
+            self._at_current = None
+        while len(self._at_queue) > 0:
+            self._at_queue.popleft()[1].set_exception(exc)
+        self.ready.set_exception(exc)
+
+
+    def at(self, cmd="AT", timeout=1.0):
+        """
+        Run AT command on the serial modem. Thread-safe
+
+        @param cmd: AT command to be run. The CR terminator is optional
+        @param timeout: Maximum waiting time for the response in seconds
+
+        @return SwapFuture object resolving to the response received from the
+        modem or to None in case of timeout
+        """
+        if cmd != "+++" and not cmd.endswith("\r"):
+            cmd += "\r"
+        future = SwapFuture()
+        self._loop.call_soon(self._queueAt, cmd, future, timeout)
+        return future
+
+
+    def _queueAt(self, cmd, future, timeout):
+        """
+        Queue AT command. Commands are run one at a time
+
+        @param cmd: AT command
+        @param future: SwapFuture to be resolved with the response
+        @param timeout: Maximum waiting time in seconds
+        """
+        self._at_queue.append((cmd, future, timeout))
+        self._nextAt()
+
+
+    def _nextAt(self):
+        """
+        Send next AT command if no other command is waiting for its response
+        """
+        if self._at_current is not None or len(self._at_queue) == 0:
+            return
+        (cmd, future, timeout) = self._at_queue.popleft()
+        timer = self._loop.call_later(timeout, self._atResponse, None)
+        self._at_current = (cmd, future, timer)
+        self._transport.write(cmd, TxPriority.HIGH)
+
+
+    def _atResponse(self, response):
+        """
+        Resolve current AT command and send the next one
+
+        @param response: Response from the modem or None in case of timeout
+        """
+        (cmd, future, timer) = self._at_current
+        self._at_current = None
+        timer.cancel()
+        if cmd == "+++" and response is not None and response[:2] == "OK":
+            self._sermode = SerialModem.Mode.COMMAND
+        elif cmd == "ATO\r" and response is not None and response[:2] == "OK":
+            self._sermode = SerialModem.Mode.DATA
+        future.set_result(response)
+        self._nextAt()
+
+
+    def _sequence(self, cmds, done):
+        """
+        Run AT commands one after the other. Stop on the first command
+        not answered
+
+        @param cmds: List of (AT command, timeout) tuples
+        @param done: Function receiving the list of responses, or None if a
+        command timed out
+        """
+        responses = []
+        def step(future=None):
+            if future is not None:
+                response = future.result()
+                if response is None:
+                    done(None)
+                    return
+                responses.append(response)
+            if len(responses) == len(cmds):
+                done(responses)
+                return
+            (cmd, timeout) = cmds[len(responses)]
+            self.at(cmd, timeout).add_done_callback(step)
+        step()
+
+
+    def _modemStarted(self):
+        """
+        Modem ready. Retrieve its settings
+        """
+        if self._ready_timer is not None:
+            self._ready_timer.cancel()
+            self._ready_timer = None
+        cmds = [("+++", 5.0), ("ATHV?", 1.0), ("ATFV?", 1.0), ("ATCH?", 1.0),
+                ("ATSW?", 1.0), ("ATDA?", 1.0), ("ATO", 1.0)]
+        def settings(responses):
+            if responses is None:
+                self.ready.set_exception(SwapException("Unable to retrieve settings from serial modem"))
+                return
+            try:
+                ## Hardware version of the serial modem
+                self.hwversion = long(responses[1], 16)
+                ## Firmware version of the serial modem
+                self.fwversion = long(responses[2], 16)
+                ## Frequency channel of the serial gateway
+                self.freq_channel = int(responses[3], 16)
+                ## Synchronization word of the serial gateway
+                self.syncword = int(responses[4], 16)
+                ## Device address of the serial gateway
+                self.devaddress = int(responses[5], 16)
+            except ValueError:
+                self.ready.set_exception(SwapException("Incorrect settings received from serial modem"))
+                return
+            self.ready.set_result(self)
+        self._sequence(cmds, settings)
+
+
+    def _readyTimeout(self):
+        """
+        Modem did not start on time. Try a soft reset once
+        """
+        self._ready_timer = None
+        if self._soft_reset:
+            self.ready.set_exception(SwapException("Unable to reset serial modem"))
+            return
+        self._soft_reset = True
+        self._ready_timer = self._loop.call_later(AsyncModem._READY_TIMEOUT, self._readyTimeout)
+        self.at("+++", 5.0)
+        self.at("ATZ")
+
+
+    def configure(self, devaddress=None, syncword=None, freq_channel=None):
+        """
+        Apply modem settings within a single command-mode session
+
+        @param devaddress: New device address
+        @param syncword: New synchronization word
+        @param freq_channel: New frequency channel
+
+        @return SwapFuture object resolving to True if every setting was
+        accepted by the modem
+        """
+        future = SwapFuture()
+        cmds = [("+++", 5.0)]
+        if devaddress is not None:
+            cmds.append(("ATDA=" + "{0:02X}".format(devaddress), 1.0))
+        if syncword is not None:
+            cmds.append(("ATSW=" + "{0:04X}".format(syncword), 1.0))
+        if freq_channel is not None:
+            cmds.append(("ATCH=" + "{0:02X}".format(freq_channel), 1.0))
+        cmds.append(("ATO", 1.0))
+        def applied(responses):
+            if responses is None or [resp[:2] for resp in responses] != ["OK"] * len(responses):
+                future.set_result(False)
+                return
+            if devaddress is not None:
+                self.devaddress = devaddress
+            if syncword is not None:
+                self.syncword = syncword
+            if freq_channel is not None:
+                self.freq_channel = freq_channel
+            future.set_result(True)
+        self._sequence(cmds, applied)
+        return future
+
+
+    def sendCcPacket(self, packet, priority=TxPriority.HIGH):
+        """
+        Send wireless CcPacket through the serial gateway. Thread-safe
+
+        @param packet: CcPacket to be transmitted
+        @param priority: Transmission lane (see TxPriority). SWAP packets
+        pass the lane of their clear function code (see SwapPacket.priority)
+        """
+        self._transport.write(packet.toString() + "\r", priority)
+
+
+    def setRxCallback(self, cbFunct):
+        """
+        Set callback reception function. Called from the loop thread
+
+        @param cbFunct: Function receiving every CcPacket
+        """
+        self._ccpacket_received = cbFunct
+
+
+    def stop(self):
+        """
+        Close serial port
+        """
+        self._transport.close()
+
+
+    def __init__(self, loop, portname="/dev/ttyUSB0", speed=38400, verbose=False, txrate=None):
+        """
+        Class constructor. Wait on the ready future before using the modem
+
+        @param loop: EventLoop object driving the modem
+        @param portname: Name/path of the serial port
+        @param speed: Serial baudrate in bps
+        @param verbose: Print out serial traffic (True or False)
+        @param txrate: Maximum transmission rate in frames per second
+        """
+        # Event loop
+        self._loop = loop
+        ## Name(path) of the serial port
+        self.portname = portname
+        ## Future resolving to this object once the modem settings are known
+        self.ready = SwapFuture()
+        # Serial mode (command or data modes)
+        self._sermode = SerialModem.Mode.DATA
+        # Queue of (command, future, timeout) tuples
+        self._at_queue = collections.deque()
+        # (command, future, timer) tuple of the command being run
+        self._at_current = None
+        # "Packet received" callback function
+        self._ccpacket_received = None
+        # True once a soft reset has been tried
+        self._soft_reset = False
+        ## Hardware version of the serial modem
+        self.hwversion = None
+        ## Firmware version of the serial modem
+        self.fwversion = None
+        ## Frequency channel of the serial gateway
+        self.freq_channel = None
+        ## Synchronization word of the serial gateway
+        self.syncword = None
+        ## Device address of the serial gateway
+        self.devaddress = None
+
+        self._ready_timer = loop.call_later(AsyncModem._READY_TIMEOUT, self._readyTimeout)
+        # Open serial port
+        self._transport = SerialTransport(loop, self, portname, speed, txrate, verbose)
@@ -0,0 +1,198 @@
+#########################################################################
+#
+# AsyncServer
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from swap.SwapRequest import SwapRequest, SwapPendingTable
+from swap.protocol.SwapPacket import SwapPacket, SwapCommandPacket, SwapQueryPacket
+from swap.protocol.SwapDefs import SwapFunction
+from swap.protocol.SmartEncrypt import Password
+from swap.SwapException import SwapException
+
+import time
+
+
+class AsyncServer(object):
+    """
+    Minimal SWAP server on top of an AsyncModem. Commands and queries return
+    SwapFuture objects resolved by the matching STATUS packet
+    """
+    # Maximum waiting time (in seconds) for a response before retrying
+    _WAITTIME_ACK = 2.0
+    # Max tries for any SWAP command or query
+    _MAX_TRIES = 3
+
+
+    def _ccPacketReceived(self, ccPacket):
+        """
+        CcPacket received. Run from the loop thread
+
+        @param ccPacket: CcPacket received
+        """
+        try:
+            packet = SwapPacket(ccPacket)
+        except SwapException:
+            return
+
+        if packet.function == SwapFunction.STATUS:
+            self.nonces[packet.srcAddress] = packet.nonce
+            if packet.value is not None:
+                self._pending.resolve(packet)
+
+        if self.packet_received is not None:
+            self.packet_received(packet)
+
+
+    def _request(self, request, send, timeout, tries):
+        """
+        Send packet and retry until the matching STATUS arrives
+
+        @param request: SwapRequest object
+        @param send: Function transmitting the packet
+        @param timeout: Waiting time per try in seconds
+        @param tries: Amount of tries
+
+        @return request object, completed with the response or with
+        request.failed after the last try
+        """
+        def attempt():
+            if request.done():
+                return
+            if request.tries >= tries:
+                self._pending.remove(request)
+                request.set_result(request.failed)
+                return
+            request.tries += 1
+            request.sent = time.time()
+            request.timer = self._loop.call_later(timeout, attempt)
+            send()
+        self._pending.add(request)
+        self._loop.call_soon(attempt)
+        return request
+
+
+    def set_register(self, mote, regid, value, timeout=None, tries=None):
+        """
+        Set new register value on wireless mote. Thread-safe
+
+        @param mote: Mote containing the register
+        @param regid: Register ID
+        @param value: New register value (SwapValue)
+        @param timeout: Waiting time for the ACK per try in seconds
+        @param tries: Amount of tries
+
+        @return SwapRequest future resolving to True if the command is ack'ed,
+        False otherwise
+        """
+        if timeout is None:
+            timeout = AsyncServer._WAITTIME_ACK
+        if tries is None:
+            tries = AsyncServer._MAX_TRIES
+        def send():
+            nonce = self.nonces.get(mote.address, mote.nonce)
+            SwapCommandPacket(mote.address, regid, value, nonce).send(self)
+        return self._request(SwapRequest(mote.address, regid, value), send, timeout, tries)
+
+
+    def query_register(self, mote, regid, timeout=None, tries=None):
+        """
+        Query mote register. Thread-safe
+
+        @param mote: Mote containing the register
+        @param regid: Register ID
+        @param timeout: Waiting time for the response per try in seconds
+        @param tries: Amount of tries
+
+        @return SwapRequest future resolving to the register value (SwapValue)
+        or None if the mote did not answer
+        """
+        if timeout is None:
+            timeout = AsyncServer._WAITTIME_ACK
+        if tries is None:
+            tries = AsyncServer._MAX_TRIES
+        def send():
+            SwapQueryPacket(mote.address, regid).send(self)
+        return self._request(SwapRequest(mote.address, regid), send, timeout, tries)
+
+
+    def get_latency_stats(self, address=None):
+        """
+        Return histograms of the time taken by motes to answer
+
+        @param address: Mote address. None for all motes
+
+        @return histogram dictionary, or dictionary of histograms indexed
+        by mote address. Times are given in milliseconds
+        """
+        return self._pending.get_latency_stats(address)
+
+
+    def swapPacketSent(self, packet):
+        """
+        SWAP packet transmitted. Called from SwapPacket.send
+
+        @param packet: SWAP packet transmitted
+        """
+        pass
+
+
+    @property
+    def devaddress(self):
+        """
+        Device address of the serial gateway
+        """
+        return self.modem.devaddress
+
+
+    def __init__(self, loop, modem, security=0, password=None):
+        """
+        Class constructor
+
+        @param loop: EventLoop object driving the modem
+        @param modem: AsyncModem object, ready for use
+        @param security: Security option
+        @param password: Smart Encryption password as a hex string
+        """
+        # Event loop
+        self._loop = loop
+        ## Serial wireless gateway
+        self.modem = modem
+        ## Security option
+        self.security = security
+        ## Encryption password
+        self.password = None
+        if password is not None:
+            self.password = Password(password)
+        ## Last nonce received from each mote address
+        self.nonces = {}
+        ## Function receiving every SwapPacket. Called from the loop thread
+        self.packet_received = None
+        # Commands and queries waiting for their response
+        self._pending = SwapPendingTable()
+        # SwapPacket.send notifies transmissions through this object
+        self._eventHandler = self
+
+        modem.setRxCallback(self._ccPacketReceived)
@@ -0,0 +1,263 @@
+#########################################################################
+#
+# EventLoop
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from swap.SwapException import SwapException
+
+import threading
+import traceback
+import select
+import heapq
+import errno
+import fcntl
+import time
+import os
+
+
+class TimerHandle(object):
+    """
+    Call scheduled on the event loop
+    """
+    def cancel(self):
+        """
+        Cancel call
+        """
+        self.cancelled = True
+
+
+    def __init__(self, when, callback, args):
+        """
+        Class constructor
+
+        @param when: Time stamp of the call
+        @param callback: Function to be called
+        @param args: Arguments passed to the function
+        """
+        ## Time stamp of the call
+        self.when = when
+        ## Function to be called
+        self.callback = callback
+        ## Arguments passed to the function
+        self.args = args
+        ## True once cancelled
+        self.cancelled = False
+
+
+class EventLoop(threading.Thread):
+    """
+    Single thread multiplexing file descriptors and timers with select()
+    """
+    def run(self):
+        """
+        Run event loop until stop() is called
+        """
+        while self._go_on:
+            self._lock.acquire()
+            now = time.time()
+            ready = self._ready
+            self._ready = []
+            while len(self._timers) > 0 and self._timers[0][0] <= now:
+                handle = heapq.heappop(self._timers)[2]
+                if not handle.cancelled:
+                    ready.append(handle)
+            self._lock.release()
+
+            for handle in ready:
+                if not handle.cancelled:
+                    self._invoke(handle.callback, handle.args)
+
+            # Callbacks may have added calls or changed the readers
+            self._lock.acquire()
+            if len(self._ready) > 0:
+                timeout = 0
+            elif len(self._timers) > 0:
+                timeout = max(self._timers[0][0] - time.time(), 0)
+            else:
+                timeout = None
+            readers = self._readers.keys()
+            self._lock.release()
+
+            try:
+                readable = select.select(readers + [self._wakeup_r], [], [], timeout)[0]
+            except select.error as ex:
+                if ex.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            for fd in readable:
+                if fd == self._wakeup_r:
+                    self._drain()
+                elif fd in self._readers:
+                    self._invoke(self._readers[fd], ())
+
+        self._wakeup_lock.acquire()
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+        self._wakeup_w = None
+        self._wakeup_lock.release()
+
+
+    def _invoke(self, callback, args):
+        """
+        Run callback without letting errors stop the loop
+
+        @param callback: Function to be called
+        @param args: Arguments passed to the function
+        """
+        try:
+            callback(*args)
+        except SwapException as ex:
+            ex.display()
+        except Exception:
+            traceback.print_exc()
+
+
+    def _wakeup(self):
+        """
+        Interrupt select() so that the loop picks up changes
+        """
+        if threading.currentThread() is not self:
+            self._wakeup_lock.acquire()
+            try:
+                # The pipe is closed once the loop stops
+                if self._wakeup_w is not None:
+                    os.write(self._wakeup_w, "x")
+            except OSError as ex:
+                # A full pipe wakes the loop up anyway
+                if ex.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise
+            finally:
+                self._wakeup_lock.release()
+
+
+    def _drain(self):
+        """
+        Empty the wakeup pipe
+        """
+        while True:
+            try:
+                if len(os.read(self._wakeup_r, 4096)) == 0:
+                    return
+            except OSError as ex:
+                if ex.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                raise
+
+
+    def stop(self):
+        """
+        Stop event loop
+        """
+        self._go_on = False
+        self._wakeup()
+
+
+    def add_reader(self, fd, callback):
+        """
+        Watch file descriptor for reading
+
+        @param fd: File descriptor
+        @param callback: Function called without arguments when readable
+        """
+        self._lock.acquire()
+        self._readers[fd] = callback
+        self._lock.release()
+        self._wakeup()
+
+
+    def remove_reader(self, fd):
+        """
+        Stop watching file descriptor
+
+        @param fd: File descriptor
+        """
+        self._lock.acquire()
+        self._readers.pop(fd, None)
+        self._lock.release()
+        self._wakeup()
+
+
+    def call_later(self, delay, callback, *args):
+        """
+        Schedule call after a given delay. Thread-safe
+
+        @param delay: Delay in seconds
+        @param callback: Function to be called
+        @param args: Arguments passed to the function
+
+        @return TimerHandle object
+        """
+        handle = TimerHandle(time.time() + delay, callback, args)
+        self._lock.acquire()
+        self._seq += 1
+        heapq.heappush(self._timers, (handle.when, self._seq, handle))
+        self._lock.release()
+        self._wakeup()
+        return handle
+
+
+    def call_soon(self, callback, *args):
+        """
+        Schedule call on the next loop iteration. Thread-safe
+
+        @param callback: Function to be called
+        @param args: Arguments passed to the function
+
+        @return TimerHandle object
+        """
+        handle = TimerHandle(time.time(), callback, args)
+        self._lock.acquire()
+        self._ready.append(handle)
+        self._lock.release()
+        self._wakeup()
+        return handle
+
+
+    def __init__(self):
+        """
+        Class constructor
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        # Run flag
+        self._go_on = True
+        # Callbacks per file descriptor
+        self._readers = {}
+        # Heap of (time stamp, sequence, handle) tuples
+        self._timers = []
+        # Sequence number keeping timers with the same time stamp in order
+        self._seq = 0
+        # Calls to be run on the next iteration
+        self._ready = []
+        # Guards readers, timers and ready calls
+        self._lock = threading.Lock()
+        # Pipe used to interrupt select() from other threads. Never blocks
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        for fd in (self._wakeup_r, self._wakeup_w):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        # Keeps the pipe from being closed while written
+        self._wakeup_lock = threading.Lock()
@@ -0,0 +1,247 @@
+#########################################################################
+#
+# SerialTransport
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from swap.modem.SerialPort import SerialPort
+from swap.modem.TxScheduler import TxPriority
+from swap.SwapException import SwapException
+
+import collections
+import serial
+import time
+import os
+
+
+class SerialProtocol(object):
+    """
+    Interface of the objects receiving data from a SerialTransport
+    """
+    def connection_made(self, transport):
+        """
+        Serial port opened
+
+        @param transport: SerialTransport object
+        """
+        pass
+
+
+    def line_received(self, line):
+        """
+        Serial frame received
+
+        @param line: Frame in string format, without line terminators
+        """
+        pass
+
+
+    def connection_lost(self, exc):
+        """
+        Serial port closed
+
+        @param exc: Exception describing the failure or None if closed on purpose
+        """
+        pass
+
+
+class SerialTransport(object):
+    """
+    Non-blocking serial port driven by an EventLoop
+    """
+    def _readable(self):
+        """
+        Read everything available and pass complete frames to the protocol
+        """
+        try:
+            chunk = os.read(self._fileno, 4096)
+        except OSError as ex:
+            self._fail(SwapException("Serial port " + self.portname + " not available: " + str(ex)))
+            return
+        if len(chunk) == 0:
+            self._fail(SwapException("Serial port " + self.portname + " closed"))
+            return
+        (frames, self._rxbuf) = SerialPort.splitFrames(self._rxbuf, chunk)
+        for frame in frames:
+            if self.verbose:
+                print "Rved: " + frame
+            self._protocol.line_received(frame)
+
+
+    def write(self, buf, priority=TxPriority.NORMAL):
+        """
+        Queue string buffer for transmission. Thread-safe
+
+        @param buf: Packet to be transmitted
+        @param priority: Transmission lane (see TxPriority)
+        """
+        self._loop.call_soon(self._queue, buf, priority)
+
+
+    def _queue(self, buf, priority):
+        """
+        Append buffer to its transmission lane. Run from the loop thread
+
+        @param buf: Packet to be transmitted
+        @param priority: Transmission lane (see TxPriority)
+        """
+        if self._serport is None:
+            return
+        self._lanes[priority].append(buf)
+        self._schedule()
+
+
+    def _schedule(self):
+        """
+        Arm transmission timer according to the minimum interval between frames
+        """
+        if self._txtimer is not None:
+            return
+        for lane in self._lanes:
+            if len(lane) > 0:
+                delay = self._last_tx + self.txinterval - time.time()
+                self._txtimer = self._loop.call_later(max(delay, 0), self._transmit)
+                return
+
+
+    def _transmit(self):
+        """
+        Transmit next frame from the most urgent lane
+        """
+        self._txtimer = None
+        if self._serport is None:
+            return
+        for lane in self._lanes:
+            if len(lane) > 0:
+                buf = lane.popleft()
+                try:
+                    self._serport.write(buf)
+                except serial.SerialException as ex:
+                    self._fail(SwapException("Unable to write on serial port " + self.portname + ": " + str(ex)))
+                    return
+                self._last_tx = time.time()
+                if self.verbose:
+                    print "Sent: " + buf
+                break
+        self._schedule()
+
+
+    def reset(self):
+        """
+        Hardware reset serial modem
+        """
+        try:
+            self._serport.setDTR(False)
+            self._serport.setRTS(False)
+            time.sleep(0.001)
+            self._serport.setDTR(True)
+            self._serport.setRTS(True)
+        except IOError:
+            # Port without modem control lines (pseudo-terminal)
+            pass
+
+
+    def _fail(self, exc):
+        """
+        Close port after an error and notify the protocol
+
+        @param exc: Exception describing the failure
+        """
+        self._close()
+        self._protocol.connection_lost(exc)
+
+
+    def close(self):
+        """
+        Close serial port. Thread-safe
+        """
+        self._loop.call_soon(self._closeAndNotify)
+
+
+    def _closeAndNotify(self):
+        """
+        Close serial port and notify the protocol
+        """
+        if self._serport is not None:
+            self._close()
+            self._protocol.connection_lost(None)
+
+
+    def _close(self):
+        """
+        Stop watching and close the serial port
+        """
+        if self._serport is None:
+            return
+        self._loop.remove_reader(self._fileno)
+        if self._txtimer is not None:
+            self._txtimer.cancel()
+            self._txtimer = None
+        self._serport.close()
+        self._serport = None
+
+
+    def __init__(self, loop, protocol, portname="/dev/ttyUSB0", speed=38400, txrate=None, verbose=False):
+        """
+        Class constructor
+
+        @param loop: EventLoop object driving this transport
+        @param protocol: SerialProtocol object receiving the serial frames
+        @param portname: Name/path of the serial port
+        @param speed: Serial baudrate in bps
+        @param txrate: Maximum transmission rate in frames per second
+        @param verbose: Print out serial traffic (True or False)
+        """
+        # Event loop
+        self._loop = loop
+        # Protocol object
+        self._protocol = protocol
+        ## Name(path) of the serial port
+        self.portname = portname
+        ## Print out serial traffic
+        self.verbose = verbose
+        ## Minimum interval between transmissions in seconds
+        self.txinterval = SerialPort.txdelay
+        if txrate is not None:
+            self.txinterval = 1.0 / txrate
+        # Time stamp of the last transmission
+        self._last_tx = 0
+        # Pending transmission timer
+        self._txtimer = None
+        # One queue of frames per priority
+        self._lanes = [collections.deque(), collections.deque()]
+        # Incomplete frame received so far
+        self._rxbuf = ""
+
+        try:
+            self._serport = serial.Serial(portname, speed, timeout=0)
+        except serial.SerialException as ex:
+            raise SwapException(str(ex))
+        self._serport.writeTimeout = 1
+        self._fileno = self._serport.fileno()
+        self.reset()
+
+        self._protocol.connection_made(self)
+        self._loop.add_reader(self._fileno, self._readable)
@@ -0,0 +1,157 @@
+#########################################################################
+#
+# SwapFuture
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from swap.SwapException import SwapException
+
+import threading
+import traceback
+
+
+class SwapFuture(object):
+    """
+    Result of an operation that completes later, possibly on another thread
+    """
+    def done(self):
+        """
+        Tell whether the operation is complete
+
+        @return True if a result or an exception has been set
+        """
+        return self._event.isSet()
+
+
+    def result(self, timeout=None):
+        """
+        Wait for the operation to complete and return its result
+
+        @param timeout: Maximum waiting time in seconds. None to wait until
+        the operation completes. Prefer timeouts enforced by the party
+        completing the future since blocking without timeout is cheaper
+
+        @return result of the operation. Raise the exception set otherwise
+        """
+        if not self._event.wait(timeout):
+            raise SwapException("Timeout waiting for operation to complete")
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+    def exception(self):
+        """
+        Return the exception set on this future, if any
+
+        @return exception object or None
+        """
+        return self._exception
+
+
+    def set_result(self, result):
+        """
+        Complete the operation successfully. Ignored if already complete
+
+        @param result: Result of the operation
+        """
+        self._complete(result, None)
+
+
+    def set_exception(self, exception):
+        """
+        Complete the operation with an error. Ignored if already complete
+
+        @param exception: Exception to be raised by result()
+        """
+        self._complete(None, exception)
+
+
+    def add_done_callback(self, callback):
+        """
+        Call function once the operation is complete. The function is
+        called immediately if the operation is already complete
+
+        @param callback: Function receiving this future as argument
+        """
+        self._lock.acquire()
+        if not self._event.isSet():
+            self._callbacks.append(callback)
+            callback = None
+        self._lock.release()
+        if callback is not None:
+            self._invoke(callback)
+
+
+    def _complete(self, result, exception):
+        """
+        Store outcome, wake up waiters and run callbacks
+
+        @param result: Result of the operation
+        @param exception: Exception describing the failure or None
+        """
+        self._lock.acquire()
+        if self._event.isSet():
+            self._lock.release()
+            return
+        self._result = result
+        self._exception = exception
+        self._event.set()
+        callbacks = self._callbacks
+        self._callbacks = []
+        self._lock.release()
+        for callback in callbacks:
+            self._invoke(callback)
+
+
+    def _invoke(self, callback):
+        """
+        Run done-callback. Errors are reported without affecting the thread
+        completing the future, or the rest of the callbacks
+
+        @param callback: Function receiving this future as argument
+        """
+        try:
+            callback(self)
+        except SwapException as ex:
+            ex.display()
+        except Exception:
+            traceback.print_exc()
+
+
+    def __init__(self):
+        """
+        Class constructor
+        """
+        # Result of the operation
+        self._result = None
+        # Exception raised by the operation
+        self._exception = None
+        # Set once complete
+        self._event = threading.Event()
+        # Functions to be called on completion
+        self._callbacks = []
+        # Guards callbacks
+        self._lock = threading.Lock()
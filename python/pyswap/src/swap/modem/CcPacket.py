@@ -28,10 +28,15 @@ __date__ ="$Aug 20, 2011 10:36:00 AM$"
 
 from swap.SwapException import SwapException
 
+from binascii import hexlify, unhexlify
+
+
 class CcPacket(object):
     """
     Standard packet structure of the CC11xx family of IC's
     """
+    __slots__ = ("data", "rssi", "lqi")
+
 
     def send(self, modem):
         """
@@ -48,14 +53,7 @@ class CcPacket(object):
         
         @return CcPacket in string format
         """
-        # Convert list of bytes to list of strings
-        strList = []
-        for item in self.data:
-            strList.append("{0:02X}".format(int(item)))
-        # Convert list of strings to string
-        strBuf = "".join(item for item in strList)
-        # Return string
-        return strBuf
+        return hexlify(self.data).upper()
     
     def __init__(self, strPacket=None):
         """
@@ -64,7 +62,7 @@ class CcPacket(object):
         @param strPacket: Wireless packet in string format
         """
         ## Data bytes
-        self.data = []
+        self.data = bytearray()
         ## RSSI value in case of packet received
         self.rssi = 0
         ## LQI in case of packet received
@@ -84,9 +82,7 @@ class CcPacket(object):
                 self.rssi = int(strPacket[1:3], 16)
                 ## LQI byte
                 self.lqi = int(strPacket[3:5], 16)
-                # Parse data fields
-                for i in range(6, len(strPacket), 2):
-                    byte = int(strPacket[i:i + 2], 16)
-                    self.data.append(byte)
-            except ValueError:
-                SwapException("Incorrect packet format")
+                # Parse data fields without copying the line
+                self.data = bytearray(unhexlify(buffer(strPacket, 6)))
+            except (ValueError, TypeError):
+                raise SwapException("Incorrect packet format")
@@ -0,0 +1,328 @@
+#########################################################################
+#
+# ModemPool
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+
+#########################################################################
+
+from swap.protocol.SwapDefs import SwapAddress
+from TxScheduler import TxPriority
+
+import collections
+import threading
+import time
+
+
+class ModemPool(object):
+    """
+    Set of serial modems covering the same SWAP network. Frames heard by
+    several gateways are passed only once to the receiving callback and
+    unicast frames are transmitted through the gateway best hearing the
+    target mote. Provides the SerialModem interface used by SwapServer
+    """
+    ## Seconds during which identical frames are taken as copies of the same transmission
+    dedup_window = 0.5
+
+
+    @staticmethod
+    def _quality(rssi, lqi):
+        """
+        Return comparable link quality from the CC11xx RSSI and LQI bytes
+
+        @param rssi: RSSI byte
+        @param lqi: LQI byte
+
+        @return (RSSI in dBm, negated LQI) tuple. Greater is better
+        """
+        if rssi >= 128:
+            rssi -= 256
+        # The lower LQI, the better the link. Bit 7 is the CRC flag
+        return (rssi / 2.0 - 74, -(lqi & 0x7F))
+
+
+    def _packetReceived(self, modem, packet):
+        """
+        CcPacket received from one of the gateways
+
+        @param modem: Gateway having received the packet
+        @param packet: CcPacket received
+        """
+        now = time.time()
+        key = str(packet.data)
+        self._lock.acquire()
+        try:
+            # Forget old frames
+            limit = now - ModemPool.dedup_window
+            while len(self._recent_order) > 0 and self._recent_order[0][0] < limit:
+                (stamp, old) = self._recent_order.popleft()
+                if self._recent.get(old) == stamp:
+                    del self._recent[old]
+            duplicated = key in self._recent
+            if not duplicated:
+                self._recent[key] = now
+                self._recent_order.append((now, key))
+
+            # Learn route to the source mote
+            if len(packet.data) > 1:
+                address = packet.data[1]
+                if address != self.devaddress:
+                    quality = ModemPool._quality(packet.rssi, packet.lqi)
+                    route = self._routes.get(address)
+                    if route is None or route[0] < limit or route[2] < quality:
+                        self._routes[address] = (now, modem, quality)
+        finally:
+            self._lock.release()
+
+        if duplicated:
+            self.duplicates += 1
+            return
+        if self._ccpacket_received is not None:
+            # Keep one packet at a time through the receiving callback
+            self._rx_lock.acquire()
+            try:
+                self._ccpacket_received(packet)
+            finally:
+                self._rx_lock.release()
+
+
+    def _receiver(self, modem):
+        """
+        Return reception callback for a given gateway
+
+        @param modem: Serial modem
+
+        @return callback function
+        """
+        def received(packet):
+            self._packetReceived(modem, packet)
+        return received
+
+
+
+    def get_route(self, address):
+        """
+        Return gateway that last heard a given mote with the best link quality
+
+        @param address: Mote address
+
+        @return serial modem or None if the mote was not heard yet
+        """
+        route = self._routes.get(address)
+        if route is None:
+            return None
+        return route[1]
+
+
+    def setRxCallback(self, cbFunct):
+        """
+        Set callback reception function. Notify new CcPacket reception
+
+        @param cbFunct: Definition of custom Callback function for the reception of packets
+        """
+        self._ccpacket_received = cbFunct
+
+
+    def sendCcPacket(self, packet, priority=TxPriority.HIGH):
+        """
+        Send wireless CcPacket. Unicast packets go through the gateway best
+        hearing the target mote. Broadcast packets and packets addressed to
+        unknown motes go through every gateway
+
+        @param packet: CcPacket to be transmitted
+        @param priority: Transmission lane (see TxPriority)
+        """
+        modem = None
+        if len(packet.data) > 0 and packet.data[0] != SwapAddress.BROADCAST_ADDR:
+            modem = self.get_route(packet.data[0])
+        if modem is not None:
+            modem.sendCcPacket(packet, priority)
+        else:
+            for modem in self.modems:
+                modem.sendCcPacket(packet, priority)
+
+
+    def setFreqChannel(self, value):
+        """
+        Set frequency channel on every gateway
+
+        @param value: New frequency channel
+
+        @return True if every gateway accepted the new setting
+        """
+        return self._setAll("setFreqChannel", value)
+
+
+    def setSyncWord(self, value):
+        """
+        Set synchronization word on every gateway
+
+        @param value: New synchronization word
+
+        @return True if every gateway accepted the new setting
+        """
+        return self._setAll("setSyncWord", value)
+
+
+    def setDevAddress(self, value):
+        """
+        Set device address on every gateway
+
+        @param value: New device address
+
+        @return True if every gateway accepted the new setting
+        """
+        return self._setAll("setDevAddress", value)
+
+
+    def configure(self, devaddress=None, syncword=None, freq_channel=None):
+        """
+        Apply several settings on every gateway, within a single
+        command-mode session per gateway
+
+        @param devaddress: New device address
+        @param syncword: New synchronization word
+        @param freq_channel: New frequency channel
+
+        @return True if every gateway accepted the new settings
+        """
+        result = True
+        for modem in self.modems:
+            if modem.configure(devaddress, syncword, freq_channel) == False:
+                result = False
+        return result
+
+
+    def _setAll(self, method, value):
+        """
+        Apply setting on every gateway
+
+        @param method: Name of the SerialModem setter
+        @param value: New value
+
+        @return True if every gateway accepted the new setting
+        """
+        result = True
+        for modem in self.modems:
+            if getattr(modem, method)(value) == False:
+                result = False
+        return result
+
+
+    def goToDataMode(self):
+        """
+        Enter data mode on every gateway
+
+        @return True if every gateway entered data mode
+        """
+        result = True
+        for modem in self.modems:
+            if modem.goToDataMode() == False:
+                result = False
+        return result
+
+
+    def stop(self):
+        """
+        Stop every gateway
+        """
+        for modem in self.modems:
+            modem.stop()
+
+
+    @property
+    def devaddress(self):
+        """
+        Device address of the gateways
+        """
+        return self.modems[0].devaddress
+
+
+    @property
+    def syncword(self):
+        """
+        Synchronization word of the gateways
+        """
+        return self.modems[0].syncword
+
+
+    @property
+    def freq_channel(self):
+        """
+        Frequency channel of the gateways
+        """
+        return self.modems[0].freq_channel
+
+
+    @property
+    def hwversion(self):
+        """
+        Hardware version of the first gateway
+        """
+        return self.modems[0].hwversion
+
+
+    @property
+    def fwversion(self):
+        """
+        Firmware version of the first gateway
+        """
+        return self.modems[0].fwversion
+
+
+    @property
+    def portname(self):
+        """
+        Serial port of the first gateway
+        """
+        return self.modems[0].portname
+
+
+    def __init__(self, modems):
+        """
+        Class constructor
+
+        @param modems: List of SerialModem objects. Transmission queues run
+        independently on each one
+        """
+        ## List of serial modems
+        self.modems = list(modems)
+        ## Amount of duplicated frames discarded
+        self.duplicates = 0
+        # "Packet received" callback function
+        self._ccpacket_received = None
+        # Guards routes and recent frames
+        self._lock = threading.Lock()
+        # Serializes calls to the receiving callback
+        self._rx_lock = threading.Lock()
+        # Reception time of recent frames indexed by frame data
+        self._recent = {}
+        # (time, frame data) tuples in reception order
+        self._recent_order = collections.deque()
+        # (time, modem, quality) tuples indexed by mote address
+        self._routes = {}
+
+        for modem in self.modems:
+            modem.setRxCallback(self._receiver(modem))
+
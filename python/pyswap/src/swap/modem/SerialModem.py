@@ -26,16 +26,26 @@ __author__="Daniel Berenguer"
 __date__ ="$Aug 20, 2011 10:36:00 AM$"
 #########################################################################
 
+import collections
+import threading
 import time
 
 from SerialPort import SerialPort
+from SwapSimulator import SwapSimulator
+from TxScheduler import TxPriority
 from CcPacket import CcPacket
+from swap.aio.SwapFuture import SwapFuture
 from swap.SwapException import SwapException
 
 class SerialModem:
     """
     Class representing a serial panstamp modem
     """
+    ## Maximum amount of wireless frames held while in command mode. The
+    ## oldest ones are discarded beyond this limit
+    rx_backlog = 256
+    # Time (in seconds) waiting for "Modem ready!" before trying a soft reset
+    _READY_TIMEOUT = 5.0
 
     class Mode:
         """
@@ -56,36 +66,136 @@ class SerialModem:
     def _serialPacketReceived(self, buf):
         """
         Serial packet received. This is a callback function called from
-        the SerialPort object
+        the SerialPort object. Wireless frames received in command mode
+        are held until the modem returns to data mode
         
         @param buf: Serial packet received in String format
         """
-        # If modem in command mode
-        if self._sermode == SerialModem.Mode.COMMAND:
-            self._atresponse = buf
-            self.__atresponse_received = True
-        # If modem in data mode
-        else:
-            # Waiting for ready signal from modem?
-            if self._wait_modem_start == False:
-                if buf == "Modem ready!":
-                    self._wait_modem_start = True
-            # Create CcPacket from string and notify reception
-            elif self._ccpacket_received is not None:
+        if buf[0] != '(':
+            # Response to the AT command being run?
+            self._lock.acquire()
+            future = self._at_future
+            self._at_future = None
+            self._lock.release()
+            if future is not None:
+                future.set_result(buf)
+            elif buf == "Modem ready!":
+                self._ready.set()
+            return
+
+        self._lock.acquire()
+        if len(self._backlog) == self._backlog.maxlen:
+            self.rx_dropped += 1
+        self._backlog.append(buf)
+        self._lock.release()
+        self._flushBacklog()
+
+
+    def _flushBacklog(self):
+        """
+        Pass wireless frames held so far to the reception callback, in the
+        order they were received. Only one thread passes frames at a time.
+        Frames stay held in command mode and while no callback is defined
+        """
+        self._lock.acquire()
+        if self._flushing:
+            # Another thread is passing frames. It will take these ones too
+            self._lock.release()
+            return
+        self._flushing = True
+        self._lock.release()
+
+        try:
+            while True:
+                self._lock.acquire()
                 try:
-                    ccPacket = CcPacket(buf)
+                    if self._sermode == SerialModem.Mode.COMMAND or self._ccpacket_received is None or \
+                       len(self._backlog) == 0:
+                        self._flushing = False
+                        return
+                    buf = self._backlog.popleft()
+                finally:
+                    self._lock.release()
+                self.rx_frames += 1
+                try:
+                    try:
+                        ccPacket = CcPacket(buf)
+                    except SwapException:
+                        self.rx_errors += 1
+                        raise
                     self._ccpacket_received(ccPacket)
-                except SwapException:
-                    raise
+                except SwapException as ex:
+                    ex.display()
+        except:
+            self._lock.acquire()
+            self._flushing = False
+            self._lock.release()
+            raise
+
+
+    def _setMode(self, mode):
+        """
+        Switch serial mode, accounting for the time spent in command mode.
+        Wireless frames held in command mode are passed on when switching
+        to data mode
+        
+        @param mode: New serial mode (see SerialModem.Mode)
+        """
+        self._lock.acquire()
+        now = time.time()
+        if mode == SerialModem.Mode.COMMAND and self._sermode != SerialModem.Mode.COMMAND:
+            self._command_since = now
+            self.command_sessions += 1
+        elif mode == SerialModem.Mode.DATA and self._sermode == SerialModem.Mode.COMMAND:
+            self.command_last = now - self._command_since
+            self.command_time += self.command_last
+        self._sermode = mode
+        self._lock.release()
+        if mode == SerialModem.Mode.DATA:
+            self._flushBacklog()
+
+
+    def getCommandStats(self):
+        """
+        Return time spent in command mode and wireless frames held meanwhile
+        
+        @return dictionary with the amount of command-mode sessions, the
+        time spent in command mode (in seconds, current session included),
+        the duration of the last session, the amount of frames held and the
+        amount of held frames discarded
+        """
+        self._lock.acquire()
+        try:
+            total = self.command_time
+            if self._sermode == SerialModem.Mode.COMMAND:
+                total += time.time() - self._command_since
+            return {"sessions": self.command_sessions,
+                    "time": total,
+                    "last": self.command_last,
+                    "held": len(self._backlog),
+                    "dropped": self.rx_dropped}
+        finally:
+            self._lock.release()
+
+
+    def getTxStats(self):
+        """
+        Return transmission counters: queue depth and queuing times
+        
+        @return dictionary of counters
+        """
+        return self._serport.getTxStats()
 
 
     def setRxCallback(self, cbFunct):
         """
-        Set callback reception function. Notify new CcPacket reception
+        Set callback reception function. Notify new CcPacket reception.
+        Frames held so far are passed to the new callback
         
         @param cbFunct: Definition of custom Callback function for the reception of packets
         """
         self._ccpacket_received = cbFunct
+        self._flushBacklog()
         
 
     def goToCommandMode(self):
@@ -97,14 +207,15 @@ class SerialModem:
         if self._sermode == SerialModem.Mode.COMMAND:
             return True
         
-        self._sermode = SerialModem.Mode.COMMAND
+        # Hold wireless frames from now on
+        self._setMode(SerialModem.Mode.COMMAND)
         response = self.runAtCommand("+++", 5000)
 
         if response is not None:
             if response[:2] == "OK":
                 return True
         
-        self._sermode = SerialModem.Mode.DATA
+        self._setMode(SerialModem.Mode.DATA)
         return False
 
 
@@ -121,7 +232,7 @@ class SerialModem:
         
         if response is not None:
             if response[0:2] == "OK":
-                self._sermode = SerialModem.Mode.DATA;
+                self._setMode(SerialModem.Mode.DATA)
                 return True;
         
         return False;
@@ -142,7 +253,7 @@ class SerialModem:
             return False
         
         if response[0:2] == "OK":
-            self._sermode = SerialModem.Mode.DATA
+            self._setMode(SerialModem.Mode.DATA)
             return True
         
         return False
@@ -150,39 +261,83 @@ class SerialModem:
 
     def runAtCommand(self, cmd="AT\r", timeout=1000):
         """
-        Run AT command on the serial gateway
+        Run AT command on the serial gateway. The caller sleeps until the
+        response arrives. Commands from different threads are run one after
+        the other
         
         @param cmd: AT command to be run
         @param timeout: Period after which the function should timeout
         
         @return Response received from gateway or None in case of lack of response (timeout)
         """
-        self.__atresponse_received = False
-        # Send command via serial
         if self._serport is None:
             raise SwapException("Port " + self.portname + " is not open")
 
-        # Skip wireless packets
-        self._atresponse = "("
-        # Send serial packet
-        self._serport.send(cmd)
-        
-        # Wait for response from modem
-        while len(self._atresponse) == 0 or self._atresponse[0] == '(':
-            if not self._waitForResponse(timeout):
+        self._at_lock.acquire()
+        try:
+            future = SwapFuture()
+            self._lock.acquire()
+            self._at_future = future
+            self._lock.release()
+            # Send serial packet
+            self._serport.send(cmd, TxPriority.HIGH)
+            # Wait for response from modem
+            try:
+                return future.result(timeout / 1000.0)
+            except SwapException:
                 return None
-        # Return response received from gateway
-        return self._atresponse
+        finally:
+            self._lock.acquire()
+            if self._at_future is future:
+                self._at_future = None
+            self._lock.release()
+            self._at_lock.release()
+
+
+    def configure(self, devaddress=None, syncword=None, freq_channel=None):
+        """
+        Apply several modem settings within a single command-mode session.
+        Settings already in place are skipped
+        
+        @param devaddress: New device address
+        @param syncword: New synchronization word
+        @param freq_channel: New frequency channel
+        
+        @return True if every setting was accepted by the modem
+        """
+        changes = []
+        if devaddress is not None and devaddress != self.devaddress:
+            changes.append((self.setDevAddress, devaddress))
+        if syncword is not None and syncword != self.syncword:
+            changes.append((self.setSyncWord, syncword))
+        if freq_channel is not None and freq_channel != self.freq_channel:
+            changes.append((self.setFreqChannel, freq_channel))
+        if len(changes) == 0:
+            return True
 
+        if not self.goToCommandMode():
+            return False
+        result = True
+        try:
+            for (setter, value) in changes:
+                if setter(value) == False:
+                    result = False
+        finally:
+            if not self.goToDataMode():
+                result = False
+        return result
 
-    def sendCcPacket(self, packet):
+
+    def sendCcPacket(self, packet, priority=TxPriority.HIGH):
         """
         Send wireless CcPacket through the serial gateway
         
         @param packet: CcPacket to be transmitted
+        @param priority: Transmission lane (see TxPriority). SWAP packets
+        pass the lane of their clear function code (see SwapPacket.priority)
         """
         strBuf = packet.toString() + "\r"
-        self._serport.send(strBuf)
+        self._serport.send(strBuf, priority)
 
    
     def setFreqChannel(self, value):
@@ -252,35 +407,34 @@ class SerialModem:
         else:
             return False
     
-    def _waitForResponse(self, millis):
-        """
-        Wait a given amount of milliseconds for a response from the serial modem
-        
-        @param millis: Amount of milliseconds to wait for a response
-        """
-        loops = millis / 10
-        while not self.__atresponse_received:
-            time.sleep(0.01)
-            loops -= 1
-            if loops == 0:
-                return False
-        return True
-
 
-    def __init__(self, portname="/dev/ttyUSB0", speed=38400, verbose=False):
+    def __init__(self, portname="/dev/ttyUSB0", speed=38400, verbose=False, txrate=None, txburst=1, capture=None):
         """
         Class constructor
         
         @param portname: Name/path of the serial port
         @param speed: Serial baudrate in bps
         @param verbose: Print out SWAP traffic (True or False)
+        @param txrate: Sustained transmission rate in frames per second
+        @param txburst: Amount of frames that can be sent back-to-back
+        @param capture: Path to a file recording the serial traffic (see SwapCapture)
         """
         # Serial mode (command or data modes)
         self._sermode = SerialModem.Mode.DATA
-        # Response to the last AT command sent to the serial modem
-        self._atresponse = ""
-        # AT response received from modem
-        self.__atresponse_received = None
+        # Guards serial mode, held frames and the pending AT command
+        self._lock = threading.Lock()
+        # Runs AT commands one at a time
+        self._at_lock = threading.Lock()
+        # SwapFuture waiting for the response to the AT command being run
+        self._at_future = None
+        # Wireless frames waiting to be passed to the reception callback
+        self._backlog = collections.deque(maxlen=SerialModem.rx_backlog)
+        # True while a thread is passing held frames
+        self._flushing = False
+        # Set once the modem reports "Modem ready!"
+        self._ready = threading.Event()
+        # Start of the current command-mode session
+        self._command_since = None
         # "Packet received" callback function. To be defined by the parent object
         self._ccpacket_received = None
         ## Name(path) of the serial port
@@ -291,25 +445,35 @@ class SerialModem:
         self.hwversion = None
         ## Firmware version of the serial modem
         self.fwversion = None
+        ## Amount of wireless frames received
+        self.rx_frames = 0
+        ## Amount of wireless frames received with incorrect format
+        self.rx_errors = 0
+        ## Amount of held wireless frames discarded for lack of room
+        self.rx_dropped = 0
+        ## Amount of command-mode sessions
+        self.command_sessions = 0
+        ## Time spent in command mode in seconds, current session excluded
+        self.command_time = 0.0
+        ## Duration of the last command-mode session in seconds
+        self.command_last = None
 
         try:
             # Open serial port
-            self._serport = SerialPort(self.portname, self.portspeed, verbose)
+            if self.portname.startswith(SwapSimulator.PREFIX):
+                # Simulated modem and motes
+                self._serport = SwapSimulator(self.portname, verbose, txrate, txburst, capture)
+            else:
+                self._serport = SerialPort(self.portname, self.portspeed, verbose, txrate, txburst, capture)
             # Define callback function for incoming serial packets
             self._serport.setRxCallback(self._serialPacketReceived)
             # Run serial port thread
             self._serport.start()
                
-            # This flags switches to True when the serial modem is ready
-            self._wait_modem_start = False
-            start = time.time()
-            soft_reset = False
-            while self._wait_modem_start == False:
-                elapsed = time.time() - start
-                if not soft_reset and elapsed > 5:
-                    self.reset()
-                    soft_reset = True
-                elif soft_reset and elapsed > 10:
+            # Wait for the serial modem to be ready
+            if not self._ready.wait(SerialModem._READY_TIMEOUT):
+                self.reset()
+                if not self._ready.wait(SerialModem._READY_TIMEOUT):
                     raise SwapException("Unable to reset serial modem")
 
             # Retrieve modem settings
@@ -26,20 +26,28 @@ __author__="Daniel Berenguer"
 __date__ ="$Aug 21, 2011 17:05:27 AM$"
 #########################################################################
 
+from SwapCapture import SwapCapture
+from TxScheduler import TxScheduler, TxPriority
 from swap.SwapException import SwapException
 
 import threading
 import serial
-import time, sys
-import Queue
+import select
+import errno
+import time, sys, os
 
 
 class SerialPort(threading.Thread):
     """
     Wrapper class of the pyserial package
     """
-    # Minimum delay between transmissions (in seconds)
+    # Minimum delay between transmissions (in seconds). Default pacing when
+    # no transmission rate is given
     txdelay = 0.05
+    ## Read every byte available at once (True) or one byte per read (False)
+    chunked_read = True
+    ## Maximum time (in seconds) the listener waits for incoming data
+    rxtimeout = 0.1
 
 
     def run(self):
@@ -52,79 +60,186 @@ class SerialPort(threading.Thread):
                 # Flush buffers
                 self._serport.flushInput()
                 self._serport.flushOutput()
-                serbuf = []
+                # Transmissions run on their own thread
+                self._txsched.start()
                 # Listen for incoming serial data
                 while self._go_on:
                     try:
-                        # Read single byte (non blocking function)
-                        ch = self._serport.read()
-                        if len(ch) > 0: 
-                            # End of serial packet?
-                            if ch == '\r' or ((ch == '(') and (len(serbuf) > 0)):
-                                strBuf = "".join(serbuf)
-                                serbuf = []
-        
-                                # Enable for debug only
-                                if self._verbose == True:
-                                    print "Rved: " + strBuf
-                                
-                                # Notify reception
-                                if self.serial_received is not None:
-                                    try:
-                                        self.serial_received(strBuf)
-                                    except SwapException as ex:
-                                        ex.display()
-                            elif ch != '\n':
-                                # Append char at the end of the buffer (list)
-                                serbuf.append(ch)
+                        if SerialPort.chunked_read:
+                            self._readChunk()
                         else:
-                            time.sleep(0.01)
+                            self._readByte()
                     except serial.SerialException:
                         raise SwapException("Serial port " + self.portname + " not available")
                     except OSError:
                         raise SwapException(str(sys.exc_type) + ": " + str(sys.exc_info()))
-           
-                    # Anything to be sent?                   
-                    #self._send_lock.acquire()
-                    if not self._strtosend.empty():
-                        if time.time() - self.last_transmission_time > SerialPort.txdelay:
-                            strpacket = self._strtosend.get()          
-                            # Send serial packet
-                            self._serport.write(strpacket) 
-                            # Update time stamp
-                            self.last_transmission_time = time.time()                       
-                            # Enable for debug only
-                            if self._verbose == True:
-                                print "Sent: " + strpacket
-                    #self._send_lock.release()
+                self._txsched.stop()
             else:
                 raise SwapException("Unable to read serial port " + self.portname + " since it is not open")
         else:
             raise SwapException("Unable to read serial port " + self.portname + " since it is not open")
         print "Closing serial port..."
 
-    
+
+    def _readChunk(self):
+        """
+        Wait for incoming serial data and read everything available in the
+        input buffer at once
+        """
+        if self._fileno is not None:
+            # Block until the port becomes readable or the timeout expires
+            try:
+                readable = select.select([self._fileno], [], [], SerialPort.rxtimeout)[0]
+            except select.error as ex:
+                if ex.args[0] == errno.EINTR:
+                    return
+                raise
+            # Port closed while waiting?
+            if len(readable) == 0 or not self._go_on:
+                return
+            nbytes = self._serport.inWaiting()
+        else:
+            # No file descriptor to wait on. Poll the input buffer instead
+            nbytes = self._serport.inWaiting()
+            if nbytes == 0:
+                time.sleep(SerialPort.rxtimeout)
+                return
+
+        # Readable with nothing waiting means the port is going away. Let
+        # read() report it
+        chunk = self._serport.read(max(nbytes, 1))
+        if len(chunk) > 0:
+            self._splitFrames(chunk)
+
+
+    def _splitFrames(self, chunk):
+        """
+        Append chunk of serial data to the reception buffer and notify every
+        complete frame found in it
+        
+        @param chunk: String of bytes read from the serial port
+        """
+        (frames, self._rxbuf) = SerialPort.splitFrames(self._rxbuf, chunk)
+        for strBuf in frames:
+            self._notifyFrame(strBuf)
+
+
+    @staticmethod
+    def splitFrames(rxbuf, chunk):
+        """
+        Split serial data into frames
+        
+        @param rxbuf: Incomplete frame received so far
+        @param chunk: String of bytes read from the serial port
+        
+        @return (list of complete frames, incomplete frame) tuple
+        """
+        # Frames end with CR. An opening parenthesis starts a new wireless
+        # packet too, even if the previous frame was not terminated
+        data = rxbuf + chunk.replace("\n", "").replace("(", "\r(")
+        frames = data.split("\r")
+        # Last item is the incomplete frame still being received
+        rxbuf = frames.pop()
+        return ([frame for frame in frames if len(frame) > 0], rxbuf)
+
+
+    def _readByte(self):
+        """
+        Read and process a single byte from the serial port. Reader used when
+        chunked_read is disabled
+        """
+        # Read single byte (non blocking function)
+        ch = self._serport.read()
+        if len(ch) > 0: 
+            # End of serial packet?
+            if ch == '\r' or ((ch == '(') and (len(self._rxbuf) > 0)):
+                strBuf = self._rxbuf
+                self._rxbuf = ""
+                if ch == '(':
+                    self._rxbuf = ch
+                if len(strBuf) > 0:
+                    self._notifyFrame(strBuf)
+            elif ch != '\n':
+                # Append char at the end of the buffer
+                self._rxbuf += ch
+        else:
+            time.sleep(0.01)
+
+
+    def _notifyFrame(self, strBuf):
+        """
+        Pass serial frame to the reception callback
+        
+        @param strBuf: Serial frame received, without line terminators
+        """
+        # Enable for debug only
+        if self._verbose == True:
+            print "Rved: " + strBuf
+        if self._capture is not None:
+            self._capture.write(SwapCapture.RECEIVED, strBuf)
+        
+        # Notify reception
+        if self.serial_received is not None:
+            try:
+                self.serial_received(strBuf)
+            except SwapException as ex:
+                ex.display()
+
+
     def stop(self):
         """
         Stop serial port
         """
         self._go_on = False
+        self._txsched.stop()
         if self._serport is not None:
             if self._serport.isOpen():
                 self._serport.flushInput()
                 self._serport.flushOutput()
                 self._serport.close()
+        if self._capture is not None:
+            self._capture.close()
                 
 
-    def send(self, buf):
+    def send(self, buf, priority=TxPriority.NORMAL):
         """
         Send string buffer via serial
         
+        @param buf: Packet to be transmitted
+        @param priority: Transmission lane (see TxPriority)
+        """
+        self._txsched.put(buf, priority)
+
+
+    def _write(self, buf):
+        """
+        Write string buffer into the serial port. Called from the
+        transmission thread
+        
         @param buf: Packet to be transmitted
         """
-        #self._send_lock.acquire()
-        self._strtosend.put(buf)
-        #self._send_lock.release()
+        try:
+            self._serport.write(buf)
+        except serial.SerialException as ex:
+            if self._go_on:
+                SwapException("Unable to write on serial port " + self.portname + ": " + str(ex)).display()
+            return
+        # Update time stamp
+        self.last_transmission_time = time.time()
+        if self._capture is not None:
+            self._capture.write(SwapCapture.SENT, buf)
+        # Enable for debug only
+        if self._verbose == True:
+            print "Sent: " + buf
+
+
+    def getTxStats(self):
+        """
+        Return transmission counters: queue depth and queuing times
+        
+        @return dictionary of counters
+        """
+        return self._txsched.getStats()
 
 
     def setRxCallback(self, cb_function):
@@ -141,24 +256,31 @@ class SerialPort(threading.Thread):
         """
         Hardware reset serial modem
         """
-        # Clear DTR/RTS lines
-        self._serport.setDTR(False)
-        self._serport.setRTS(False)
+        try:
+            # Clear DTR/RTS lines
+            self._serport.setDTR(False)
+            self._serport.setRTS(False)
 
-        time.sleep(0.001)
+            time.sleep(0.001)
 
-        # Set DTR/R lines
-        self._serport.setDTR(True)
-        self._serport.setRTS(True)
+            # Set DTR/R lines
+            self._serport.setDTR(True)
+            self._serport.setRTS(True)
+        except IOError:
+            # Port without modem control lines (pseudo-terminal)
+            pass
 
            
-    def __init__(self, portname="/dev/ttyUSB0", speed=38400, verbose=False):
+    def __init__(self, portname="/dev/ttyUSB0", speed=38400, verbose=False, txrate=None, txburst=1, capture=None):
         """
         Class constructor
         
         @param portname: Name/path of the serial port
         @param speed: Serial baudrate in bps
         @param verbose: Print out SWAP traffic (True or False)
+        @param txrate: Sustained transmission rate in frames per second
+        @param txburst: Amount of frames that can be sent back-to-back
+        @param capture: Path to a file recording the serial traffic (see SwapCapture)
         """
         threading.Thread.__init__(self)
         ## Name(path) of the serial port
@@ -169,13 +291,22 @@ class SerialPort(threading.Thread):
         self._serport = None
         ## Callback Rx function
         self.serial_received = None
-        # Strint to be sent
-        self._strtosend = Queue.Queue()
-        #self._send_lock = threading.Lock()
+        # Transmission scheduler
+        if txrate is None:
+            txrate = 1.0 / SerialPort.txdelay
+        self._txsched = TxScheduler(self._write, txrate, txburst)
         # Verbose network traffic
         self._verbose = verbose
         # Time stamp of the last transmission
         self.last_transmission_time = 0
+        # Incomplete frame received so far
+        self._rxbuf = ""
+        # File descriptor of the serial port, if the platform provides one
+        self._fileno = None
+        # Traffic recorder
+        self._capture = None
+        if capture is not None:
+            self._capture = SwapCapture(capture, portname)
         
         try:
             # Open serial port in blocking mode
@@ -186,6 +317,9 @@ class SerialPort(threading.Thread):
                 raise SwapException("Unable to open serial port" + self.portname)
             # Set to >0 in order to avoid blocking at Tx forever
             self._serport.writeTimeout = 1
+            # select() on the port descriptor is only available on POSIX
+            if os.name == "posix":
+                self._fileno = self._serport.fileno()
             # Reset modem
             self.reset()
             
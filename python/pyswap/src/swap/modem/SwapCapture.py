@@ -0,0 +1,146 @@
+#########################################################################
+#
+# SwapCapture
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from swap.SwapException import SwapException
+
+import threading
+import time
+
+
+class SwapCapture(object):
+    """
+    Record of the serial traffic of a gateway. One frame per line:
+
+        <timestamp> <direction> <frame>
+
+    timestamp is given in seconds since the epoch. direction is '<' for
+    frames received from the modem and '>' for frames sent to it. frame is
+    the raw serial line without terminators, including the (RSSILQI) prefix
+    of wireless packets. Lines starting with '#' are comments
+    """
+    ## Frame received from the modem
+    RECEIVED = "<"
+    ## Frame sent to the modem
+    SENT = ">"
+    # Maximum time (in seconds) frames are kept in the file buffer
+    _FLUSH_INTERVAL = 1.0
+
+
+    @staticmethod
+    def read(filename):
+        """
+        Iterate over the frames of a capture file
+        
+        @param filename: Path to the capture file
+        
+        @return iterator of (timestamp, direction, frame) tuples
+        """
+        try:
+            capture = open(filename)
+        except IOError as ex:
+            raise SwapException("Unable to open capture " + filename + ": " + str(ex))
+        return SwapCapture._frames(capture)
+
+
+    @staticmethod
+    def _frames(capture):
+        """
+        Parse capture file
+        
+        @param capture: Capture file object. Closed at the end
+        
+        @return iterator of (timestamp, direction, frame) tuples
+        """
+        try:
+            for line in capture:
+                if line[0] == "#":
+                    continue
+                fields = line.rstrip("\r\n").split(" ", 2)
+                if len(fields) < 3:
+                    continue
+                yield (float(fields[0]), fields[1], fields[2])
+        finally:
+            capture.close()
+
+
+    def write(self, direction, frame):
+        """
+        Append frame to the capture. Thread-safe
+        
+        @param direction: RECEIVED or SENT
+        @param frame: Serial frame
+        """
+        now = time.time()
+        line = "%.6f %s %s\n" % (now, direction, frame.rstrip("\r\n"))
+        self._lock.acquire()
+        try:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self.frames += 1
+            if now - self._flushed > SwapCapture._FLUSH_INTERVAL:
+                self._file.flush()
+                self._flushed = now
+        finally:
+            self._lock.release()
+
+
+    def close(self):
+        """
+        Flush and close capture file
+        """
+        self._lock.acquire()
+        try:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        finally:
+            self._lock.release()
+
+
+    def __init__(self, filename, portname=None):
+        """
+        Class constructor. Frames are appended to the file if it exists
+        
+        @param filename: Path to the capture file
+        @param portname: Name of the serial port captured, written as a comment
+        """
+        ## Path to the capture file
+        self.filename = filename
+        ## Amount of frames written
+        self.frames = 0
+        # Time of the last flush
+        self._flushed = time.time()
+        # Written from the reception and transmission threads
+        self._lock = threading.Lock()
+        try:
+            self._file = open(filename, "a")
+        except IOError as ex:
+            raise SwapException("Unable to open capture " + filename + ": " + str(ex))
+        if portname is not None:
+            self._file.write("# " + portname + " " + time.strftime("%d %b %Y %H:%M:%S") + "\n")
@@ -0,0 +1,337 @@
+#########################################################################
+#
+# SwapReplay
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from SerialModem import SerialModem
+from SwapCapture import SwapCapture
+from swap.SwapException import SwapException
+
+import collections
+import threading
+import time
+
+
+class SwapReplay(threading.Thread):
+    """
+    Feed the wireless packets of a capture file into a reception function,
+    keeping their original timing or scaling it
+    """
+    def run(self):
+        """
+        Replay capture on its own thread
+        """
+        start = None
+        try:
+            for (stamp, direction, frame) in SwapCapture.read(self.filename):
+                if not self._go_on:
+                    break
+                # AT responses only make sense along with their commands
+                if direction != SwapCapture.RECEIVED or frame[0] != '(':
+                    continue
+                if self.speed:
+                    if start is None:
+                        start = (time.time(), stamp)
+                    delay = start[0] + (stamp - start[1]) / self.speed - time.time()
+                    if delay > 0:
+                        self._stopped.wait(delay)
+                    elif -delay > self.max_lag:
+                        self.max_lag = -delay
+                try:
+                    self._receiver(frame)
+                except SwapException as ex:
+                    ex.display()
+                self.frames += 1
+        except SwapException as ex:
+            ex.display()
+        finally:
+            self.done.set()
+
+
+    def stop(self):
+        """
+        Stop replay
+        """
+        self._go_on = False
+        self._stopped.set()
+
+
+    def __init__(self, filename, receiver, speed=1.0):
+        """
+        Class constructor
+
+        @param filename: Path to the capture file (see SwapCapture)
+        @param receiver: Function receiving every wireless frame as a string
+        @param speed: Replay speed relative to the original one. 0 or None
+        for replaying as fast as possible
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        ## Path to the capture file
+        self.filename = filename
+        ## Replay speed. 0 or None for as fast as possible
+        self.speed = speed
+        ## Amount of frames replayed
+        self.frames = 0
+        ## Maximum delay (in seconds) of a frame with respect to its schedule
+        self.max_lag = 0
+        ## Event set once the whole capture has been replayed
+        self.done = threading.Event()
+        # Reception function
+        self._receiver = receiver
+        # Replay running
+        self._go_on = True
+        # Interrupts waits on stop
+        self._stopped = threading.Event()
+
+
+class ReplayModem(SerialModem):
+    """
+    Serial modem replaying a capture file instead of talking to a gateway.
+    Selected with port names like "replay:<capture file>[?speed=<factor>]".
+    Transmissions are discarded
+    """
+    ## Prefix of the port names selecting this modem
+    PREFIX = "replay:"
+    # AT queries and the attributes they set
+    _SETTINGS = {"ATHV?": "hwversion", "ATFV?": "fwversion", "ATCH?": "freq_channel",
+                 "ATSW?": "syncword", "ATDA?": "devaddress"}
+
+
+    def _learnSettings(self, filename):
+        """
+        Take modem settings from the AT queries recorded in the capture
+        
+        @param filename: Path to the capture file
+        """
+        query = None
+        for (stamp, direction, frame) in SwapCapture.read(filename):
+            if direction == SwapCapture.SENT:
+                query = ReplayModem._SETTINGS.get(frame.strip())
+            elif query is not None and frame[0] != '(':
+                try:
+                    setattr(self, query, int(frame, 16))
+                except ValueError:
+                    pass
+                query = None
+
+
+    def setRxCallback(self, cbFunct):
+        """
+        Set callback reception function. Starts the replay
+
+        @param cbFunct: Function receiving every CcPacket
+        """
+        SerialModem.setRxCallback(self, cbFunct)
+        if not self.replay.isAlive() and not self.replay.done.isSet():
+            self.replay.start()
+
+
+    def sendCcPacket(self, packet, priority=None):
+        """
+        Discard wireless packet
+
+        @param packet: CcPacket to be transmitted
+        @param priority: Transmission lane. Ignored
+        """
+        self.sent += 1
+        if self._verbose:
+            print "Sent: " + packet.toString()
+
+
+    def getTxStats(self):
+        """
+        Return transmission counters. Nothing is ever queued
+
+        @return dictionary of counters
+        """
+        return {"depth": 0, "depth_max": 0, "lanes": [0, 0], "sent": self.sent,
+                "wait_max": 0.0, "wait_avg": 0.0, "wait_total": 0.0}
+
+
+    def goToCommandMode(self):
+        """
+        No command mode while replaying
+
+        @return True
+        """
+        return True
+
+
+    def goToDataMode(self):
+        """
+        Always in data mode
+
+        @return True
+        """
+        return True
+
+
+    def reset(self):
+        """
+        Nothing to reset
+        """
+        pass
+
+
+    def runAtCommand(self, cmd="AT\r", timeout=1000):
+        """
+        No AT commands while replaying
+
+        @return "OK"
+        """
+        return "OK"
+
+
+    def configure(self, devaddress=None, syncword=None, freq_channel=None):
+        """
+        Set modem settings reported by the modem
+
+        @param devaddress: New device address
+        @param syncword: New synchronization word
+        @param freq_channel: New frequency channel
+
+        @return True
+        """
+        if devaddress is not None:
+            self.devaddress = devaddress
+        if syncword is not None:
+            self.syncword = syncword
+        if freq_channel is not None:
+            self.freq_channel = freq_channel
+        return True
+
+
+    def setFreqChannel(self, value):
+        """
+        Set frequency channel reported by the modem
+
+        @param value: New frequency channel
+
+        @return True
+        """
+        self.freq_channel = value
+        return True
+
+
+    def setSyncWord(self, value):
+        """
+        Set synchronization word reported by the modem
+
+        @param value: New synchronization word
+
+        @return True
+        """
+        self.syncword = value
+        return True
+
+
+    def setDevAddress(self, value):
+        """
+        Set device address reported by the modem
+
+        @param value: New device address
+
+        @return True
+        """
+        self.devaddress = value
+        return True
+
+
+    def stop(self):
+        """
+        Stop replay
+        """
+        self.replay.stop()
+
+
+    def __init__(self, portname, verbose=False):
+        """
+        Class constructor
+
+        @param portname: "replay:<capture file>[?speed=<factor>]". Speed 0
+        replays as fast as possible
+        @param verbose: Print out SWAP traffic (True or False)
+        """
+        if not portname.startswith(ReplayModem.PREFIX):
+            raise SwapException("Not a replay port: " + portname)
+        filename = portname[len(ReplayModem.PREFIX):]
+        speed = 1.0
+        if "?speed=" in filename:
+            (filename, speed) = filename.split("?speed=", 1)
+            try:
+                speed = float(speed)
+            except ValueError:
+                raise SwapException("Incorrect replay speed in " + portname)
+
+        # Serial mode (command or data modes)
+        self._sermode = SerialModem.Mode.DATA
+        # Guards held frames
+        self._lock = threading.Lock()
+        # No AT commands
+        self._at_future = None
+        # Wireless frames waiting to be passed to the reception callback
+        self._backlog = collections.deque(maxlen=SerialModem.rx_backlog)
+        # True while a thread is passing held frames
+        self._flushing = False
+        # "Packet received" callback function. To be defined by the parent object
+        self._ccpacket_received = None
+        # Print out SWAP traffic
+        self._verbose = verbose
+        # No serial port
+        self._serport = None
+        ## Name(path) of the serial port
+        self.portname = portname
+        ## Speed of the serial port in bps
+        self.portspeed = None
+        ## Hardware version of the serial modem
+        self.hwversion = 0
+        ## Firmware version of the serial modem
+        self.fwversion = 0
+        ## Frequency channel of the serial gateway
+        self.freq_channel = None
+        ## Synchronization word of the serial gateway
+        self.syncword = None
+        ## Device address of the serial gateway
+        self.devaddress = None
+        ## Amount of wireless packets discarded
+        self.sent = 0
+        ## Amount of wireless frames received
+        self.rx_frames = 0
+        ## Amount of wireless frames received with incorrect format
+        self.rx_errors = 0
+        ## Amount of held wireless frames discarded for lack of room
+        self.rx_dropped = 0
+        ## No command-mode sessions while replaying
+        self.command_sessions = 0
+        ## Time spent in command mode in seconds
+        self.command_time = 0.0
+        ## Duration of the last command-mode session in seconds
+        self.command_last = None
+        self._learnSettings(filename)
+
+        ## Replay thread feeding the capture into the modem
+        self.replay = SwapReplay(filename, self._serialPacketReceived, speed)
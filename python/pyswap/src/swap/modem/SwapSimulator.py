@@ -0,0 +1,638 @@
+#########################################################################
+#
+# SwapSimulator
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from SwapCapture import SwapCapture
+from TxScheduler import TxScheduler, TxPriority
+from swap.aio.EventLoop import EventLoop
+from swap.protocol.SwapDefs import SwapFunction, SwapRegId, SwapState
+from swap.protocol.SwapMote import SwapMote
+from swap.protocol.SwapPacket import SwapPacket, SwapStatusPacket
+from swap.protocol.SwapValue import SwapValue
+from swap.protocol.SmartEncrypt import Password
+from swap.SwapException import SwapException
+from swap.xmltools.XmlDevice import XmlDeviceDir, XmlDeviceTemplate
+
+from binascii import unhexlify
+import random
+import time
+import urlparse
+
+
+class SimMote(object):
+    """
+    Virtual mote built from a device definition file
+    """
+    def listening(self, now):
+        """
+        Check whether the mote can receive packets
+
+        @param now: Current time in seconds
+
+        @return True if the mote is awake
+        """
+        return not self.pwrdownmode or now < self.awake_until
+
+
+    def get_value(self, regid):
+        """
+        Return register value
+
+        @param regid: Register ID
+
+        @return list of bytes or None if the register does not exist
+        """
+        if regid == SwapRegId.ID_SECU_NONCE:
+            return [self.nonce]
+        if regid == SwapRegId.ID_DEVICE_ADDR:
+            return [self.address]
+        return self.registers.get(regid)
+
+
+    def set_value(self, regid, value):
+        """
+        Set register value from a command
+
+        @param regid: Register ID
+        @param value: New value as a list of bytes
+
+        @return True if the register exists and has the same length
+        """
+        current = self.get_value(regid)
+        if current is None or len(current) != len(value):
+            return False
+        self.registers[regid] = value
+        toint = SwapValue(value).toInteger()
+        if regid == SwapRegId.ID_TX_INTERVAL:
+            self.txinterval = toint
+        elif regid == SwapRegId.ID_FREQ_CHANNEL:
+            self.freq_channel = toint
+        elif regid == SwapRegId.ID_NETWORK_ID:
+            self.syncword = toint
+        elif regid == SwapRegId.ID_SECU_OPTION:
+            self.security = toint
+        return True
+
+
+    def next_nonce(self):
+        """
+        Increment security nonce before transmitting
+
+        @return nonce to be transmitted
+        """
+        self.nonce = (self.nonce + 1) & 0xFF
+        return self.nonce
+
+
+    def sample(self):
+        """
+        Give sensor readings a small random walk
+
+        @return list of ID's of the registers having input endpoints
+        """
+        for regid in self.inputs:
+            value = self.registers[regid]
+            length = len(value)
+            toint = SwapValue(value).toInteger() + self._random.randint(-2, 2)
+            toint = min(max(toint, 0), (1 << (8 * length)) - 1)
+            self.registers[regid] = SwapValue.fromInteger(toint, length).toList()
+        return self.inputs
+
+
+    def __init__(self, simulator, product_code, address, rnd):
+        """
+        Class constructor
+
+        @param simulator: SwapSimulator object hosting the mote
+        @param product_code: Product code in hex format
+        @param address: Mote address
+        @param rnd: random.Random object
+        """
+        # Register model taken from the device definition
+        mote = SwapMote(simulator, product_code, address)
+        # Random generator shared with the simulator
+        self._random = rnd
+        ## Mote address
+        self.address = address
+        ## Sleeps between transmissions
+        self.pwrdownmode = mote.pwrdownmode
+        ## Interval (in sec) between periodic transmissions. 0 for disabled
+        self.txinterval = mote.txinterval
+        ## Frequency channel. None for following the gateway
+        self.freq_channel = None
+        ## Network ID. None for following the gateway
+        self.syncword = None
+        ## Security option
+        self.security = 0
+        ## Security nonce
+        self.nonce = 0
+        ## Time until which a sleeping mote listens
+        self.awake_until = 0
+        ## Time at which the last frame transmitted by the mote reaches the gateway
+        self.air_time = 0
+        ## Fixed (RSSI, LQI) pair seen by the gateway
+        self.link = (rnd.randint(0x20, 0x60), rnd.randint(0x20, 0x3F))
+        ## Register values (lists of bytes) indexed by register ID
+        self.registers = {}
+        self.registers[SwapRegId.ID_PRODUCT_CODE] = SwapValue.fromBytes(unhexlify(product_code)).toList()
+        self.registers[SwapRegId.ID_HW_VERSION] = [0, 0, 1, 0]
+        self.registers[SwapRegId.ID_FW_VERSION] = [0, 0, 1, 0]
+        self.registers[SwapRegId.ID_SYSTEM_STATE] = [SwapState.RXON]
+        self.registers[SwapRegId.ID_FREQ_CHANNEL] = [0]
+        self.registers[SwapRegId.ID_SECU_OPTION] = [0]
+        self.registers[SwapRegId.ID_NETWORK_ID] = [0xB5, 0x47]
+        self.registers[SwapRegId.ID_TX_INTERVAL] = SwapValue.fromInteger(self.txinterval, 2).toList()
+        if self.pwrdownmode:
+            self.registers[SwapRegId.ID_SYSTEM_STATE] = [SwapState.RXOFF]
+        ## ID's of the registers having input endpoints
+        self.inputs = []
+        for reg in (mote.regular_registers or []) + (mote.config_registers or []):
+            self.registers[reg.id] = reg.value.toList()
+        for reg in mote.regular_registers or []:
+            if len([endp for endp in reg.parameters if endp.direction == "inp"]) > 0:
+                self.inputs.append(reg.id)
+
+
+class SwapSimulator(object):
+    """
+    Stand-in for SerialPort emulating a serial modem and a network of
+    virtual motes. Speaks the line protocol of the real modem: AT commands,
+    "Modem ready!" and (RSSILQI)HEX frames. Selected with port names like
+
+        sim://<motes>?interval=<sec>&drop=<prob>&delay=<sec>&listen=<sec>&security=<option>&password=<hex>&pcode=<code>&seed=<int>
+
+    Every parameter is optional:
+    - interval: transmission interval of every mote, overriding the one
+      from the device definition
+    - drop: probability of losing a wireless frame
+    - delay: maximum random delay added to every wireless frame
+    - listen: time sleeping motes listen after each transmission
+    - security: security option of the motes (see XmlNetwork)
+    - password: Smart Encryption password
+    - pcode: product code of every mote. Motes cycle over every device
+      definition available otherwise
+    - seed: seed of the random generator, for repeatable runs
+    """
+    ## Prefix of the port names selecting the simulator
+    PREFIX = "sim://"
+    # Delay (in seconds) of the modem answers
+    _AT_DELAY = 0.001
+    # Delay (in seconds) between start or reset and "Modem ready!"
+    _READY_DELAY = 0.05
+    # Air time (in seconds) of a wireless frame
+    _FRAME_TIME = 0.002
+    # Time (in seconds) over which motes announce themselves on start-up
+    _STARTUP_TIME = 1.0
+
+
+    def start(self):
+        """
+        Start simulation
+        """
+        self._loop.start()
+        self._txsched.start()
+        self._loop.call_later(SwapSimulator._READY_DELAY, self._emit, "Modem ready!")
+
+
+    def _powerUp(self):
+        """
+        Start periodic transmissions. Motes are powered once the gateway
+        first enters data mode
+        """
+        if self._powered:
+            return
+        self._powered = True
+        for mote in self.motes.values():
+            # Motes announce themselves on start-up
+            self._loop.call_later(self._random.uniform(0, SwapSimulator._STARTUP_TIME),
+                                  self._status, mote, SwapRegId.ID_PRODUCT_CODE)
+            # Spread first transmissions over a whole interval
+            interval = self._interval(mote)
+            if interval > 0:
+                self._loop.call_later(self._random.uniform(0, interval), self._periodic, mote)
+
+
+    def stop(self):
+        """
+        Stop simulation
+        """
+        self._go_on = False
+        self._txsched.stop()
+        self._loop.stop()
+        if self._capture is not None:
+            self._capture.close()
+
+
+    def send(self, buf, priority=TxPriority.NORMAL):
+        """
+        Send string buffer to the simulated modem
+
+        @param buf: Serial frame
+        @param priority: Transmission lane (see TxPriority)
+        """
+        self._txsched.put(buf, priority)
+
+
+    def _write(self, buf):
+        """
+        Frame delivered to the modem. Called from the transmission thread
+
+        @param buf: Serial frame
+        """
+        if self._capture is not None:
+            self._capture.write(SwapCapture.SENT, buf)
+        if self._verbose:
+            print "Sent: " + buf
+        self.last_transmission_time = time.time()
+        self._loop.call_soon(self._serialReceived, buf)
+
+
+    def _emit(self, line):
+        """
+        Print line from the modem
+
+        @param line: Serial line without terminator
+        """
+        if not self._go_on:
+            return
+        if self._capture is not None:
+            self._capture.write(SwapCapture.RECEIVED, line)
+        if self._verbose:
+            print "Rved: " + line
+        if self.serial_received is not None:
+            try:
+                self.serial_received(line)
+            except SwapException as ex:
+                ex.display()
+
+
+    def _serialReceived(self, buf):
+        """
+        Serve frame sent to the modem
+
+        @param buf: Serial frame
+        """
+        cmd = buf.strip()
+        if cmd == "+++":
+            self._command_mode = True
+            self._atAnswer("OK")
+        elif self._command_mode:
+            self._atCommand(cmd)
+        elif len(cmd) > 0:
+            self._transmit(cmd)
+
+
+    def _atAnswer(self, answer):
+        """
+        Answer AT command
+
+        @param answer: Answer line
+        """
+        self._loop.call_later(SwapSimulator._AT_DELAY, self._emit, answer)
+
+
+    def _atCommand(self, cmd):
+        """
+        Run AT command
+
+        @param cmd: AT command without terminator
+        """
+        queries = {"ATHV?": "%04X" % self.hwversion, "ATFV?": "%08X" % self.fwversion,
+                   "ATCH?": "%02X" % self.freq_channel, "ATSW?": "%04X" % self.syncword,
+                   "ATDA?": "%02X" % self.devaddress}
+        if cmd in queries:
+            self._atAnswer(queries[cmd])
+        elif cmd == "AT":
+            self._atAnswer("OK")
+        elif cmd == "ATO":
+            self._command_mode = False
+            self._atAnswer("OK")
+            if not self._powered:
+                self._loop.call_later(SwapSimulator._READY_DELAY, self._powerUp)
+        elif cmd == "ATZ":
+            self._command_mode = False
+            self._atAnswer("OK")
+            self._loop.call_later(SwapSimulator._READY_DELAY, self._emit, "Modem ready!")
+        elif cmd[:5] in ("ATCH=", "ATSW=", "ATDA="):
+            try:
+                value = int(cmd[5:], 16)
+            except ValueError:
+                self._atAnswer("ERROR")
+                return
+            setattr(self, {"ATCH=": "freq_channel", "ATSW=": "syncword", "ATDA=": "devaddress"}[cmd[:5]], value)
+            self._atAnswer("OK")
+        else:
+            self._atAnswer("ERROR")
+
+
+    def _onAir(self, mote):
+        """
+        Check whether a mote shares channel and network ID with the gateway
+
+        @param mote: SimMote object
+
+        @return True if the gateway and the mote can hear each other
+        """
+        return (mote.freq_channel in (None, self.freq_channel) and
+                mote.syncword in (None, self.syncword))
+
+
+    def _lost(self):
+        """
+        Decide whether a wireless frame gets lost
+
+        @return True if the frame has to be dropped
+        """
+        if self.drop > 0 and self._random.random() < self.drop:
+            self.dropped += 1
+            return True
+        return False
+
+
+    def _airDelay(self):
+        """
+        Return random delay of a wireless frame in seconds
+        """
+        if self.delay > 0:
+            return self._random.uniform(0, self.delay)
+        return 0
+
+
+    def _transmit(self, frame):
+        """
+        Wireless packet sent by the gateway
+
+        @param frame: Packet in hex format
+        """
+        try:
+            packet = SwapPacket()
+            packet.data = bytearray(unhexlify(frame))
+        except TypeError:
+            return
+        if len(packet.data) < 7:
+            return
+        if packet.security & 0x02 and self.password is not None:
+            packet.smart_encryption(self.password, decrypt=True)
+        now = time.time()
+        if packet.destAddress == 0:
+            motes = self.motes.values()
+        else:
+            motes = [self.motes.get(packet.destAddress)]
+        for mote in motes:
+            if mote is None or not self._onAir(mote) or not mote.listening(now) or self._lost():
+                continue
+            self._loop.call_later(self._airDelay(), self._moteReceived, mote, packet)
+
+
+    def _moteReceived(self, mote, packet):
+        """
+        Wireless packet received by a mote
+
+        @param mote: SimMote object
+        @param packet: SwapPacket received
+        """
+        if packet.function == SwapFunction.QUERY:
+            if packet.regAddress in (0, mote.address):
+                self._status(mote, packet.regId)
+        elif packet.function == SwapFunction.COMMAND:
+            if packet.regAddress != mote.address:
+                return
+            # Anti-playback protection
+            if mote.security & 0x01 and packet.nonce != mote.nonce:
+                return
+            value = packet.value
+            if value is None or not mote.set_value(packet.regId, value.toList()):
+                return
+            self._status(mote, packet.regId)
+            if packet.regId == SwapRegId.ID_DEVICE_ADDR:
+                self._moveMote(mote, value.toInteger())
+
+
+    def _moveMote(self, mote, address):
+        """
+        Change address of a mote
+
+        @param mote: SimMote object
+        @param address: New address
+        """
+        if address in self.motes or address == 0:
+            return
+        del self.motes[mote.address]
+        mote.address = address
+        self.motes[address] = mote
+
+
+    def _status(self, mote, regid):
+        """
+        Transmit status packet from a mote
+
+        @param mote: SimMote object
+        @param regid: Register ID
+        """
+        value = mote.get_value(regid)
+        if value is None:
+            return
+        packet = SwapStatusPacket(mote.address, regid, SwapValue(value))
+        packet.security = mote.security
+        packet.nonce = mote.next_nonce()
+        if mote.security & 0x02 and self.password is not None:
+            packet.smart_encryption(self.password)
+        self.statuses += 1
+        if mote.pwrdownmode:
+            mote.awake_until = time.time() + self.listen
+        if not self._onAir(mote) or self._lost():
+            return
+        line = "(%02X%02X)" % mote.link + packet.toString()
+        # Frames from the same mote are delayed but never reordered
+        now = time.time()
+        mote.air_time = max(now + self._airDelay(), mote.air_time + SwapSimulator._FRAME_TIME)
+        self._loop.call_later(mote.air_time - now, self._emit, line)
+
+
+    def _interval(self, mote):
+        """
+        Return transmission interval of a mote
+
+        @param mote: SimMote object
+        """
+        if self.interval is not None:
+            return self.interval
+        return mote.txinterval
+
+
+    def _periodic(self, mote):
+        """
+        Periodic transmission of a mote
+
+        @param mote: SimMote object
+        """
+        if not self._go_on:
+            return
+        for regid in mote.sample():
+            self._status(mote, regid)
+        interval = self._interval(mote)
+        if interval > 0:
+            # Keep motes from getting synchronized
+            self._loop.call_later(interval * self._random.uniform(0.9, 1.1), self._periodic, mote)
+
+
+    def _products(self):
+        """
+        Return product codes having a definition file
+
+        @return list of product codes in hex format
+        """
+        pcodes = []
+        device_dir = XmlDeviceDir.get()
+        for developer in device_dir.developers:
+            for device in developer.devices:
+                try:
+                    XmlDeviceTemplate.get(developer.id, device.id)
+                except (SwapException, IOError):
+                    continue
+                pcodes.append("%08X%08X" % (developer.id, device.id))
+        return pcodes
+
+
+    def getTxStats(self):
+        """
+        Return transmission counters: queue depth and queuing times
+
+        @return dictionary of counters
+        """
+        return self._txsched.getStats()
+
+
+    def setRxCallback(self, cb_function):
+        """
+        Set callback reception function
+
+        @param cb_function: Function receiving every serial line
+        """
+        self.serial_received = cb_function
+
+
+    def reset(self):
+        """
+        Hardware reset simulated modem
+        """
+        self._command_mode = False
+        self._loop.call_later(SwapSimulator._READY_DELAY, self._emit, "Modem ready!")
+
+
+    def __init__(self, portname, verbose=False, txrate=None, txburst=1, capture=None):
+        """
+        Class constructor
+
+        @param portname: "sim://<motes>[?<parameters>]"
+        @param verbose: Print out serial traffic (True or False)
+        @param txrate: Sustained transmission rate in frames per second
+        @param txburst: Amount of frames that can be sent back-to-back
+        @param capture: Path to a file recording the serial traffic (see SwapCapture)
+        """
+        if not portname.startswith(SwapSimulator.PREFIX):
+            raise SwapException("Not a simulator port: " + portname)
+        (nbmotes, sep, query) = portname[len(SwapSimulator.PREFIX):].partition("?")
+        params = dict(urlparse.parse_qsl(query))
+        try:
+            nbmotes = int(nbmotes or 1)
+            ## Transmission interval of every mote. None for taking it from the definitions
+            self.interval = None
+            if "interval" in params:
+                self.interval = float(params["interval"])
+            ## Probability of losing a wireless frame
+            self.drop = float(params.get("drop", 0))
+            ## Maximum random delay of a wireless frame in seconds
+            self.delay = float(params.get("delay", 0))
+            ## Time sleeping motes listen after each transmission
+            self.listen = float(params.get("listen", 0.2))
+            security = int(params.get("security", 0))
+            seed = params.get("seed")
+            if seed is not None:
+                seed = int(seed)
+        except ValueError:
+            raise SwapException("Incorrect simulator settings: " + portname)
+
+        ## Name of the simulated port
+        self.portname = portname
+        ## Callback Rx function
+        self.serial_received = None
+        ## Time stamp of the last transmission
+        self.last_transmission_time = 0
+        ## Hardware version of the simulated modem
+        self.hwversion = 0x0200
+        ## Firmware version of the simulated modem
+        self.fwversion = 0x01000000
+        ## Frequency channel of the simulated modem
+        self.freq_channel = 0
+        ## Network ID of the simulated modem
+        self.syncword = 0xB547
+        ## Device address of the simulated modem
+        self.devaddress = 1
+        ## Smart Encryption password
+        self.password = None
+        if "password" in params:
+            self.password = Password(params["password"])
+        ## Amount of status packets transmitted by the motes
+        self.statuses = 0
+        ## Amount of wireless frames lost on purpose
+        self.dropped = 0
+        # Print out serial traffic
+        self._verbose = verbose
+        # Modem in command mode
+        self._command_mode = False
+        # Simulation running
+        self._go_on = True
+        # Motes transmitting
+        self._powered = False
+        # Random generator. Seeded for repeatable runs
+        self._random = random.Random(seed)
+        # Runs the modem and the motes
+        self._loop = EventLoop()
+        # Paces frames sent to the modem like a real serial port
+        if txrate is None:
+            txrate = 1.0 / 0.05
+        self._txsched = TxScheduler(self._write, txrate, txburst)
+        # Traffic recorder
+        self._capture = None
+        if capture is not None:
+            self._capture = SwapCapture(capture, portname)
+
+        pcodes = [params["pcode"]] if "pcode" in params else self._products()
+        if len(pcodes) == 0:
+            raise SwapException("No device definitions available for the simulated motes")
+        # Addresses available besides the broadcast and gateway ones
+        addresses = [addr for addr in range(1, 256) if addr != self.devaddress]
+        if nbmotes > len(addresses):
+            raise SwapException("The simulator hosts up to " + str(len(addresses)) + " motes")
+        ## Virtual motes indexed by address
+        self.motes = {}
+        for i in range(nbmotes):
+            mote = SimMote(self, pcodes[i % len(pcodes)], addresses[i], self._random)
+            mote.security = security
+            mote.registers[SwapRegId.ID_SECU_OPTION] = [security]
+            self.motes[mote.address] = mote
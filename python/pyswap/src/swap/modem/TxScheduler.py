@@ -0,0 +1,173 @@
+#########################################################################
+#
+# TxScheduler
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+import threading
+import collections
+import time
+
+
+class TxPriority:
+    """
+    Transmission lanes. Lower values are served first
+    """
+    ## ACK's, commands and AT commands
+    HIGH = 0
+    ## Queries and any other traffic
+    NORMAL = 1
+
+
+class TxScheduler(threading.Thread):
+    """
+    Transmission thread pacing serial frames with a token bucket
+    """
+    def run(self):
+        """
+        Transmit queued frames as tokens become available
+        """
+        while True:
+            self._cond.acquire()
+            try:
+                while self._go_on and self._depth == 0:
+                    self._cond.wait()
+                if not self._go_on:
+                    break
+                # Refill bucket
+                now = time.time()
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens < 1:
+                    delay = (1 - self._tokens) / self.rate
+                else:
+                    delay = 0
+                    self._tokens -= 1
+                    # Take frame from the most urgent lane
+                    for lane in self._lanes:
+                        if len(lane) > 0:
+                            (queued, buf) = lane.popleft()
+                            break
+                    self._depth -= 1
+            finally:
+                self._cond.release()
+
+            # Wait for the next token outside the lock so that more urgent
+            # frames can still be queued meanwhile
+            if delay > 0:
+                time.sleep(delay)
+                continue
+
+            self._write(buf)
+
+            wait = time.time() - queued
+            self.sent += 1
+            self.wait_total += wait
+            if wait > self.wait_max:
+                self.wait_max = wait
+
+
+    def stop(self):
+        """
+        Stop transmission thread. Frames still queued are discarded
+        """
+        self._cond.acquire()
+        self._go_on = False
+        self._cond.notify()
+        self._cond.release()
+
+
+    def put(self, buf, priority=TxPriority.NORMAL):
+        """
+        Queue frame for transmission
+
+        @param buf: Frame to be transmitted
+        @param priority: Transmission lane (see TxPriority)
+        """
+        self._cond.acquire()
+        self._lanes[priority].append((time.time(), buf))
+        self._depth += 1
+        if self._depth > self.depth_max:
+            self.depth_max = self._depth
+        self._cond.notify()
+        self._cond.release()
+
+
+    def getStats(self):
+        """
+        Return transmission counters
+
+        @return dictionary of counters. Times are given in seconds
+        """
+        stats = {}
+        stats["depth"] = self._depth
+        stats["depth_max"] = self.depth_max
+        stats["lanes"] = [len(lane) for lane in self._lanes]
+        stats["sent"] = self.sent
+        stats["wait_max"] = self.wait_max
+        stats["wait_total"] = self.wait_total
+        stats["wait_avg"] = 0
+        if self.sent > 0:
+            stats["wait_avg"] = self.wait_total / self.sent
+        return stats
+
+
+    def __init__(self, write, rate=20.0, burst=1):
+        """
+        Class constructor
+
+        @param write: Function transmitting a single frame
+        @param rate: Sustained transmission rate in frames per second
+        @param burst: Amount of frames that can be sent back-to-back
+        after an idle period
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        # Transmission function
+        self._write = write
+        ## Sustained rate in frames per second
+        self.rate = float(rate)
+        ## Bucket size in frames
+        self.burst = burst
+        # Available tokens
+        self._tokens = float(burst)
+        # Time stamp of the last refill
+        self._stamp = time.time()
+        # One queue of (time stamp, frame) tuples per priority
+        self._lanes = [collections.deque(), collections.deque()]
+        # Amount of frames queued
+        self._depth = 0
+        # Guards lanes and tokens
+        self._cond = threading.Condition()
+        # Run flag
+        self._go_on = True
+        ## Maximum queue depth seen
+        self.depth_max = 0
+        ## Amount of frames transmitted
+        self.sent = 0
+        ## Accumulated queuing time in seconds
+        self.wait_total = 0.0
+        ## Maximum queuing time in seconds
+        self.wait_max = 0.0
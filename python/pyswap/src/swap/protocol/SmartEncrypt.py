@@ -24,11 +24,38 @@ __author__="Daniel Berenguer"
 __date__ ="$Jun 6, 2012$"
 #########################################################################
 
+from binascii import hexlify
+
+
 class Password(object):
     """
     Encryption password
     """
-    
+    def get_mask(self, nonce, length):
+        """
+        Return Smart Encryption keystream for a SWAP frame. Encrypting or
+        decrypting the frame is a single XOR with this mask. Keystreams are
+        built once per nonce and frame length
+        
+        @param nonce: Security nonce in clear
+        @param length: Frame length in bytes, SWAP header included
+        
+        @return keystream as an integer covering the whole frame
+        """
+        key = (nonce, length)
+        mask = self._masks.get(key)
+        if mask is None:
+            pwd = self.data
+            # Destination address and hop/security are never encrypted
+            stream = [0, pwd[10] ^ nonce, 0, pwd[9], pwd[11] ^ nonce, pwd[8] ^ nonce, pwd[7] ^ nonce]
+            # Register value
+            stream.extend(pwd[i % 11] ^ nonce for i in range(length - 7))
+            mask = int(hexlify(bytearray(stream[:length])), 16)
+            self._masks[key] = mask
+        return mask
+
+
+
     def to_string(self):
         """
         Convert password (list of bytes) to string
@@ -53,6 +80,8 @@ class Password(object):
         """
         ## Password bytes
         self.data = []
+        # Keystreams indexed by (nonce, frame length)
+        self._masks = {}
 
         if type(password) is list:
             self.data[:] = password[:]
@@ -0,0 +1,93 @@
+#########################################################################
+#
+# SwapBitField
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+
+from swap.SwapException import SwapException
+
+
+class SwapBitField(object):
+    """
+    Position of a parameter within its register, compiled into the shift
+    and mask needed to copy it in and out of the register value handled as
+    a single integer. Bits are numbered from the most significant bit of
+    the first register byte
+    """
+    def extract(self, regval, reglen, paramval):
+        """
+        Copy field from register value into parameter value
+        
+        @param regval: Register value (integer)
+        @param reglen: Register length in bytes
+        @param paramval: Current parameter value (integer). Bits out of the
+        field are kept
+        
+        @return New parameter value (integer)
+        """
+        shift = reglen * 8 - self.end
+        if shift >= 0:
+            return (paramval & ~self.mask) | ((regval >> shift) & self.mask)
+
+        # Register shorter than expected. Copy available bits only
+        available = self.nbits + shift
+        if available <= 0:
+            return paramval
+        mask = ((1 << available) - 1) << -shift
+        return (paramval & ~mask) | ((regval << -shift) & mask)
+
+
+    def insert(self, regval, reglen, paramval):
+        """
+        Copy parameter value into the field of a register value
+        
+        @param regval: Register value (integer)
+        @param reglen: Register length in bytes
+        @param paramval: Parameter value (integer)
+        
+        @return New register value (integer)
+        """
+        shift = reglen * 8 - self.end
+        if shift < 0:
+            raise SwapException("Parameter does not fit in a " + str(reglen) + "-byte register")
+        return (regval & ~(self.mask << shift)) | ((paramval & self.mask) << shift)
+
+
+    def __init__(self, bytePos=0, bitPos=0, byteSize=1, bitSize=0):
+        """
+        Class constructor
+        
+        @param bytePos: Position (in bytes) of the field within the register
+        @param bitPos: Position (in bits) after bytePos
+        @param byteSize: Size (in bytes) of the field
+        @param bitSize: Size in bits of the field after byteSize
+        """
+        ## First bit of the field
+        self.start = bytePos * 8 + bitPos
+        ## Length of the field in bits
+        self.nbits = byteSize * 8 + bitSize
+        ## Bit following the last one of the field
+        self.end = self.start + self.nbits
+        ## Mask covering the field once right-aligned
+        self.mask = (1 << self.nbits) - 1
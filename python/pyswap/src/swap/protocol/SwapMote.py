@@ -32,9 +32,12 @@ __date__  ="$Aug 20, 2011 10:36:00 AM$"
 from SwapPacket import SwapStatusPacket, SwapCommandPacket, SwapQueryPacket
 from SwapDefs import SwapRegId, SwapState
 from SwapValue import SwapValue
+from SwapPublishPolicy import SwapPublishPolicy
 from swap.SwapException import SwapException
 from swap.xmltools.XmlDevice import XmlDevice
 
+from binascii import unhexlify
+import threading
 import time
 
 
@@ -42,6 +45,9 @@ class SwapMote(object):
     """
     SWAP mote class
     """
+    # Serializes the creation of registers for lazy motes
+    _load_lock = threading.RLock()
+
     def cmdRegister(self, regId, value):
         """
         Send command to register and return expected response
@@ -187,24 +193,151 @@ class SwapMote(object):
         self.timestamp = time.time()
     
     
-    def getRegister(self, regId):
+    @property
+    def regular_registers(self):
+        """
+        List of regular registers provided by this mote. Built on first access
+        """
+        if not self.loaded:
+            self.materialize()
+        return self._regular_registers
+
+
+    @property
+    def config_registers(self):
+        """
+        List of config registers provided by this mote. Built on first access
+        """
+        if not self.loaded:
+            self.materialize()
+        return self._config_registers
+
+
+    def materialize(self):
+        """
+        Build registers and endpoints of a lazy mote and apply the settings
+        stored for them. Nothing is done if they are already built
+        
+        @return this mote
+        """
+        if not self.loaded:
+            SwapMote._load_lock.acquire()
+            try:
+                if not self.loaded:
+                    self._buildRegisters()
+            finally:
+                SwapMote._load_lock.release()
+        return self
+
+
+    def _buildRegisters(self):
+        """
+        Create registers from the device definition
+        """
+        if self.definition is not None:
+            self._regular_registers = self.definition.getRegList()
+            self._config_registers = self.definition.getRegList(config=True)
+        # Registers and parameters indexed by ID and name
+        self._indexRegisters()
+        if self._stored is not None:
+            (endpoints, registers, data) = self._stored
+            self._stored = None
+            self._applyStored(endpoints, registers)
+        self.loaded = True
+
+
+    def restore(self, endpoints, registers=None, data=None):
+        """
+        Restore settings stored in the network file. Lazy motes keep them
+        until their registers are built
+        
+        @param endpoints: Endpoint config indexed by endpoint id
+        @param registers: Register values in hex format indexed by register id
+        @param data: Serialized mote, as returned by dumps, if available
+        """
+        if self.loaded:
+            self._applyStored(endpoints, registers)
+        else:
+            self._stored = (endpoints, registers, data)
+
+
+    def get_stored_endpoints(self):
+        """
+        Return config of the endpoints stored for a lazy mote
+        
+        @return list of endpoint dictionaries. Empty once the mote is loaded
+        """
+        if self._stored is None:
+            return []
+        return self._stored[0].values()
+
+
+    def _applyStored(self, endpoints, registers=None):
+        """
+        Apply stored settings to the registers and endpoints of this mote
+        
+        @param endpoints: Endpoint config indexed by endpoint id
+        @param registers: Register values in hex format indexed by register id
+        """
+        if self._regular_registers is None:
+            return
+        for register in self._regular_registers:
+            # Restore raw register value if available
+            restored = False
+            if registers is not None and register.id in registers:
+                value = SwapValue.fromBytes(unhexlify(registers[register.id]))
+                if value.getLength() == register.value.getLength():
+                    register.setValue(value)
+                    restored = True
+
+            for endpoint in register.parameters:
+                # Find endpoint config
+                endpoint_data = endpoints.get(endpoint.id)
+                if endpoint_data is None:
+                    continue
+                endpoint.name = endpoint_data["name"]
+                endpoint.location = endpoint_data["location"]
+                if "unit" in endpoint_data and endpoint.unit is not None:
+                    endpoint.setUnit(endpoint_data["unit"])
+                if "publish" in endpoint_data:
+                    try:
+                        endpoint.policy = SwapPublishPolicy.fromDict(endpoint_data["publish"])
+                    except SwapException as ex:
+                        ex.display()
+                if "value" in endpoint_data and not restored:
+                    endpoint.setValue(endpoint_data["value"])
+
+                endpoint.direction = endpoint_data["direction"]
+                endpoint.type = endpoint_data["type"]
+
+                endpoint.display = True
+                if "display" in endpoint_data:
+                    if endpoint_data["display"].lower() in ["false", "no", 0, "0", "disabled"]:
+                        endpoint.display = False
+        # Endpoints may have been renamed
+        self._indexRegisters()
+
+
+    def getRegister(self, regId, config=None):
         """
         Get register given its ID
         
         @param regId: Register ID
+        @param config: True for configuration registers only, False for
+        regular registers only. None searches both lists
         
         @return SwapRegister object
         """
+        if not self.loaded:
+            self.materialize()
+        reg = None
         # Regular registers
-        for reg in self.regular_registers:
-            if reg.id == regId:
-                return reg            
+        if config is not True:
+            reg = self._regular_by_id.get(regId)
         # Configuration registers
-        for reg in self.config_registers:
-            if reg.id == regId:
-                return reg
-
-        return None
+        if reg is None and config is not False:
+            reg = self._config_by_id.get(regId)
+        return reg
 
 
     def getParameter(self, name):
@@ -215,20 +348,33 @@ class SwapMote(object):
         
         @return: SwapParam object
         """
-        # Regular registers
-        for reg in self.regular_registers:
-            for param in reg.parameters:
-                if param.name == name:
-                    return param
-        # Configuration registers
-        for reg in self.config_registers:
-            for param in reg.parameters:
-                if param.name == name:
-                    return param
-                
-        return None
+        if not self.loaded:
+            self.materialize()
+        param = self._params_by_name.get(name)
+        if param is None or param.name != name:
+            # Parameters can be renamed at any time. Refresh index
+            self._indexRegisters()
+            param = self._params_by_name.get(name)
+        return param
     
     
+    def _indexRegisters(self):
+        """
+        Index registers by ID and parameters by name
+        """
+        self._regular_by_id = {}
+        self._config_by_id = {}
+        self._params_by_name = {}
+        for (reglist, index) in ((self._regular_registers, self._regular_by_id),
+                                 (self._config_registers, self._config_by_id)):
+            if reglist is None:
+                continue
+            for reg in reglist:
+                index.setdefault(reg.id, reg)
+                for param in reg.parameters:
+                    self._params_by_name.setdefault(param.name, param)
+
+
     def dumps(self, include_units=False):
         """
         Serialize mote data to a JSON formatted string
@@ -236,6 +382,12 @@ class SwapMote(object):
         @param include_units: if True, include list of units for each endpoint
         within the serialized output
         """
+        # Lazy motes loaded from swapnet.json did not change since then
+        if not self.loaded and include_units:
+            stored = self._stored
+            if stored is not None and stored[2] is not None:
+                return stored[2]
+
         data = {}
         data["pcode"] = self.product_code
         data["manufacturer"] = self.definition.manufacturer 
@@ -244,7 +396,8 @@ class SwapMote(object):
         
         regs = []
         try:
-            for reg in self.regular_registers:
+            # Some devices provide config registers only
+            for reg in self.regular_registers or []:
                 regs.append(reg.dumps(include_units))
         except SwapException:
             raise
@@ -254,13 +407,14 @@ class SwapMote(object):
         return data
     
         
-    def __init__(self, server=None, product_code=None, address=0xFF, security=0, nonce=0):
+    def __init__(self, server=None, product_code=None, address=0xFF, security=0, nonce=0, lazy=False):
         """
         Class constructor
         
         @param server: SWAP server object
         @param product_code: Product Code
         @param address: Mote address
+        @param lazy: If True, registers are not built until they are needed
         """
         if server is None:
             raise SwapException("SwapMote constructor needs a valid SwapServer object")
@@ -303,15 +457,16 @@ class SwapMote(object):
         self.nonce = nonce
         ## State of the mote
         self.state = SwapState.RXOFF
-        ## List of regular registers provided by this mote
-        self.regular_registers = None
-        ## List of config registers provided by this mote
-        self.config_registers = None
-        if self.definition is not None:
-            # List of regular registers
-            self.regular_registers = self.definition.getRegList()
-            # List of config registers
-            self.config_registers = self.definition.getRegList(config=True)
+        # List of regular registers provided by this mote
+        self._regular_registers = None
+        # List of config registers provided by this mote
+        self._config_registers = None
+        # Stored (endpoints, registers, data) tuple waiting for the registers to be built
+        self._stored = None
+        ## True once the register model of this mote is built
+        self.loaded = False
+        if not lazy:
+            self._buildRegisters()
         ## Time stamp of the last update received from mote
         self.timestamp = time.time()
         ## Powerdown mode
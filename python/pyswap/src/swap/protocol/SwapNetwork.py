@@ -27,15 +27,28 @@ __date__ ="$Jan 17, 2012 22:56:00 PM$"
 #########################################################################
 
 from SwapMote import SwapMote
+from SwapNetworkDb import SwapNetworkDb
 from swap.SwapException import SwapException
 
 import json
+import os
+import threading
+import time
 
 
 class SwapNetwork:
     """
     Container of SWAP network data
     """
+    ## Seconds without further changes before a requested save takes place
+    save_delay = 2.0
+    ## Maximum seconds a change can remain unsaved. Bounds the data lost on crash
+    save_maxdelay = 10.0
+    ## File extensions stored in SQLite databases instead of JSON files
+    db_extensions = (".db", ".sqlite", ".sqlite3")
+    ## Build the registers of stored motes on first use instead of on startup
+    lazy_load = True
+
     def read(self):
         """
         Read initial network data from file
@@ -44,38 +57,27 @@ class SwapNetwork:
         self.clear()
         
         try:
+            if self._store is not None:
+                for (address, pcode, registers, endpoints) in self._store.get_network():
+                    mote = SwapMote(self.server, pcode, address, lazy=SwapNetwork.lazy_load)
+                    mote.restore(endpoints, registers)
+                    self._addToIndex(mote)
+                return
+
             network_file = open(self.filename)   
             network_data = json.load(network_file)["network"]
             network_file.close()
             # Initialize list of motes
             for mote_data in network_data["motes"]:
-                mote = SwapMote(self.server, mote_data["pcode"], mote_data["address"])
-                self.motes.append(mote)
-                # Initialize endpoints belonging to this mote
-                for register in mote.regular_registers:
-                    # Find register config
-                    for register_data in mote_data["registers"]:
-                        if register_data["id"] == register.id:
-                            for endpoint in register.parameters:
-                                # Find endpoint config                            
-                                for endpoint_data in register_data["endpoints"]:
-                                    if endpoint_data["id"] == endpoint.id:                      
-                                        endpoint.name = endpoint_data["name"]
-                                        endpoint.location = endpoint_data["location"]
-                                        if "unit" in endpoint_data and endpoint.unit is not None:
-                                            endpoint.setUnit(endpoint_data["unit"])
-                                        if "value" in endpoint_data:
-                                            endpoint.setValue(endpoint_data["value"])
-
-                                        endpoint.direction = endpoint_data["direction"]
-                                        endpoint.type = endpoint_data["type"]
-                                        
-                                        endpoint.display = True
-                                        if "display" in endpoint_data:
-                                            if endpoint_data["display"].lower() in ["false", "no", 0, "0", "disabled"]:
-                                                endpoint.display = False
-                                        break
-                            break
+                mote = SwapMote(self.server, mote_data["pcode"], mote_data["address"], lazy=SwapNetwork.lazy_load)
+                # Endpoint config indexed by endpoint id
+                endpoints = {}
+                for register_data in mote_data["registers"]:
+                    for endpoint_data in register_data["endpoints"]:
+                        endpoints[endpoint_data["id"]] = endpoint_data
+                mote.restore(endpoints, data=mote_data)
+                # Add mote once its endpoints are named
+                self._addToIndex(mote)
                 
         except IOError as ex:
             pass
@@ -85,19 +87,130 @@ class SwapNetwork:
 
     def save(self):
         """
-        Save current network data into file
+        Save current network data into file now. Cancels any pending request_save
+        """
+        self._save_cond.acquire()
+        self._dirty_since = None
+        self._save_all = False
+        self._dirty_regs = set()
+        self._save_cond.release()
+        self._write()
+
+
+    def request_save(self):
+        """
+        Save network data from a background thread once changes settle down.
+        Changes are written at most save_maxdelay seconds after being requested
+        """
+        self._scheduleSave()
+
+
+    def update_register(self, register):
+        """
+        Persist new register value along with its endpoints. Only done when
+        the network is stored in a SQLite database, where single rows can be
+        updated. JSON files are rewritten on save only
+        
+        @param register: SWAP register
         """
+        if self._store is not None:
+            self._scheduleSave(register)
+
+
+    def _scheduleSave(self, register=None):
+        """
+        Schedule background save
+        
+        @param register: Register to be saved. Whole network if None
+        """
+        self._save_cond.acquire()
         try:
+            if register is None:
+                self._save_all = True
+            else:
+                self._dirty_regs.add(register)
+            now = time.time()
+            if self._dirty_since is None:
+                self._dirty_since = now
+            self._last_change = now
+            if self._saver is None:
+                self._saver = threading.Thread(target=self._saveLoop)
+                self._saver.daemon = True
+                self._saver.start()
+            self._save_cond.notify()
+        finally:
+            self._save_cond.release()
+
+
+    def _saveLoop(self):
+        """
+        Background thread serving request_save
+        """
+        while True:
+            self._save_cond.acquire()
+            try:
+                while self._dirty_since is None:
+                    self._save_cond.wait()
+                deadline = min(self._last_change + SwapNetwork.save_delay,
+                               self._dirty_since + SwapNetwork.save_maxdelay)
+                delay = deadline - time.time()
+                if delay > 0:
+                    self._save_cond.wait(delay)
+                    continue
+                self._dirty_since = None
+                full = self._save_all
+                registers = self._dirty_regs
+                self._save_all = False
+                self._dirty_regs = set()
+            finally:
+                self._save_cond.release()
+
+            try:
+                self._write(full, registers)
+            except SwapException as ex:
+                ex.display()
+
+
+    def _write(self, full=True, registers=None):
+        """
+        Write network data. JSON files are written into a temporary file
+        and moved over the network file, so that they are never left half
+        written
+        
+        @param full: Write the whole network if True
+        @param registers: Registers to be written otherwise
+        """
+        self._write_lock.acquire()
+        try:
+            if self._store is not None:
+                if full:
+                    self._store.save(list(self.motes))
+                elif registers:
+                    self._store.save_registers(list(registers))
+                return
+            if not full:
+                return
             network = self.dumps()
             print "Saving", self.filename
-            network_file = open(self.filename, 'w')     
+            tmpname = self.filename + ".tmp"
+            network_file = open(tmpname, 'w')     
             # Write network data into file
             json.dump(network, network_file, sort_keys=False, indent=2)
+            network_file.flush()
+            os.fsync(network_file.fileno())
             network_file.close()
+            try:
+                os.rename(tmpname, self.filename)
+            except OSError:
+                # Windows does not replace existing files
+                os.remove(self.filename)
+                os.rename(tmpname, self.filename)
         except SwapException:
             raise
-        except IOError:
+        except (IOError, OSError):
             raise SwapException("Unable to save SWAP network data in file")
+        finally:
+            self._write_lock.release()
   
     
     def add_mote(self, mote):
@@ -108,12 +221,13 @@ class SwapNetwork:
         
         @return true if the mote did not exist in the list. False otherwise
         """        
-        # Search mote in list
-        for m in self.motes:
-            if m.address == mote.address:
+        self._index_lock.acquire()
+        try:
+            if self.get_mote(address=mote.address) is not None:
                 return False
-
-        self.motes.append(mote)
+            self._addToIndex(mote)
+        finally:
+            self._index_lock.release()
         return True
 
 
@@ -123,12 +237,54 @@ class SwapNetwork:
         
         @param address: address of the mote to be removed
         """        
-        # Search mote in list
-        for m in self.motes:
-            if m.address == address:
-                self.motes.remove(m)
-                self.save()
+        self._index_lock.acquire()
+        try:
+            mote = self.get_mote(address=address)
+            if mote is None:
                 return
+            self._rebuildIndex([other for other in self.motes if other is not mote])
+        finally:
+            self._index_lock.release()
+        self.request_save()
+
+
+    def set_mote_address(self, mote, address):
+        """
+        Change address of a mote belonging to the network
+        
+        @param mote: SWAP mote
+        @param address: New mote address
+        """
+        # Stored endpoint settings are bound to the current address
+        mote.materialize()
+        self._index_lock.acquire()
+        try:
+            if self._motes_by_addr.get(mote.address) is mote:
+                del self._motes_by_addr[mote.address]
+            mote.address = address
+            self._motes_by_addr[address] = mote
+        finally:
+            self._index_lock.release()
+
+
+    def rename_endpoint(self, endpoint, location, name):
+        """
+        Change location and name of an endpoint belonging to the network
+        
+        @param endpoint: SWAP endpoint
+        @param location: New location
+        @param name: New name
+        """
+        self._index_lock.acquire()
+        try:
+            key = (endpoint.location, endpoint.name)
+            if self._endpoints_by_name.get(key) is endpoint:
+                del self._endpoints_by_name[key]
+            endpoint.location = location
+            endpoint.name = name
+            self._endpoints_by_name.setdefault((location, name), endpoint)
+        finally:
+            self._index_lock.release()
 
 
     def get_mote(self, index=None, address=None):
@@ -143,12 +299,40 @@ class SwapNetwork:
         if index is not None and index >= 0:
             return self.motes[index]
         elif (address is not None) and (address > 0) and (address <= 255):
-            for mote in self.motes:
-                if mote.address == address:
-                    return mote
+            mote = self._motes_by_addr.get(address)
+            if mote is not None and mote.address != address:
+                # Address changed behind our back. Move the mote to its
+                # current address
+                self._index_lock.acquire()
+                try:
+                    if self._motes_by_addr.get(address) is mote:
+                        del self._motes_by_addr[address]
+                    self._motes_by_addr.setdefault(mote.address, mote)
+                finally:
+                    self._index_lock.release()
+                for mote in list(self.motes):
+                    if mote.address == address:
+                        return mote
+                return None
+            return mote
         return None
     
     
+    def get_register(self, address, regid):
+        """
+        Return register given its address and ID
+
+        @param address: Register address
+        @param regid: Register ID
+
+        @return register or None if not found
+        """
+        mote = self.get_mote(address=address)
+        if mote is None:
+            return None
+        return mote.getRegister(regid)
+
+
     def get_nbof_motes(self):
         """
         Return number of motes available in the network
@@ -158,24 +342,60 @@ class SwapNetwork:
         return len(self.motes)
     
     
-    def get_endpoint(self, usrlocation=None, usrname=None):
+    def get_endpoint(self, usrlocation=None, usrname=None, endpid=None):
         """
-        Get endpoint given its user name and location
+        Get endpoint given its unique id or its user name and location
         
         @param usrlocation: user location
         @param usrname: user name
+        @param endpid: endpoint id. Takes precedence over location and name
 
         @return endpoint object
         """
+        if endpid is not None:
+            return self._resolveEndpoint(self._endpoints_by_id, endpid)
+
         if usrlocation is None or usrname is None:
             return None
 
-        for mote in self.motes:
-            for reg in mote.regular_registers:
-                for endp in reg.parameters:
-                    if endp.usrlocation == usrlocation and endp.usrname == usrname:
-                        return endp
-        return None
+        key = (usrlocation, usrname)
+        endp = self._resolveEndpoint(self._endpoints_by_name, key)
+        if endp is not None and (endp.location, endp.name) != key:
+            # Renamed without rename_endpoint. Move it to its current name
+            self._index_lock.acquire()
+            try:
+                if self._endpoints_by_name.get(key) is endp:
+                    del self._endpoints_by_name[key]
+                self._endpoints_by_name.setdefault((endp.location, endp.name), endp)
+            finally:
+                self._index_lock.release()
+            return None
+        return endp
+
+
+    def _resolveEndpoint(self, index, key):
+        """
+        Look endpoint up in an index. Endpoints of lazy motes are indexed by
+        their mote until its registers are built
+        
+        @param index: Endpoint index
+        @param key: Endpoint key within the index
+        
+        @return endpoint object
+        """
+        endp = index.get(key)
+        if isinstance(endp, SwapMote):
+            self._index_lock.acquire()
+            try:
+                self._indexEndpoints(endp.materialize())
+                endp = index.get(key)
+                if isinstance(endp, SwapMote):
+                    # No longer provided by the device definition
+                    del index[key]
+                    endp = None
+            finally:
+                self._index_lock.release()
+        return endp
 
 
     def clear(self):
@@ -183,8 +403,94 @@ class SwapNetwork:
         Clear list of motes
         """
         self.motes = []
+        # Motes indexed by address
+        self._motes_by_addr = {}
+        # Endpoints indexed by id
+        self._endpoints_by_id = {}
+        # Endpoints indexed by (location, name)
+        self._endpoints_by_name = {}
         
     
+    def _getEndpoints(self, mote):
+        """
+        Return list of endpoints belonging to a mote
+
+        @param mote: SWAP mote
+
+        @return list of endpoints
+        """
+        endpoints = []
+        if mote.regular_registers is not None:
+            for reg in mote.regular_registers:
+                endpoints.extend(reg.parameters)
+        return endpoints
+
+
+    def _addToIndex(self, mote):
+        """
+        Append mote to the list and index it along with its endpoints
+
+        @param mote: SWAP mote
+        """
+        self._index_lock.acquire()
+        try:
+            self.motes.append(mote)
+            self._motes_by_addr[mote.address] = mote
+            self._indexEndpoints(mote)
+        finally:
+            self._index_lock.release()
+
+
+    def _indexEndpoints(self, mote, by_id=None, by_name=None):
+        """
+        Index endpoints of a mote. Lazy motes are indexed under the id's and
+        names of their stored endpoints without building them
+
+        @param mote: SWAP mote
+        @param by_id: Index by id to be filled. Current one if None
+        @param by_name: Index by (location, name) to be filled. Current one if None
+        """
+        if by_id is None:
+            by_id = self._endpoints_by_id
+        if by_name is None:
+            by_name = self._endpoints_by_name
+        if not mote.loaded:
+            for endpoint_data in mote.get_stored_endpoints():
+                by_id[endpoint_data["id"]] = mote
+                by_name.setdefault((endpoint_data["location"], endpoint_data["name"]), mote)
+            return
+        for endp in self._getEndpoints(mote):
+            by_id[endp.id] = endp
+            key = (endp.location, endp.name)
+            # Replace entries pointing to the mote while it was not loaded
+            if by_name.get(key, mote) is mote:
+                by_name[key] = endp
+
+
+    def _rebuildIndex(self, motes):
+        """
+        Replace list of motes and rebuild indexes from it. The new indexes
+        are built aside, so that lookups from other threads never see them
+        half filled
+
+        @param motes: New list of motes
+        """
+        by_addr = {}
+        by_id = {}
+        by_name = {}
+        for mote in motes:
+            by_addr[mote.address] = mote
+            self._indexEndpoints(mote, by_id, by_name)
+        self._index_lock.acquire()
+        try:
+            self.motes = motes
+            self._motes_by_addr = by_addr
+            self._endpoints_by_id = by_id
+            self._endpoints_by_name = by_name
+        finally:
+            self._index_lock.release()
+
+
     def dumps(self):
         """
         Serialize network data to a JSON formatted string
@@ -195,7 +501,8 @@ class SwapNetwork:
         motes_data = []
         
         try:
-            for mote in self.motes:
+            # Motes can be added or deleted meanwhile from other threads
+            for mote in list(self.motes):
                 motes_data.append(mote.dumps(include_units=True))
         except SwapException:
             raise
@@ -217,9 +524,32 @@ class SwapNetwork:
         
         ## File name
         self.filename = filename
+
+        # Guards pending save requests
+        self._save_cond = threading.Condition()
+        # Time of the oldest unsaved change. None if nothing to save
+        self._dirty_since = None
+        # Whole network needs to be saved
+        self._save_all = False
+        # Registers to be saved
+        self._dirty_regs = set()
+        # Time of the latest unsaved change
+        self._last_change = None
+        # Thread serving request_save
+        self._saver = None
+        # Serializes file writes
+        self._write_lock = threading.Lock()
+        # SQLite storage, used instead of a JSON file for .db files
+        self._store = None
+        if os.path.splitext(filename)[1].lower() in SwapNetwork.db_extensions:
+            self._store = SwapNetworkDb(filename)
                    
+        # Guards changes to the list of motes and its indexes. Lookups
+        # run without it
+        self._index_lock = threading.RLock()
         ## List of mote objects
         self.motes = []
+        self.clear()
         
         # Read config file
         try:
@@ -0,0 +1,260 @@
+#########################################################################
+#
+# SwapNetworkDb
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+
+from swap.SwapException import SwapException
+
+import json
+import sqlite3
+import sys
+import threading
+
+
+class SwapNetworkDb(object):
+    """
+    SQLite storage for SWAP network data. Alternative to the swapnet.json
+    file, updated row by row
+    """
+    # Table definitions
+    _schema = ("CREATE TABLE IF NOT EXISTS motes ("
+               "address INTEGER PRIMARY KEY, pcode TEXT NOT NULL)",
+               "CREATE TABLE IF NOT EXISTS registers ("
+               "address INTEGER NOT NULL, regid INTEGER NOT NULL, name TEXT, value TEXT, "
+               "PRIMARY KEY (address, regid))",
+               "CREATE TABLE IF NOT EXISTS endpoints ("
+               "id TEXT PRIMARY KEY, address INTEGER NOT NULL, regid INTEGER NOT NULL, "
+               "name TEXT, location TEXT, unit TEXT, display INTEGER NOT NULL DEFAULT 1, "
+               "type TEXT, direction TEXT, value TEXT, timestamp REAL, publish TEXT)",
+               "CREATE INDEX IF NOT EXISTS endpoints_address ON endpoints (address)",
+               "CREATE INDEX IF NOT EXISTS endpoints_name ON endpoints (location, name)")
+
+
+    def get_network(self):
+        """
+        Return every mote stored along with its registers and endpoints.
+        Reads each table once, whatever the amount of motes
+        
+        @return list of (address, product code, registers, endpoints) tuples
+        sorted by address. registers maps register ID's to values in hex
+        format. endpoints maps endpoint ID's to dictionaries with the same
+        keys used by swapnet.json
+        """
+        self._lock.acquire()
+        try:
+            details = {}
+            for (address, regid, value) in self._db.execute("SELECT address, regid, value FROM registers"):
+                if value is not None:
+                    details.setdefault(address, ({}, {}))[0][regid] = value
+            for row in self._db.execute("SELECT id, name, location, unit, display, type, direction, value, "
+                                        "publish, address FROM endpoints"):
+                details.setdefault(row[9], ({}, {}))[1][row[0]] = self._endpointData(row)
+            motes = []
+            for (address, pcode) in self._db.execute("SELECT address, pcode FROM motes ORDER BY address"):
+                (registers, endpoints) = details.get(address, ({}, {}))
+                motes.append((address, pcode, registers, endpoints))
+            return motes
+        finally:
+            self._lock.release()
+
+
+    def _endpointData(self, row):
+        """
+        Convert endpoint row into the dictionary used by swapnet.json
+        
+        @param row: id, name, location, unit, display, type, direction, value
+        and publish columns, in this order
+        
+        @return endpoint dictionary
+        """
+        data = {"id": row[0], "name": row[1], "location": row[2], "display": str(bool(row[4])),
+                "type": row[5], "direction": row[6]}
+        if row[3] is not None:
+            data["unit"] = row[3]
+        if row[7] is not None:
+            data["value"] = row[7]
+        if row[8] is not None:
+            data["publish"] = json.loads(row[8])
+        return data
+
+
+    def save(self, motes):
+        """
+        Replace stored network with the list of motes passed as argument
+        
+        @param motes: list of SWAP motes
+        """
+        self._lock.acquire()
+        try:
+            addresses = [mote.address for mote in motes]
+            db = self._db
+            # Motes no longer in the network
+            for table in ("motes", "registers", "endpoints"):
+                db.execute("DELETE FROM " + table + " WHERE address NOT IN (" +
+                           ",".join("?" * len(addresses)) + ")", addresses)
+            db.executemany("INSERT OR REPLACE INTO motes (address, pcode) VALUES (?, ?)",
+                           [(mote.address, mote.product_code) for mote in motes])
+            for mote in motes:
+                # Rows of motes not loaded yet did not change
+                if mote.loaded and mote.regular_registers is not None:
+                    for reg in mote.regular_registers:
+                        self._saveRegister(reg)
+            db.commit()
+        except sqlite3.Error as ex:
+            self._db.rollback()
+            raise SwapException("Unable to save SWAP network data in " + self.filename + ": " + str(ex))
+        finally:
+            self._lock.release()
+
+
+    def save_registers(self, registers):
+        """
+        Update stored value of some registers and the metadata of their
+        endpoints
+        
+        @param registers: list of SWAP registers
+        """
+        self._lock.acquire()
+        try:
+            for reg in registers:
+                self._saveRegister(reg)
+            self._db.commit()
+        except sqlite3.Error as ex:
+            self._db.rollback()
+            raise SwapException("Unable to save SWAP network data in " + self.filename + ": " + str(ex))
+        finally:
+            self._lock.release()
+
+
+    def _saveRegister(self, reg):
+        """
+        Write register row and the rows of its endpoints. Not committed
+        
+        @param reg: SWAP register
+        """
+        address = reg.getAddress()
+        value = None
+        if reg.value is not None:
+            value = reg.value.toAsciiHex()
+        self._db.execute("INSERT OR REPLACE INTO registers (address, regid, name, value) VALUES (?, ?, ?, ?)",
+                         (address, reg.id, reg.name, value))
+        rows = []
+        for endp in reg.parameters:
+            unit = None
+            if endp.unit is not None:
+                unit = endp.unit.name
+            publish = None
+            if endp.policy is not None:
+                publish = json.dumps(endp.policy.dumps())
+            rows.append((endp.id, address, reg.id, endp.name, endp.location, unit, int(endp.display),
+                         endp.type, endp.direction, endp.getValueInAscii(), endp.lastupdate, publish))
+        self._db.executemany("INSERT OR REPLACE INTO endpoints (id, address, regid, name, location, unit, "
+                             "display, type, direction, value, timestamp, publish) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+    def import_json(self, filename):
+        """
+        Import swapnet.json file. Existing data is replaced
+        
+        @param filename: Path to the swapnet.json file
+        
+        @return amount of motes imported
+        """
+        network_file = open(filename)
+        network_data = json.load(network_file)["network"]
+        network_file.close()
+
+        self._lock.acquire()
+        try:
+            db = self._db
+            for table in ("motes", "registers", "endpoints"):
+                db.execute("DELETE FROM " + table)
+            for mote_data in network_data["motes"]:
+                address = mote_data["address"]
+                db.execute("INSERT OR REPLACE INTO motes (address, pcode) VALUES (?, ?)",
+                           (address, mote_data["pcode"]))
+                for register_data in mote_data["registers"]:
+                    db.execute("INSERT OR REPLACE INTO registers (address, regid, name) VALUES (?, ?, ?)",
+                               (address, register_data["id"], register_data.get("name")))
+                    for endpoint_data in register_data["endpoints"]:
+                        display = 1
+                        if str(endpoint_data.get("display", "")).lower() in ["false", "no", "0", "disabled"]:
+                            display = 0
+                        publish = None
+                        if "publish" in endpoint_data:
+                            publish = json.dumps(endpoint_data["publish"])
+                        db.execute("INSERT OR REPLACE INTO endpoints (id, address, regid, name, location, "
+                                   "unit, display, type, direction, value, publish) "
+                                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (endpoint_data["id"], address, register_data["id"], endpoint_data["name"],
+                                    endpoint_data["location"], endpoint_data.get("unit"), display,
+                                    endpoint_data.get("type"), endpoint_data.get("direction"),
+                                    endpoint_data.get("value"), publish))
+            db.commit()
+            return len(network_data["motes"])
+        except sqlite3.Error as ex:
+            self._db.rollback()
+            raise SwapException("Unable to import " + filename + ": " + str(ex))
+        finally:
+            self._lock.release()
+
+
+    def close(self):
+        """
+        Close database
+        """
+        self._lock.acquire()
+        self._db.close()
+        self._lock.release()
+
+
+    def __init__(self, filename="swapnet.db"):
+        """
+        Class constructor
+        
+        @param filename: Path to the SQLite database. Created if missing
+        """
+        ## Path to the database
+        self.filename = filename
+        # Shared by the dispatch and save threads
+        self._lock = threading.Lock()
+        try:
+            self._db = sqlite3.connect(filename, check_same_thread=False)
+            for statement in SwapNetworkDb._schema:
+                self._db.execute(statement)
+            self._db.commit()
+        except sqlite3.Error as ex:
+            raise SwapException("Unable to open " + filename + ": " + str(ex))
+
+
+if __name__ == "__main__":
+    # Migration tool: python -m swap.protocol.SwapNetworkDb swapnet.json swapnet.db
+    if len(sys.argv) != 3:
+        print "Usage: python -m swap.protocol.SwapNetworkDb <swapnet.json> <swapnet.db>"
+        sys.exit(1)
+    store = SwapNetworkDb(sys.argv[2])
+    print "Imported", store.import_json(sys.argv[1]), "motes into", sys.argv[2]
+    store.close()
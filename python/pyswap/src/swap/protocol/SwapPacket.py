@@ -32,17 +32,168 @@ __date__ ="$Aug 20, 2011 10:36:00 AM$"
 from swap.modem.CcPacket import CcPacket
 from SwapValue import SwapValue
 from SwapDefs import SwapAddress, SwapFunction
+from swap.modem.TxScheduler import TxPriority
 from swap.SwapException import SwapException
 
-import copy
+from binascii import hexlify, unhexlify
+
+# Offsets of the SWAP header fields within the CcPacket data
+_DEST_ADDR = 0
+_SRC_ADDR = 1
+_HOP_SECU = 2
+_NONCE = 3
+_FUNCTION = 4
+_REG_ADDR = 5
+_REG_ID = 6
+_VALUE = 7
 
 
 class SwapPacket(CcPacket):
     """
-    SWAP packet class
+    SWAP packet class. Header fields are read from and written into the
+    CcPacket data bytes directly
     """
+    __slots__ = ("_value",)
+
     smart_encrypt_pwd = None
 
+
+    @property
+    def destAddress(self):
+        """
+        Destination address
+        """
+        return self.data[_DEST_ADDR]
+
+    @destAddress.setter
+    def destAddress(self, value):
+        self.data[_DEST_ADDR] = value
+
+
+    @property
+    def srcAddress(self):
+        """
+        Source address
+        """
+        return self.data[_SRC_ADDR]
+
+    @srcAddress.setter
+    def srcAddress(self, value):
+        self.data[_SRC_ADDR] = value
+
+
+    @property
+    def hop(self):
+        """
+        Hop count for repeating purposes
+        """
+        return (self.data[_HOP_SECU] >> 4) & 0x0F
+
+    @hop.setter
+    def hop(self, value):
+        self.data[_HOP_SECU] = ((value & 0x0F) << 4) | (self.data[_HOP_SECU] & 0x0F)
+
+
+    @property
+    def security(self):
+        """
+        Security option
+        """
+        return self.data[_HOP_SECU] & 0x0F
+
+    @security.setter
+    def security(self, value):
+        self.data[_HOP_SECU] = (self.data[_HOP_SECU] & 0xF0) | (value & 0x0F)
+
+
+    @property
+    def nonce(self):
+        """
+        Security nonce
+        """
+        return self.data[_NONCE]
+
+    @nonce.setter
+    def nonce(self, value):
+        self.data[_NONCE] = value
+
+
+    @property
+    def function(self):
+        """
+        Function code
+        """
+        return self.data[_FUNCTION]
+
+    @function.setter
+    def function(self, value):
+        self.data[_FUNCTION] = value
+
+
+    @property
+    def regAddress(self):
+        """
+        Register address
+        """
+        return self.data[_REG_ADDR]
+
+    @regAddress.setter
+    def regAddress(self, value):
+        self.data[_REG_ADDR] = value
+
+
+    @property
+    def regId(self):
+        """
+        Register ID
+        """
+        return self.data[_REG_ID]
+
+    @regId.setter
+    def regId(self, value):
+        self.data[_REG_ID] = value
+
+
+    @property
+    def value(self):
+        """
+        SWAP value. Decoded on first access
+        """
+        if self._value is None and len(self.data) > _VALUE:
+            self._value = SwapValue.fromBytes(str(self.data[_VALUE:]))
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        del self.data[_VALUE:]
+        if value is not None:
+            self.data += value.toBytes()
+        self._value = value
+
+
+    def __copy__(self):
+        """
+        Copy packet. Data bytes are duplicated, the SWAP value is immutable
+        """
+        packet = SwapPacket.__new__(self.__class__)
+        packet.data = bytearray(self.data)
+        packet.rssi = self.rssi
+        packet.lqi = self.lqi
+        packet._value = self._value
+        return packet
+
+
+    @property
+    def priority(self):
+        """
+        Transmission lane (see TxPriority). Queries give way to commands and
+        ACK's. Read it before encrypting the packet
+        """
+        if self.function == SwapFunction.QUERY:
+            return TxPriority.NORMAL
+        return TxPriority.HIGH
+
+
     def smart_encryption(self, password, decrypt=False):
         """
         Encrypt/Decrypt packet using the Smart Encryption mechanism
@@ -53,30 +204,25 @@ class SwapPacket(CcPacket):
         # Update password
         SwapPacket.smart_encrypt_pwd = password
 
-        # Encryot SwapPacket and CcPacket fields               
-        if decrypt:
-            self.nonce ^= password.data[9]
+        self.data = self._crypt(password, decrypt)
+        self._value = None
+
+
+    def _crypt(self, password, decrypt=False):
+        """
+        Return encrypted/decrypted copy of the packet data
         
-        self.function ^= password.data[11] ^ self.nonce
-        self.srcAddress ^= password.data[10] ^ self.nonce
-        self.regAddress ^= password.data[8] ^ self.nonce
-        self.regId ^= password.data[7] ^ self.nonce
+        @param password: Smart Encryption password
+        @param decrypt:  Decrypt data if True. Encrypt otherwise
         
-        if self.value is not None:
-            pos = 0
-            newarray = []
-            for byte in self.value.toList():
-                byte ^= password.data[pos] ^ self.nonce
-                newarray.append(byte)
-                pos += 1
-                if pos == 11:
-                    pos = 0
-            self.value = SwapValue(newarray)
-
-        if not decrypt:
-            self.nonce ^= password.data[9]
-
-        self._update_ccdata()
+        @return new data bytes
+        """
+        nonce = self.data[_NONCE]
+        if decrypt:
+            nonce ^= password.data[9]
+        length = len(self.data)
+        data = int(hexlify(self.data), 16) ^ password.get_mask(nonce, length)
+        return bytearray(unhexlify("%0*X" % (2 * length, data)))
             
         
     def send(self, server):
@@ -86,44 +232,29 @@ class SwapPacket(CcPacket):
         @param server: SWAP server object to be used for transmission
         """
         self.srcAddress = server.devaddress
-        self.data[1] = self.srcAddress
         
         # Update security option according to server's one
         self.security = server.security
-        self.data[2] |= self.security & 0x0F
 
-        # Keep copy of the current packet before encryption
-        packet_before_encrypt = copy.copy(self)
-        
-        # Smart encryption enabled?
+        # Lane of the clear packet. The encrypted function code means nothing
+        priority = self.priority
+
+        # Smart encryption enabled? Decrypt packets received from now on
         if self.security & 0x02:
-            # Encrypt packet
-            self.smart_encryption(server.password)
-        
-        CcPacket.send(self, server.modem)
+            SwapPacket.smart_encrypt_pwd = server.password
+
+        if server.modem is not None:
+            if self.security & 0x02:
+                # Transmit encrypted data. This packet stays in clear
+                packet = CcPacket()
+                packet.data = self._crypt(server.password)
+                server.modem.sendCcPacket(packet, priority)
+            else:
+                server.modem.sendCcPacket(self, priority)
         # Notify event        
-        server._eventHandler.swapPacketSent(packet_before_encrypt)
+        server._eventHandler.swapPacketSent(self)
         
         
-    def _update_ccdata(self):
-        """
-        Update ccPacket data bytes
-        """
-        self.data = []
-
-        self.data.append(self.destAddress)
-        self.data.append(self.srcAddress)
-        self.data.append((self.hop << 4) | (self.security & 0x0F))
-        self.data.append(self.nonce)
-        self.data.append(self.function)
-        self.data.append(self.regAddress)
-        self.data.append(self.regId)
-
-        if self.value is not None:
-            for item in self.value.toList():
-                self.data.append(item)
-
-
     def __init__(self, ccPacket=None, destAddr=SwapAddress.BROADCAST_ADDR, hop=0, nonce=0, function=SwapFunction.STATUS, regAddr=0, regId=0, value=None):
         """
         Class constructor
@@ -138,28 +269,11 @@ class SwapPacket(CcPacket):
         @param value: Register value  
         """
         CcPacket.__init__(self)
-
-        ## Destination address
-        self.destAddress = destAddr
-        ## Source address
-        self.srcAddress = regAddr
-        ## Hop count for repeating purposes
-        self.hop = hop
-        ## Security option
-        self.security = 0
-        ## Security nonce
-        self.nonce = nonce
-        ## Function code
-        self.function = function
-        ## Register address
-        self.regAddress = regAddr
-        ## Register ID
-        self.regId = regId
-        ## SWAP value
-        self.value = value
+        # SWAP value, once decoded
+        self._value = None
 
         if ccPacket is not None:
-            if len(ccPacket.data) < 7:
+            if len(ccPacket.data) < _VALUE:
                 raise SwapException("Packet received is too short")
             # Superclass attributes
             ## RSSI byte
@@ -168,38 +282,30 @@ class SwapPacket(CcPacket):
             self.lqi = ccPacket.lqi
             ## CcPacket data field
             self.data = ccPacket.data
-            # Destination address
-            self.destAddress = ccPacket.data[0]
-            # Source address
-            self.srcAddress = ccPacket.data[1]
-            # Hop count for repeating purposes
-            self.hop = (ccPacket.data[2] >> 4) & 0x0F
-            # Security option
-            self.security = ccPacket.data[2] & 0x0F
-            # Security nonce
-            self.nonce = ccPacket.data[3]
-            # Function code
-            self.function = ccPacket.data[4]
-            # Register address
-            self.regAddress = ccPacket.data[5]
-            # Register ID
-            self.regId = ccPacket.data[6]
                        
-            if len(ccPacket.data) >= 8:
-                self.value = SwapValue(ccPacket.data[7:])   
             # Encryption enabled?
             if self.security & 0x02 and SwapPacket.smart_encrypt_pwd is not None:
                 # Decrypt packet
                 self.smart_encryption(SwapPacket.smart_encrypt_pwd, decrypt=True)
         
         else:
-            self._update_ccdata()
+            self.data = bytearray(_VALUE)
+            self.destAddress = destAddr
+            self.srcAddress = regAddr
+            self.hop = hop
+            self.nonce = nonce
+            self.function = function
+            self.regAddress = regAddr
+            self.regId = regId
+            self.value = value
             
 
 class SwapStatusPacket(SwapPacket):
     """
     SWAP status packet class
     """
+    __slots__ = ()
+
     def __init__(self, rAddr, rId, val):
         """
         Class constructor
@@ -215,6 +321,8 @@ class SwapQueryPacket(SwapPacket):
     """
     SWAP Query packet class
     """
+    __slots__ = ()
+
     def __init__(self, rAddr=SwapAddress.BROADCAST_ADDR, rId=0):
         """
         Class constructor
@@ -229,6 +337,8 @@ class SwapCommandPacket(SwapPacket):
     """
     SWAP Command packet class
     """
+    __slots__ = ()
+
     def __init__(self, rAddr, rId, val, nonce=0):
         """
         Class constructor
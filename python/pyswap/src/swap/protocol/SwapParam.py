@@ -28,6 +28,7 @@ __date__ ="$Aug 26, 2011 8:56:27 AM$"
 
 from SwapDefs import SwapType
 from SwapValue import SwapValue
+from SwapBitField import SwapBitField
 from swap.SwapException import SwapException
 
 import time
@@ -56,59 +57,29 @@ class SwapParam:
         return self.register.id
     
     
-    def update(self):
+    def update(self, regval=None):
         """
         Update parameter's value, posibly after a change in its parent register
+
+        @param regval: Register value already converted into integer, if available
         """
         self.valueChanged = False
         if self.register is None:
             raise SwapException("Register not specified for current endpoint")
             return
 
-        # Current register value converted to list
-        lstRegVal = self.register.value.toList()
-        # Total bits to be copied
-        indexReg = self.bytePos
-        shiftReg = 7 - self.bitPos
-        bitsToCopy = self.byteSize * 8 + self.bitSize
-        # Current parameter value in list format
-        lstParamVal = self.value.toList()
-
-        if len(lstParamVal) == 0:
+        length = self.value.getLength()
+        if length == 0:
             return
 
-        # Keep old value
-        oldParamVal = self.value.clone()
-        indexParam = 0
-        shiftParam = self.bitSize - 1
-
-        if shiftParam < 0:
-            shiftParam = 7
-        for i in range(bitsToCopy):
-            if indexReg >= len(lstRegVal):
-                break            
-            if (lstRegVal[indexReg] >> shiftReg) & 0x01 == 0:
-                mask = ~(1 << shiftParam)
-                lstParamVal[indexParam] &= mask
-            else:
-                mask = 1 << shiftParam
-                lstParamVal[indexParam] |= mask
-
-            shiftReg -= 1
-            shiftParam -= 1
-
-            # Register byte over?
-            if shiftReg < 0:
-                indexReg += 1
-                shiftReg = 7
-
-            # Parameter byte over?
-            if shiftParam < 0:
-                indexParam += 1
-                shiftParam = 7
+        if regval is None:
+            regval = self.register.value.toInteger()
+        oldval = self.value.toInteger()
+        newval = self.bitfield.extract(regval, self.register.value.getLength(), oldval)
 
         # Did the value change?
-        if not self.value.isEqual(oldParamVal):
+        if newval != oldval:
+            self.value = SwapValue.fromInteger(newval, length)
             self.valueChanged = True
             
         # Update time stamp
@@ -270,6 +241,9 @@ class SwapParam:
         else:
             self.byteSize = int(size)
 
+        ## Shift and mask plan copying the value in and out of the register
+        self.bitfield = SwapBitField(self.bytePos, self.bitPos, self.byteSize, self.bitSize)
+
         ## Current value
         self.value = None
         ## Time stamp of the last update
@@ -344,6 +318,18 @@ class SwapEndpoint(SwapParam):
         
         @return Expected SWAP status response to be received from the mote
         """
+        # Send SWAP command
+        return self.register.sendSwapCmd(self.getRegValue(value))
+
+
+    def getRegValue(self, value):
+        """
+        Build the value of the parent register with a new endpoint value
+        
+        @param value: New endpoint value
+        
+        @return New register value (SwapValue)
+        """
         # Convert to SwapValue
         if value.__class__ is SwapValue:
             swap_value = value
@@ -385,49 +371,11 @@ class SwapEndpoint(SwapParam):
                 
             swap_value = SwapValue(res, length)
 
-        # Register value in list format
-        lstRegVal = []
-        lstRegVal[:] = self.register.value.toList()
-        
         # Build register value
-        indexReg = self.bytePos
-        shiftReg = 7 - self.bitPos
-        # Total bits to be copied from this parameter
-        bitsToCopy = self.byteSize * 8 + self.bitSize
-        # Parameter value in list format
-        lstParamVal = swap_value.toList()
-        indexParam = 0
-        shiftParam = self.bitSize - 1
-        if shiftParam < 0:
-            shiftParam = 7
-
-        for i in range(bitsToCopy):
-            if (lstParamVal[indexParam] >> shiftParam) & 0x01 == 0:
-                mask = ~(1 << shiftReg)
-                lstRegVal[indexReg] &= mask
-            else:
-                mask = 1 << shiftReg
-                lstRegVal[indexReg] |= mask
-
-            shiftReg -= 1
-            shiftParam -= 1
-
-            # Register byte over?
-            if shiftReg < 0:
-                indexReg += 1
-                shiftReg = 7
-
-            # Parameter byte over?
-            if shiftParam < 0:
-                indexParam += 1
-                shiftParam = 7
-        
-        
-        # Convert to SWapValue
-        newRegVal = SwapValue(lstRegVal)
-
-        # Send SWAP command
-        return self.register.sendSwapCmd(newRegVal)
+        regval = self.register.value
+        reglen = regval.getLength()
+        newval = self.bitfield.insert(regval.toInteger(), reglen, swap_value.toInteger())
+        return SwapValue.fromInteger(newval, reglen)
 
 
     def sendSwapQuery(self):
@@ -481,6 +429,8 @@ class SwapEndpoint(SwapParam):
             data["unit"] = self.unit.name
             if include_units:
                 data["units"] = self.dumps_units()
+        if self.policy is not None:
+            data["publish"] = self.policy.dumps()
        
         return data
        
@@ -512,3 +462,6 @@ class SwapEndpoint(SwapParam):
         
         ## Time stamp
         self.lastupdate = None
+
+        ## Publish policy (SwapPublishPolicy). None for publishing every change
+        self.policy = None
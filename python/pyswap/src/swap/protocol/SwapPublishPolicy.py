@@ -0,0 +1,200 @@
+#########################################################################
+#
+# SwapPublishPolicy
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from swap.SwapException import SwapException
+
+import threading
+
+
+class SwapPublishPolicy(object):
+    """
+    Decide when value changes of an endpoint are passed to the event
+    handler. Changes can be held back until a minimum interval elapses,
+    collapsed within a coalescing window or dropped when smaller than a
+    deadband. Deferred changes are published with the latest value
+    """
+    @staticmethod
+    def fromDict(data):
+        """
+        Build policy from its swapnet.json representation
+        
+        @param data: Dictionary with optional "interval", "window" and
+        "deadband" keys. Deadbands ending in '%' are relative to the last
+        value published
+        
+        @return SwapPublishPolicy object
+        """
+        try:
+            interval = float(data.get("interval", 0))
+            window = float(data.get("window", 0))
+            deadband = str(data.get("deadband", 0)).strip()
+            percent = deadband.endswith("%")
+            if percent:
+                deadband = deadband[:-1]
+            deadband = float(deadband)
+        except (ValueError, AttributeError):
+            raise SwapException("Incorrect publish policy: " + str(data))
+        return SwapPublishPolicy(interval, deadband, percent, window)
+
+
+    def offer(self, value, now):
+        """
+        Value changed. Decide whether to publish it
+        
+        @param value: New endpoint value, as returned by getValueInAscii
+        @param now: Current time in seconds
+        
+        @return 0 to publish now, the delay in seconds after which flush
+        has to be called or None if there is nothing to publish
+        """
+        self._lock.acquire()
+        try:
+            if self._withinDeadband(value) or self._scheduled:
+                return None
+            due = now + self.window
+            if self._published_at is not None:
+                due = max(due, self._published_at + self.interval)
+            if due <= now:
+                self._publish(value, now)
+                return 0
+            self._scheduled = True
+            return due - now
+        finally:
+            self._lock.release()
+
+
+    def flush(self, value, now):
+        """
+        Deferred publication due
+        
+        @param value: Current endpoint value, as returned by getValueInAscii
+        @param now: Current time in seconds
+        
+        @return True if the value has to be published
+        """
+        self._lock.acquire()
+        try:
+            self._scheduled = False
+            if self._withinDeadband(value):
+                return False
+            self._publish(value, now)
+            return True
+        finally:
+            self._lock.release()
+
+
+    def cancel(self):
+        """
+        Forget deferred publication whose flush will never be called.
+        The next change is offered again
+        """
+        self._lock.acquire()
+        self._scheduled = False
+        self._lock.release()
+
+
+    def _withinDeadband(self, value):
+        """
+        Check whether a value is too close to the last value published
+        
+        @param value: Endpoint value in ASCII format
+        
+        @return True if the change has to be dropped
+        """
+        if self.deadband <= 0 or self._published is None:
+            return False
+        try:
+            new = float(value)
+            last = float(self._published)
+        except ValueError:
+            # Only numeric values have a deadband
+            return value == self._published
+        band = self.deadband
+        if self.percent:
+            band = abs(last) * self.deadband / 100.0
+        return abs(new - last) < band
+
+
+    def _publish(self, value, now):
+        """
+        Record publication
+        
+        @param value: Value published
+        @param now: Current time in seconds
+        """
+        self._published = value
+        self._published_at = now
+
+
+    def dumps(self):
+        """
+        Serialize policy in swapnet.json format
+        
+        @return dictionary. Only settings in use are included
+        """
+        data = {}
+        if self.interval > 0:
+            data["interval"] = self.interval
+        if self.window > 0:
+            data["window"] = self.window
+        if self.deadband > 0:
+            if self.percent:
+                data["deadband"] = str(self.deadband) + "%"
+            else:
+                data["deadband"] = self.deadband
+        return data
+
+
+    def __init__(self, interval=0, deadband=0, percent=False, window=0):
+        """
+        Class constructor
+        
+        @param interval: Minimum time in seconds between publications
+        @param deadband: Minimum change published
+        @param percent: Deadband given as a percentage of the last value
+        published
+        @param window: Time in seconds collecting changes before publishing
+        the latest one
+        """
+        ## Minimum time in seconds between publications
+        self.interval = interval
+        ## Minimum change published. Applies to numeric values only
+        self.deadband = deadband
+        ## Deadband given as a percentage of the last value published
+        self.percent = percent
+        ## Time in seconds collecting changes before publishing the latest one
+        self.window = window
+
+        # Last value published
+        self._published = None
+        # Time of the last publication
+        self._published_at = None
+        # Deferred publication pending
+        self._scheduled = False
+        # Offers and flushes come from different threads
+        self._lock = threading.Lock()
@@ -137,44 +137,16 @@ class SwapRegister(object):
         if self.value is None:
             return
 
-        # Current register value converted to list
-        lstRegVal = self.value.toList()
+        reglen = self.value.getLength()
+        regval = self.value.toInteger()
 
         # For every parameter contained in this register
         for param in self.parameters:
-            indexReg = param.bytePos
-            shiftReg = 7 - param.bitPos
-            # Total bits to be copied from this parameter
-            bitsToCopy = param.byteSize * 8 + param.bitSize
-            # Parameter value in list format
-            lstParamVal = param.value.toList()
-            indexParam = 0
-            shiftParam = param.bitSize - 1
-            if shiftParam < 0:
-                shiftParam = 7
+            if param.value.getLength() > 0:
+                regval = param.bitfield.insert(regval, reglen, param.value.toInteger())
+
+        self.value = SwapValue.fromInteger(regval, reglen)
 
-            if len(lstParamVal) > 0:                
-                for i in range(bitsToCopy):
-                    if (lstParamVal[indexParam] >> shiftParam) & 0x01 == 0:
-                        mask = ~(1 << shiftReg)
-                        lstRegVal[indexReg] &= mask
-                    else:
-                        mask = 1 << shiftReg
-                        lstRegVal[indexReg] |= mask
-    
-                    shiftReg -= 1
-                    shiftParam -= 1
-    
-                    # Register byte over?
-                    if shiftReg < 0:                    
-                        indexReg += 1
-                        shiftReg = 7
-    
-                    # Parameter byte over?
-                    if shiftParam < 0:
-                        indexParam += 1
-                        shiftParam = 7
-                    
         # Update mote's time stamp
         if self.mote is not None:
             self.mote.updateTimeStamp()
@@ -197,8 +169,9 @@ class SwapRegister(object):
         self.mote.updateTimeStamp()
         
         # Now update the value in every endpoint or parameter contained in this register
+        regval = value.toInteger()
         for param in self.parameters:
-            param.update()
+            param.update(regval)
                
                
     def isConfig(self):
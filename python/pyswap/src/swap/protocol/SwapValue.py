@@ -29,11 +29,15 @@ __author__="Daniel Berenguer"
 __date__  ="$Aug 20, 2011 10:36:00 AM$"
 #########################################################################
 
+from binascii import hexlify, unhexlify
+
 
 class SwapValue(object):
     """
-    Multi-format SWAP value class
+    Multi-format SWAP value class. Values are immutable strings of bytes
     """
+    __slots__ = ("_data", "_int")
+
   
     def getLength(self):
         """
@@ -49,10 +53,45 @@ class SwapValue(object):
         
         @return Current value in integer format
         """
-        val = 0
-        for i, item in enumerate(self._data):
-            val |= item << (len(self._data)-1-i)*8
-        return val
+        if self._int is None:
+            if len(self._data) == 0:
+                self._int = 0
+            else:
+                self._int = int(hexlify(self._data), 16)
+        return self._int
+
+
+    @staticmethod
+    def fromInteger(value, length):
+        """
+        Build SWAP value from a positive integer number of any length
+        
+        @param value: Integer number
+        @param length: Byte length of the new value
+        
+        @return SwapValue object
+        """
+        if length == 0:
+            return SwapValue.fromBytes("")
+        value &= (1 << (8 * length)) - 1
+        swap_value = SwapValue.fromBytes(unhexlify("%0*X" % (2 * length, value)))
+        swap_value._int = value
+        return swap_value
+
+
+    @staticmethod
+    def fromBytes(data):
+        """
+        Build SWAP value from a string of bytes, without any conversion
+        
+        @param data: String of bytes
+        
+        @return SwapValue object
+        """
+        swap_value = SwapValue.__new__(SwapValue)
+        swap_value._data = data
+        swap_value._int = None
+        return swap_value
 
 
     def clone(self):
@@ -61,8 +100,10 @@ class SwapValue(object):
         
         @return Copy of the current value
         """
-        lstData = self._data[:]
-        return SwapValue(lstData)
+        # Immutable. Data can be shared
+        swap_value = SwapValue.fromBytes(self._data)
+        swap_value._int = self._int
+        return swap_value
 
 
     def toAscii(self):
@@ -71,7 +112,7 @@ class SwapValue(object):
         
         @return Current value in ASCII format
         """
-        return "".join(str(item) for item in self._data)
+        return "".join(map(str, bytearray(self._data)))
     
 
     def toAsciiStr(self):
@@ -80,7 +121,7 @@ class SwapValue(object):
         
         @return 
         """
-        return "".join(chr(item) for item in self._data)
+        return self._data
 
     
     def toAsciiHex(self):
@@ -88,18 +129,23 @@ class SwapValue(object):
         Convert SWAP value into printable ASCII hex string. Use this function for sequences of
         integer numbers
         """
-        out = []
-        for item in self._data:
-            out.append("{0:02X}".format(item))
-        # Return ASCII string
-        return "".join(out)
+        return hexlify(self._data).upper()
 
        
     def toList(self):
         """
         Convert SWAP value into list
         
-        @return Current value as a list of bytes
+        @return Current value as a new list of bytes
+        """
+        return list(bytearray(self._data))
+
+
+    def toBytes(self):
+        """
+        Return SWAP value as a string of bytes
+        
+        @return Current value as a string of bytes
         """
         return self._data
 
@@ -113,27 +159,42 @@ class SwapValue(object):
         @return True if the value passed as argument is equal to the current one. Return False
         otherwise
         """
-        if value is not None:       
-            if self.getLength() == value.getLength():
-                if self._data[:] == value.toList()[:]:
-                    return True
-        return False
+        return value is not None and self._data == value._data
+
+
+    def __eq__(self, other):
+        if other.__class__ is not SwapValue:
+            return NotImplemented
+        return self._data == other._data
+
+
+    def __ne__(self, other):
+        if other.__class__ is not SwapValue:
+            return NotImplemented
+        return self._data != other._data
+
+
+    def __hash__(self):
+        return hash(self._data)
 
 
     def __init__(self, value=None, length=0):
         """
         Class constructor
 
-        @param value: Raw value in form of list, boolean, integer, long, string or unicode
+        @param value: Raw value in form of list, bytearray, boolean, integer, long, string or unicode
         @param length: byte length of the value
         """
-        ## Raw value in form of list
-        self._data = []
+        ## Raw value in form of string of bytes
+        self._data = ""
+        # Integer value, converted on demand
+        self._int = None
         isAsciiString = False
         if value is not None:
             # In case of list passed in the constructor
-            if type(value) is list:
-                self._data = value
+            if type(value) in [list, bytearray]:
+                self._data = str(bytearray(value))
+                return
             # Boolean
             elif type(value) is bool:
                 res = int(value)
@@ -153,21 +214,10 @@ class SwapValue(object):
                 res = value
 
             if isAsciiString:
-                # OK, treat value as a pure ASCII string
-                strlen = len(value)
-                # Truncate string
-                if strlen > length:                    
-                    value = value[:length]
-                # Copy string
-                for ch in value:
-                    self._data.append(ord(ch))
-                # Trailing zeros
-                if length > strlen:
-                    for i in range(length - strlen):
-                        self._data.append(0)
+                # OK, treat value as a pure ASCII string. Truncate string
+                # and fill with trailing zeros
+                value = value[:length]
+                self._data = str(bytearray(ord(ch) for ch in value)) + "\x00" * (length - len(value))
             # In case of integer or long
             elif length > 0 and length <= 4:
-                for i in range(length):
-                    val = (res >> (8 * (length-1-i))) & 0xFF
-                    self._data.append(val)
-
+                self._data = unhexlify("%0*X" % (2 * length, res & ((1 << (8 * length)) - 1)))
@@ -35,8 +35,24 @@ from swap.protocol.SwapDefs import SwapType
 from swap.SwapException import SwapException
 
 import os
+import threading
 import xml.etree.ElementTree as xml
 
+
+def _getmtime(fileName):
+    """
+    Return modification time of a file
+    
+    @param fileName: Path to the file
+    
+    @return modification time or None if the file is not available
+    """
+    try:
+        return os.path.getmtime(fileName)
+    except OSError:
+        return None
+
+
 class DeviceEntry:
     """
     Class representing a device entry in a device directory
@@ -89,6 +105,46 @@ class XmlDeviceDir(object):
     Class implementing directory files linking device names with
     its corresponding description files
     """
+    # Directory shared by every XmlDevice object
+    _shared = None
+    # Guards the shared directory
+    _lock = threading.Lock()
+
+
+    @staticmethod
+    def get():
+        """
+        Return device directory shared by the whole process. The directory
+        file is only parsed again after being modified
+        
+        @return XmlDeviceDir object
+        """
+        fileName = XmlSettings.device_localdir + os.sep +__xmldirfile__
+        mtime = _getmtime(fileName)
+        XmlDeviceDir._lock.acquire()
+        try:
+            device_dir = XmlDeviceDir._shared
+            if device_dir is None or device_dir.fileName != fileName or device_dir.mtime != mtime:
+                device_dir = XmlDeviceDir()
+                XmlDeviceDir._shared = device_dir
+                # Product paths may have changed too
+                XmlDeviceTemplate.invalidate()
+            return device_dir
+        finally:
+            XmlDeviceDir._lock.release()
+
+
+    @staticmethod
+    def invalidate():
+        """
+        Drop the shared directory and every cached device definition.
+        Call this after replacing the definition files
+        """
+        XmlDeviceDir._lock.acquire()
+        XmlDeviceDir._shared = None
+        XmlDeviceDir._lock.release()
+        XmlDeviceTemplate.invalidate()
+
 
     def read(self):
         """
@@ -186,6 +242,8 @@ class XmlDeviceDir(object):
         """
         ## Path to the configuration file
         self.fileName = XmlSettings.device_localdir + os.sep +__xmldirfile__
+        ## Modification time of the configuration file when it was parsed
+        self.mtime = _getmtime(self.fileName)
         ## List of devices
         self.developers = []
         # Parse document
@@ -223,65 +281,66 @@ class XmlUnit:
         self.calc = calc
       
 
-class XmlDevice(object):
+class XmlDeviceTemplate(object):
     """
-    Device configuration settings
+    Parsed device definition file. A single template is shared by every
+    mote of the same product and never changes once built. Registers and
+    parameters are described with plain tuples from which XmlDevice
+    instantiates the objects of each mote
     """
+    # Templates indexed by (manufacturer id, product id)
+    _cache = {}
+    # Guards the cache
+    _lock = threading.Lock()
 
-    def getDefinition(self):
+
+    @staticmethod
+    def get(devel_id, prod_id):
         """
-        Read current configuration file
+        Return device template, parsing its definition file only if not
+        cached yet or modified since it was parsed
+        
+        @param devel_id: Manufacturer ID
+        @param prod_id: Product ID
+        
+        @return XmlDeviceTemplate object
+        """
+        device_dir = XmlDeviceDir.get()
+        key = (devel_id, prod_id)
+        XmlDeviceTemplate._lock.acquire()
+        try:
+            template = XmlDeviceTemplate._cache.get(key)
+            if template is None or template.mtime != _getmtime(template.fileName):
+                fileName = device_dir.getDevicePath(devel_id, prod_id)
+                if fileName is None:
+                    raise SwapException("Definition file not found for mote")
+                template = XmlDeviceTemplate(fileName)
+                XmlDeviceTemplate._cache[key] = template
+            return template
+        finally:
+            XmlDeviceTemplate._lock.release()
+
+
+    @staticmethod
+    def invalidate():
         """
-        if self.fileName is not None:
-            try:
-                # Parse XML file
-                tree = xml.parse(self.fileName)
-                if tree is None:
-                    raise IOError(self.fileName  + " does not exist")
-                # Get the root node
-                root = tree.getroot()
-                # Get manufacturer
-                elem = root.find("developer")
-                if elem is not None:
-                    self.manufacturer = elem.text
-                # Get product name
-                elem = root.find("product")
-                if elem is not None:
-                    self.product = elem.text
-                # Get Power Down flag
-                elem = root.find("pwrdownmode")
-                if elem is not None:
-                    self.pwrdownmode = (elem.text.lower() == "true")
-                # Get periodic tx interval
-                elem = root.find("txinterval")
-                if elem is not None:
-                    self.txinterval = int(elem.text)
-            except IOError as ex:
-                raise SwapException("Unable to parse " + self.fileName + " : " + ex)
+        Drop every cached template
+        """
+        XmlDeviceTemplate._lock.acquire()
+        XmlDeviceTemplate._cache = {}
+        XmlDeviceTemplate._lock.release()
 
 
-    def getRegList(self, config=False):
+    def _readRegList(self, root, config=False):
         """
-        Return list of registers
+        Read list of registers from the definition file
 
+        @param root: Root node of the definition file
         @param config: Set to True if Configuration register are required. False for regular ones
 
-        @return List of registers
+        @return Tuple of (register id, register name, tuple of parameters) tuples
         """
-        if self.fileName is None:
-            return None
-
-        # List of config registers belonging to the current device
         lstRegs = []
-
-        # Parse XML file
-        tree = xml.parse(self.fileName)
-        if tree is None:
-            return None
-        # Get the root node
-        root = tree.getroot()
-        # Get manufacturer
-
         # List of register elements belonging to the device
         regtype = "regular"
         if config == True:
@@ -295,14 +354,13 @@ class XmlDevice(object):
                     regId = int(strRegId)
                     # Get register name
                     regName = reg.get("name", default="")
-                    # Create register from id and mote
-                    swRegister = SwapRegister(self.mote, regId, regName)
 
                     # List of endpoints belonging to the register
                     if config == True:
                         elementName = "param"
                     else:
                         elementName = "endpoint"
+                    lstParams = []
                     lstElemParam = reg.findall(elementName)
                     for param in lstElemParam:
                         # Read XML fields
@@ -336,7 +394,8 @@ class XmlDevice(object):
                         elem = param.find("verif")
                         if elem is not None:
                             verif = elem.text
-                        # Get list of units
+                        # Get list of units. XmlUnit objects are never
+                        # modified so they can be shared among motes
                         units = param.findall("units/unit")
                         lstUnits = None
                         if units is not None and len(units) > 0:
@@ -349,23 +408,121 @@ class XmlDevice(object):
                                 xmlUnit = XmlUnit(name, factor, offset, calc)
                                 lstUnits.append(xmlUnit)
 
-                        if config == True:
-                            # Create SWAP config parameter
-                            swParam = SwapCfgParam(register=swRegister, pType=paramType, name=paramName,
-                                            position=paramPos, size=paramSize, default=defVal, verif=verif)
-                        else:                          
-                            # Create SWAP endpoint
-                            swParam = SwapEndpoint(register=swRegister, pType=paramType, direction=paramDir, name=paramName,
-                                            position=paramPos, size=paramSize, default=defVal, verif=verif, units=lstUnits)
+                        lstParams.append((paramType, paramDir, paramName, paramPos,
+                                          paramSize, defVal, verif, lstUnits))
+
+                    lstRegs.append((regId, regName, tuple(lstParams)))
 
-                        # Add current parameter to the register
-                        swRegister.add(swParam)
+        return tuple(lstRegs)
 
-                    # Create empty value for the register
-                    swRegister.value = SwapValue([0] * swRegister.getLength())
-                    swRegister.update()                    
-                    # Add endpoint to the list
-                    lstRegs.append(swRegister)
+
+    def __init__(self, fileName):
+        """
+        Class constructor
+        
+        @param fileName: Path to the definition file
+        """
+        ## Path to the definition file
+        self.fileName = fileName
+        ## Modification time of the definition file when it was parsed
+        self.mtime = _getmtime(fileName)
+        ## Name of the Manufacturer
+        self.manufacturer = None
+        ## Name of the Product
+        self.product = None
+        ## Power down mode (True or False)
+        self.pwrdownmode = False
+        ## Interval (in sec) between periodic transmissions. 0 for disabled
+        self.txinterval = 0
+
+        try:
+            # Parse XML file
+            tree = xml.parse(self.fileName)
+            if tree is None:
+                raise IOError(self.fileName  + " does not exist")
+        except IOError as ex:
+            raise SwapException("Unable to parse " + self.fileName + " : " + str(ex))
+        # Get the root node
+        root = tree.getroot()
+        # Get manufacturer
+        elem = root.find("developer")
+        if elem is not None:
+            self.manufacturer = elem.text
+        # Get product name
+        elem = root.find("product")
+        if elem is not None:
+            self.product = elem.text
+        # Get Power Down flag
+        elem = root.find("pwrdownmode")
+        if elem is not None:
+            self.pwrdownmode = (elem.text.lower() == "true")
+        # Get periodic tx interval
+        elem = root.find("txinterval")
+        if elem is not None:
+            self.txinterval = int(elem.text)
+
+        ## Regular registers
+        self.regular = self._readRegList(root)
+        ## Configuration registers
+        self.config = self._readRegList(root, config=True)
+
+
+class XmlDevice(object):
+    """
+    Device configuration settings
+    """
+
+    def getDefinition(self):
+        """
+        Read current configuration file
+        """
+        if self._template is not None:
+            self.manufacturer = self._template.manufacturer
+            self.product = self._template.product
+            self.pwrdownmode = self._template.pwrdownmode
+            self.txinterval = self._template.txinterval
+
+
+    def getRegList(self, config=False):
+        """
+        Return list of registers
+
+        @param config: Set to True if Configuration register are required. False for regular ones
+
+        @return List of registers
+        """
+        if self._template is None:
+            return None
+
+        # List of config registers belonging to the current device
+        lstRegs = []
+
+        if config == True:
+            lstTemplRegs = self._template.config
+        else:
+            lstTemplRegs = self._template.regular
+
+        for (regId, regName, lstParams) in lstTemplRegs:
+            # Create register from id and mote
+            swRegister = SwapRegister(self.mote, regId, regName)
+            for (paramType, paramDir, paramName, paramPos, paramSize, defVal, verif, lstUnits) in lstParams:
+                if config == True:
+                    # Create SWAP config parameter
+                    swParam = SwapCfgParam(register=swRegister, pType=paramType, name=paramName,
+                                    position=paramPos, size=paramSize, default=defVal, verif=verif)
+                else:                          
+                    # Create SWAP endpoint
+                    swParam = SwapEndpoint(register=swRegister, pType=paramType, direction=paramDir, name=paramName,
+                                    position=paramPos, size=paramSize, default=defVal, verif=verif, units=lstUnits)
+
+                # Add current parameter to the register
+                swRegister.add(swParam)
+
+            # Create empty value for the register
+            swRegister.value = SwapValue([0] * swRegister.getLength())
+            swRegister.update()                    
+            # Add endpoint to the list
+            lstRegs.append(swRegister)
 
         if len(lstRegs) == 0:
             return None
@@ -383,15 +540,18 @@ class XmlDevice(object):
         """
         ## Device (mote)
         self.mote = mote
-        
-        device_dir = XmlDeviceDir()
-        
+
+        if self.mote is not None:
+            devel_id = self.mote.manufacturer_id
+            prod_id = self.mote.product_id
+
+        # Parsed definition file, shared with other motes
+        self._template = None
         ## Name/path of the current configuration file
         self.fileName = None
         if devel_id is not None and prod_id is not None:
-            self.fileName = device_dir.getDevicePath(devel_id, prod_id)
-            if self.fileName is None:
-                raise SwapException("Definition file not found for mote")
+            self._template = XmlDeviceTemplate.get(devel_id, prod_id)
+            self.fileName = self._template.fileName
         ## Name of the Manufacturer
         self.manufacturer = None
         ## Name of the Product
@@ -401,10 +561,5 @@ class XmlDevice(object):
         ## Interval (in sec) between periodic transmissions. 0 for disabled
         self.txinterval = 0
 
-        if self.mote is not None:
-            self.fileName = device_dir.getDevicePath(self.mote.manufacturer_id, self.mote.product_id)
-            if self.fileName is None:
-                raise SwapException("Definition file not found for mote")
-
-        # Read definition parameters from XML file
+        # Read definition parameters from the template
         self.getDefinition()
@@ -44,14 +44,33 @@ class XmlSerial(object):
             return
         # Get the root node
         root = tree.getroot()
-        # Get serial port
-        elem = root.find("port")
-        if elem is not None:
-            self.port = elem.text
+        # Get serial ports. One per gateway
+        ports = [elem.text for elem in root.findall("port")]
+        if len(ports) > 0:
+            self.ports = ports
+            self.port = ports[0]
         # Get serial speed
         elem = root.find("speed")
         if elem is not None:
             self.speed = int(elem.text)
+        # Get transmission pacing
+        try:
+            elem = root.find("txrate")
+            if elem is not None:
+                self.txrate = float(elem.text)
+                if self.txrate <= 0:
+                    raise ValueError
+            elem = root.find("txburst")
+            if elem is not None:
+                self.txburst = int(elem.text)
+                if self.txburst <= 0:
+                    raise ValueError
+        except (ValueError, TypeError):
+            raise SwapException(elem.tag + " in " + self.file_name + " must be a positive number")
+        # Get traffic capture file
+        elem = root.find("capture")
+        if elem is not None:
+            self.capture = elem.text
     
     def save(self):
         """
@@ -61,8 +80,17 @@ class XmlSerial(object):
             f = open(self.file_name, 'w')
             f.write("<?xml version=\"1.0\"?>\n")
             f.write("<serial>\n")
-            f.write("\t<port>" + self.port + "</port>\n")
+            ports = self.ports
+            if len(ports) == 0 or ports[0] != self.port:
+                ports = [self.port] + ports[1:]
+            for port in ports:
+                f.write("\t<port>" + port + "</port>\n")
             f.write("\t<speed>" + str(self.speed) + "</speed>\n")
+            if self.txrate is not None:
+                f.write("\t<txrate>" + str(self.txrate) + "</txrate>\n")
+                f.write("\t<txburst>" + str(self.txburst) + "</txburst>\n")
+            if self.capture is not None:
+                f.write("\t<capture>" + self.capture + "</capture>\n")
             f.write("</serial>\n")
             f.close()
         except:
@@ -78,8 +106,16 @@ class XmlSerial(object):
         self.file_name = file_name
         ## Name/path of the serial port
         self.port = "/dev/ttyUSB0"
+        ## Serial ports of every gateway, starting with port
+        self.ports = [self.port]
         ## Speed of the serial port in bps
         self.speed = 9600
+        ## Sustained transmission rate in frames per second. None for default pacing
+        self.txrate = None
+        ## Amount of frames that can be transmitted back-to-back
+        self.txburst = 1
+        ## Path to the file recording the serial traffic. None for no capture
+        self.capture = None
         # Read XML file
         self.read()
 
@@ -53,6 +53,17 @@ class XmlSettings(object):
     updatedef = False
     ## Name/path of the error log file
     error_file = "swap.err"
+    ## Amount of threads passing events to the application. 0 for calling
+    ## event handlers from the serial reception thread
+    event_workers = 1
+    ## Maximum amount of events waiting for delivery
+    event_queue = 1000
+    ## Policy applied when the event queue is full ("drop-oldest" or "coalesce")
+    event_overflow = "drop-oldest"
+    ## TCP port exporting metrics in the Prometheus text format. None to disable
+    metrics_port = None
+    ## Local address the metrics port is bound to
+    metrics_address = "127.0.0.1"
 
     def read(self):
         """
@@ -96,6 +107,27 @@ class XmlSettings(object):
         elem = root.find("errlog")
         if elem is not None:
             XmlSettings.error_file = elem.text
+        # Get event delivery settings
+        events = root.find("events")
+        if events is not None:
+            elem = events.find("workers")
+            if elem is not None:
+                XmlSettings.event_workers = int(elem.text)
+            elem = events.find("queue")
+            if elem is not None:
+                XmlSettings.event_queue = int(elem.text)
+            elem = events.find("overflow")
+            if elem is not None:
+                XmlSettings.event_overflow = elem.text.strip().lower()
+        # Get metrics exporter settings
+        metrics = root.find("metrics")
+        if metrics is not None:
+            elem = metrics.find("port")
+            if elem is not None:
+                XmlSettings.metrics_port = int(elem.text)
+            elem = metrics.find("address")
+            if elem is not None:
+                XmlSettings.metrics_address = elem.text.strip()
 
 
     def save(self):
@@ -114,6 +146,16 @@ class XmlSettings(object):
         f.write("\t<serial>" + self.serial_file + "</serial>\n")
         f.write("\t<network>" + self.network_file + "</network>\n")
         f.write("\t<swapnet>" + self.swap_file + "</swapnet>\n")
+        f.write("\t<events>\n")
+        f.write("\t\t<workers>" + str(self.event_workers) + "</workers>\n")
+        f.write("\t\t<queue>" + str(self.event_queue) + "</queue>\n")
+        f.write("\t\t<overflow>" + self.event_overflow + "</overflow>\n")
+        f.write("\t</events>\n")
+        if self.metrics_port is not None:
+            f.write("\t<metrics>\n")
+            f.write("\t\t<port>" + str(self.metrics_port) + "</port>\n")
+            f.write("\t\t<address>" + self.metrics_address + "</address>\n")
+            f.write("\t</metrics>\n")
         f.write("</settings>\n")
         f.close()
 
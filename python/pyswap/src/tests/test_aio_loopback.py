@@ -0,0 +1,262 @@
+#########################################################################
+#
+# test_aio_loopback
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+# AsyncModem and AsyncServer against a fake modem on the other end of a
+# pseudo-terminal.
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from swap.aio.EventLoop import EventLoop
+from swap.aio.AsyncModem import AsyncModem
+from swap.aio.AsyncServer import AsyncServer
+from swap.protocol.SwapDefs import SwapFunction
+from swap.protocol.SwapValue import SwapValue
+
+import os
+import select
+import threading
+import tty
+import unittest
+
+
+class FakeModem(threading.Thread):
+    """
+    Serial modem answering AT commands and SWAP packets on the master side
+    of a pseudo-terminal. Motes answer commands with the new value and
+    queries with QUERY_VALUE, except the mote at SILENT_ADDR
+    """
+    ## Value returned to every query
+    QUERY_VALUE = [0x12, 0x34]
+    ## Address of a mote that never answers
+    SILENT_ADDR = 99
+
+    def run(self):
+        """
+        Serve the pseudo-terminal until stopped. Start once the port is open
+        """
+        self._write("Modem ready!")
+        buf = ""
+        while self._go_on:
+            if len(select.select([self._master], [], [], 0.1)[0]) == 0:
+                continue
+            try:
+                buf += os.read(self._master, 4096)
+            except OSError:
+                return
+            while True:
+                if buf.startswith("+++"):
+                    buf = buf[3:]
+                    self._write("OK")
+                    continue
+                end = buf.find("\r")
+                if end < 0:
+                    break
+                line = buf[:end]
+                buf = buf[end + 1:]
+                if line.startswith("AT"):
+                    self._command(line)
+                else:
+                    self._packet(line)
+
+
+    def _command(self, line):
+        """
+        Answer AT command
+
+        @param line: AT command without terminator
+        """
+        self.commands.append(line)
+        if line in self.settings:
+            self._write(self.settings[line])
+            return
+        if "=" in line:
+            (name, value) = line.split("=")
+            self.settings[name + "?"] = value
+        self._write("OK")
+
+
+    def _packet(self, line):
+        """
+        Answer SWAP packet with a STATUS packet from the targeted mote
+
+        @param line: Packet in hex format
+        """
+        data = [int(line[i:i+2], 16) for i in range(0, len(line), 2)]
+        self.packets.append(data)
+        (dest, nonce, function, regaddr, regid) = (data[0], data[3], data[4], data[5], data[6])
+        if dest == FakeModem.SILENT_ADDR:
+            return
+        if function == SwapFunction.COMMAND:
+            value = data[7:]
+        elif function == SwapFunction.QUERY:
+            value = FakeModem.QUERY_VALUE
+        else:
+            return
+        status = [0x01, regaddr, 0, nonce, SwapFunction.STATUS, regaddr, regid] + value
+        self._write("(2A3C)" + "".join(["%02X" % byte for byte in status]))
+
+
+    def _write(self, line):
+        """
+        Write line to the modem side of the pseudo-terminal
+
+        @param line: Line without terminator
+        """
+        os.write(self._master, line + "\r\n")
+
+
+    def stop(self):
+        """
+        Stop serving and close the pseudo-terminal
+        """
+        self._go_on = False
+        self.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+
+    def __init__(self):
+        """
+        Class constructor
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        # Both ends of the pseudo-terminal
+        (self._master, self._slave) = os.openpty()
+        # No echo, so that the modem banner is not read back
+        tty.setraw(self._slave)
+        ## Path of the serial port to be opened by the modem under test
+        self.port = os.ttyname(self._slave)
+        ## Modem settings returned to AT queries
+        self.settings = {"ATHV?": "0100", "ATFV?": "0200", "ATCH?": "00", "ATSW?": "B547", "ATDA?": "01"}
+        ## AT commands received
+        self.commands = []
+        ## SWAP packets received, as lists of bytes
+        self.packets = []
+        # Keep serving while True
+        self._go_on = True
+
+
+class Mote(object):
+    """
+    Address and nonce of a remote mote, as used by AsyncServer
+    """
+    def __init__(self, address):
+        """
+        Class constructor
+
+        @param address: Mote address
+        """
+        self.address = address
+        self.nonce = 0
+
+
+class AsyncLoopbackTest(unittest.TestCase):
+    """
+    AsyncModem and AsyncServer over a pseudo-terminal
+    """
+    def test_ready(self):
+        """
+        Modem settings are read on start-up
+        """
+        self.assertEqual(self.modem.hwversion, 0x100)
+        self.assertEqual(self.modem.fwversion, 0x200)
+        self.assertEqual(self.modem.syncword, 0xB547)
+        self.assertEqual(self.modem.devaddress, 1)
+
+
+    def test_at(self):
+        """
+        AT commands resolve to the response of the modem
+        """
+        self.assertEqual(self.modem.at("+++", 5.0).result(5), "OK")
+        self.assertEqual(self.modem.at("ATCH?").result(5), "00")
+        self.assertEqual(self.modem.at("ATCH=05").result(5), "OK")
+        self.assertEqual(self.modem.at("ATCH?").result(5), "05")
+        self.assertEqual(self.modem.at("ATO").result(5), "OK")
+        self.assertTrue(self.modem.configure(devaddress=5, freq_channel=2).result(5))
+        self.assertEqual(self.fake.settings["ATDA?"], "05")
+        self.assertEqual(self.modem.devaddress, 5)
+        self.assertEqual(self.modem.freq_channel, 2)
+
+
+    def test_set_register(self):
+        """
+        Commands resolve to True once acknowledged
+        """
+        request = self.server.set_register(Mote(4), 11, SwapValue([0x01, 0x02]))
+        self.assertTrue(request.result(5))
+        packet = self.fake.packets[-1]
+        self.assertEqual(packet[0], 4)
+        self.assertEqual(packet[4], SwapFunction.COMMAND)
+        self.assertEqual(packet[6:], [11, 0x01, 0x02])
+
+
+    def test_query_register(self):
+        """
+        Queries resolve to the value returned by the mote
+        """
+        value = self.server.query_register(Mote(4), 12).result(5)
+        self.assertEqual(value.toList(), FakeModem.QUERY_VALUE)
+        self.assertEqual(self.fake.packets[-1][4], SwapFunction.QUERY)
+
+
+    def test_no_answer(self):
+        """
+        Requests to silent motes fail after their last try
+        """
+        mote = Mote(FakeModem.SILENT_ADDR)
+        self.assertEqual(self.server.query_register(mote, 12, timeout=0.1, tries=2).result(5), None)
+        self.assertFalse(self.server.set_register(mote, 11, SwapValue([1]), timeout=0.1, tries=1).result(5))
+        self.assertEqual(len(self.fake.packets), 3)
+
+
+    def setUp(self):
+        """
+        Start fake modem, event loop, modem and server
+        """
+        self.fake = FakeModem()
+        self.loop = EventLoop()
+        self.loop.start()
+        self.modem = AsyncModem(self.loop, self.fake.port, 38400, txrate=200)
+        # Opening the port flushes its input. Start the banner afterwards
+        self.fake.start()
+        self.modem.ready.result(10)
+        self.server = AsyncServer(self.loop, self.modem)
+
+
+    def tearDown(self):
+        """
+        Stop everything
+        """
+        self.modem.stop()
+        self.loop.stop()
+        self.loop.join()
+        self.fake.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
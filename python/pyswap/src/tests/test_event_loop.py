@@ -0,0 +1,92 @@
+#########################################################################
+#
+# test_event_loop
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from swap.aio.EventLoop import EventLoop
+
+import threading
+import time
+import unittest
+
+
+class EventLoopTest(unittest.TestCase):
+    """
+    Calls scheduled from other threads
+    """
+    def test_flood(self):
+        """
+        Scheduling many calls while a slow callback runs never blocks
+        """
+        done = threading.Event()
+        calls = []
+        self.loop.call_soon(time.sleep, 1.0)
+        time.sleep(0.1)
+        def produce():
+            for i in range(100000):
+                self.loop.call_soon(calls.append, i)
+            self.loop.call_soon(done.set)
+        producer = threading.Thread(target=produce)
+        producer.daemon = True
+        producer.start()
+        producer.join(10)
+        self.assertFalse(producer.isAlive())
+        self.assertTrue(done.wait(10))
+        self.assertEqual(len(calls), 100000)
+
+
+    def test_cancel(self):
+        """
+        Cancelled calls are not run
+        """
+        done = threading.Event()
+        calls = []
+        self.loop.call_soon(time.sleep, 0.2)
+        self.loop.call_soon(calls.append, "soon").cancel()
+        self.loop.call_later(0.1, calls.append, "later").cancel()
+        self.loop.call_later(0.3, done.set)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(calls, [])
+
+
+    def setUp(self):
+        """
+        Start event loop
+        """
+        self.loop = EventLoop()
+        self.loop.start()
+
+
+    def tearDown(self):
+        """
+        Stop event loop
+        """
+        self.loop.stop()
+        self.loop.join()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+#########################################################################
+#
+# test_network_index
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+# Lookups in the SwapNetwork indexes while other threads look up unknown
+# names, rename endpoints and delete motes.
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from swap.protocol.SwapMote import SwapMote
+from swap.protocol.SwapNetwork import SwapNetwork
+from swap.xmltools.XmlSettings import XmlSettings
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+# Device definitions shipped with the project
+DEVICES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "devices")
+# Product code of a device with endpoints
+PCODE = "0000000100000003"
+# Amount of motes in the network
+NBMOTES = 200
+
+
+class Server(object):
+    """
+    Stand-in for SwapServer. Motes only need a non-null server
+    """
+    pass
+
+
+class NetworkIndexTest(unittest.TestCase):
+    """
+    SwapNetwork indexes under concurrent use
+    """
+    def run_with(self, action, duration=1.0):
+        """
+        Look every mote up by address while another thread runs an action
+
+        @param action: Function run in a loop by the other thread
+        @param duration: Seconds to run
+
+        @return amount of lookups returning None
+        """
+        stop = threading.Event()
+        def loop():
+            while not stop.isSet():
+                action()
+        thread = threading.Thread(target=loop)
+        thread.start()
+        misses = 0
+        end = time.time() + duration
+        try:
+            while time.time() < end:
+                for address in range(1, NBMOTES + 1):
+                    if self.network.get_mote(address=address) is None:
+                        misses += 1
+        finally:
+            stop.set()
+            thread.join()
+        return misses
+
+
+    def test_unknown_name(self):
+        """
+        Looking up unknown names never hides existing motes
+        """
+        def lookup():
+            self.assertEqual(self.network.get_endpoint("nowhere", "nothing"), None)
+        self.assertEqual(self.run_with(lookup), 0)
+
+
+    def test_rename(self):
+        """
+        Renamed endpoints are found under their new name only
+        """
+        endp = self.network.get_mote(address=7).regular_registers[0].parameters[0]
+        old = (endp.location, endp.name)
+        count = [0]
+        def rename():
+            count[0] += 1
+            self.network.rename_endpoint(endp, "room", "sensor" + str(count[0]))
+        self.assertEqual(self.run_with(rename, 0.5), 0)
+        self.assertTrue(self.network.get_endpoint("room", "sensor" + str(count[0])) is endp)
+        self.assertFalse(self.network.get_endpoint(old[0], old[1]) is endp)
+        self.assertEqual(self.network.get_endpoint("room", "sensor1"), None)
+
+
+    def test_delete(self):
+        """
+        Deleting motes leaves the other motes in place
+        """
+        address = [NBMOTES + 1]
+        def delete():
+            mote = SwapMote(Server(), PCODE, address[0])
+            self.assertTrue(self.network.add_mote(mote))
+            self.network.delete_mote(address[0])
+            self.assertEqual(self.network.get_mote(address=address[0]), None)
+            address[0] = (address[0] - NBMOTES) % 50 + NBMOTES + 1
+        self.assertEqual(self.run_with(delete, 0.5), 0)
+        self.assertEqual(self.network.get_nbof_motes(), NBMOTES)
+
+
+    def setUp(self):
+        """
+        Network with NBMOTES motes, stored in a temporary directory
+        """
+        XmlSettings.device_localdir = os.path.abspath(DEVICES)
+        self.tmpdir = tempfile.mkdtemp()
+        self.network = SwapNetwork(Server(), os.path.join(self.tmpdir, "swapnet.json"))
+        for address in range(1, NBMOTES + 1):
+            self.network.add_mote(SwapMote(Server(), PCODE, address))
+
+
+    def tearDown(self):
+        """
+        Remove temporary directory
+        """
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+#########################################################################
+#
+# test_smart_encryption
+#
+# Copyright (c) 2011 panStamp <contact@panstamp.com>
+#
+# This file is part of the panStamp project.
+#
+# panStamp  is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# any later version.
+#
+# panStamp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with panStamp; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+# Smart Encryption between the server and motes encrypting on their own,
+# without any state shared with the server such as the simulator does.
+#
+#########################################################################
+__author__="panStamp"
+__date__ ="$Oct 18, 2026$"
+#########################################################################
+
+from swap.modem.CcPacket import CcPacket
+from swap.protocol.SmartEncrypt import Password
+from swap.protocol.SwapDefs import SwapFunction
+from swap.protocol.SwapPacket import SwapPacket, SwapQueryPacket
+from swap.protocol.SwapValue import SwapValue
+
+import unittest
+
+# Smart Encryption password shared by server and motes
+PASSWORD = "0102030405060708090A0B0C"
+
+
+def mote_crypt(data, password, decrypt=False):
+    """
+    Encrypt or decrypt SWAP frame byte by byte, as motes do
+
+    @param data: List of frame bytes
+    @param password: List of password bytes
+    @param decrypt: Decrypt if True. Encrypt otherwise
+
+    @return list of frame bytes
+    """
+    data = list(data)
+    nonce = data[3]
+    if decrypt:
+        nonce ^= password[9]
+    data[1] ^= password[10] ^ nonce
+    data[4] ^= password[11] ^ nonce
+    data[5] ^= password[8] ^ nonce
+    data[6] ^= password[7] ^ nonce
+    for i in range(7, len(data)):
+        data[i] ^= password[(i - 7) % 11] ^ nonce
+    data[3] = nonce
+    if not decrypt:
+        data[3] ^= password[9]
+    return data
+
+
+class Modem(object):
+    """
+    Serial modem keeping the packets transmitted
+    """
+    def sendCcPacket(self, packet, priority=None):
+        """
+        Keep packet
+
+        @param packet: CcPacket to be transmitted
+        @param priority: Transmission lane
+        """
+        self.sent.append(list(packet.data))
+
+
+    def __init__(self):
+        """
+        Class constructor
+        """
+        ## Frames transmitted, as lists of bytes
+        self.sent = []
+
+
+class Server(object):
+    """
+    Attributes and event handler of SwapServer used by SwapPacket.send
+    """
+    def swapPacketSent(self, packet):
+        """
+        SWAP packet transmitted
+
+        @param packet: SWAP packet transmitted
+        """
+        pass
+
+
+    def __init__(self):
+        """
+        Class constructor
+        """
+        self.devaddress = 1
+        self.security = 0x02
+        self.password = Password(PASSWORD)
+        self.modem = Modem()
+        self._eventHandler = self
+
+
+class SmartEncryptionTest(unittest.TestCase):
+    """
+    Encrypted traffic between SwapPacket and independent motes
+    """
+    def receive(self, data):
+        """
+        Parse frame received from a mote
+
+        @param data: List of frame bytes
+
+        @return SwapPacket object
+        """
+        return SwapPacket(CcPacket("(2A3C)" + "".join(["%02X" % byte for byte in data])))
+
+
+    def test_send(self):
+        """
+        Transmitted frames are decrypted by motes into the clear packet
+        """
+        server = Server()
+        SwapQueryPacket(5, 12).send(server)
+        frame = server.modem.sent[0]
+        clear = mote_crypt(frame, server.password.data, decrypt=True)
+        self.assertNotEqual(frame, clear)
+        self.assertEqual(clear[:7], [5, 1, 0x02, 0, SwapFunction.QUERY, 5, 12])
+
+
+    def test_receive(self):
+        """
+        STATUS packets from motes are decrypted once the server has sent
+        an encrypted packet
+        """
+        server = Server()
+        # Discovery query sent by the server on start-up
+        SwapQueryPacket().send(server)
+
+        clear = [0xFF, 5, 0x02, 7, SwapFunction.STATUS, 5, 12, 0x12, 0x34]
+        packet = self.receive(mote_crypt(clear, server.password.data))
+        self.assertEqual(packet.srcAddress, 5)
+        self.assertEqual(packet.nonce, 7)
+        self.assertEqual(packet.function, SwapFunction.STATUS)
+        self.assertEqual(packet.regAddress, 5)
+        self.assertEqual(packet.regId, 12)
+        self.assertEqual(packet.value.toList(), [0x12, 0x34])
+
+
+    def test_plain_send(self):
+        """
+        Packets sent without encryption leave reception untouched
+        """
+        server = Server()
+        server.security = 0
+        SwapQueryPacket().send(server)
+        self.assertEqual(SwapPacket.smart_encrypt_pwd, None)
+        self.assertEqual(server.modem.sent[0][4], SwapFunction.QUERY)
+
+
+    def setUp(self):
+        """
+        No password known before the server sends anything
+        """
+        self._password = SwapPacket.smart_encrypt_pwd
+        SwapPacket.smart_encrypt_pwd = None
+
+
+    def tearDown(self):
+        """
+        Restore password
+        """
+        SwapPacket.smart_encrypt_pwd = self._password
+
+
+if __name__ == "__main__":
+    unittest.main()